@@ -3,16 +3,33 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from config import Config
+from config import get_config
 from flask_migrate import Migrate
 
-db = SQLAlchemy()
+from .replica import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 migrate = Migrate()
 
-def create_app():
+def create_app(config_class=None):
+    """
+    Build the application. This only wires configuration, extensions,
+    blueprints and CLI commands; it never touches the database, so workers,
+    CLI calls and tests start quickly. Use ``flask init-db`` and
+    ``flask seed`` to create the schema and the default accounts.
+
+    Without ``config_class`` the profile named by FLASK_CONFIG
+    (development, testing or production; production when unset) is used. A missing SECRET_KEY
+    is refused here rather than on the first login.
+    """
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class or get_config())
+    if not app.config.get('SECRET_KEY'):
+        raise ValueError(
+            'SECRET_KEY is not set; the production profile reads it from the environment. '
+            'Set FLASK_CONFIG=development for local work.'
+        )
 
     # Initialize extensions with the app
     db.init_app(app)
@@ -21,6 +38,47 @@ def create_app():
 
     login_manager.login_view = 'main.login'  # Note the 'main.' prefix
 
+    from .models import user_cache
+    user_cache.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+    from .availability import occupancy
+    occupancy.configure(ttl=app.config['AVAILABILITY_TTL'])
+
+    from .analytics import frame_cache, report_cache
+    report_cache.configure(ttl=app.config['ANALYTICS_CACHE_TTL'])
+    frame_cache.configure(ttl=app.config['ANALYTICS_CACHE_TTL'])
+
+    from .events import feed
+    feed.configure(app.config['EVENT_BROKER_URL'], app.config['EVENT_BUFFER_SIZE'])
+
+    from .fragments import FragmentCacheExtension, fragment_cache
+    fragment_cache.configure(
+        app.config['FRAGMENT_CACHE_URL'], app.config['FRAGMENT_CACHE_SIZE'],
+        app.config['FRAGMENT_CACHE_TTL']
+    )
+    if app.config['FRAGMENT_CACHE_URL'].startswith('memory:') and not (app.debug or app.testing):
+        app.logger.warning(
+            'FRAGMENT_CACHE_URL is memory://, so each worker caches fragments on its own '
+            'and may show changes up to %g seconds late; set FRAGMENT_CACHE_URL=redis://... '
+            'when running several workers.', app.config['FRAGMENT_CACHE_TTL']
+        )
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+    from .datatables import count_cache
+    count_cache.configure(ttl=app.config['DATATABLE_COUNT_TTL'])
+
+    from .assets import asset_url, assets, manifest
+    manifest.configure(app.static_folder, reload=app.debug)
+    app.add_template_global(asset_url)
+    app.register_blueprint(assets)
+
+    if app.config['INSTRUMENTATION']:
+        from .instrumentation import instrumentation
+        instrumentation.configure(
+            app.config['SLOW_REQUEST_MS'], window=app.config['INSTRUMENTATION_WINDOW']
+        )
+        instrumentation.init_app(app)
+
     # Register blueprints
     from .admin_routes import admin as admin_blueprint
     app.register_blueprint(admin_blueprint)
@@ -28,43 +86,8 @@ def create_app():
     from .routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
-    with app.app_context():
-        from . import models
-        db.create_all()
-
-        # Create default admin if not exists
-        from .models import User
-        admin = User.query.filter_by(email='admin@gmail.com').first()
-        if not admin:
-            admin = User(
-                username='admin',
-                full_name='Administrator',
-                email='admin@gmail.com',
-                role='Admin'
-            )
-            admin.set_password('admin')  # Set default password
-            db.session.add(admin)
-            db.session.commit()
-
-        # Load sample users from JSON file
-        import json
-        try:
-            with open('sample_users.json') as f:
-                users = json.load(f)
-                for user_data in users:
-                    existing_user = User.query.filter_by(email=user_data['email']).first()
-                    if not existing_user:
-                        user = User(
-                            student_number=user_data['student_number'],
-                            username=user_data['username'],
-                            full_name=user_data['full_name'],
-                            email=user_data['email'],
-                            role='User'
-                        )
-                        user.set_password(user_data['password'])
-                        db.session.add(user)
-                db.session.commit()
-        except FileNotFoundError:
-            print("sample_users.json file not found. Please ensure it exists in the project root directory.")
+    # Register CLI commands
+    from .commands import register_commands
+    register_commands(app)
 
     return app
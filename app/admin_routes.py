@@ -1,110 +1,212 @@
+import io
+from itertools import islice
+
 from flask import (
-    Blueprint, render_template, redirect, url_for, flash, request, jsonify
+    Blueprint, render_template, redirect, url_for, flash, request, jsonify,
+    current_app, Response, stream_with_context
 )
 from flask_login import login_required, current_user
-from datetime import datetime
-from sqlalchemy import or_
+from datetime import date, datetime, timedelta
+from sqlalchemy import or_, func, insert
+from sqlalchemy.orm import joinedload, selectinload
 
 from . import db
 from .models import (
-    Room, Equipment, User, Subject, StudentSubject, PCAssignment,
-    IssueReport, Maintenance, BorrowRequest, BorrowRequestStatus,
-    EquipmentType
+    Room, Equipment, User, Subject, StudentSubject, SubjectException, PCAssignment,
+    IssueReport, IssueCluster, Maintenance, BorrowRequest, BorrowRequestStatus,
+    EquipmentType, IssueType, touch_schedules, user_cache
+)
+from .allocation import allocate_laptops
+from .analytics import (
+    REPORTS, SLICE_DIMENSIONS, SlicingUnavailable, date_range, run_report, slice_issues
 )
+from .availability import occupancy
+from .counters import dashboard_stats, read_counters
+from .datatables import Column, DataTable, format_datetime
+from .events import feed, format_sse
+from .fragments import Lazy, fragment_cache
+from .instrumentation import instrumentation
+from .exports import EXPORTS, FORMATS, ExportUnavailable, export_stream
 from .decorators import admin_required
+from .recurrence import WEEKDAY_CODES, WEEKDAY_NAMES, format_days, parse_days
+from .provisioning import (
+    InventoryFormatError, create_room_with_pcs, existing_equipment_names,
+    import_inventory, parse_inventory
+)
+from .replica import use_read_replica
+from .reservations import ReservationConflict, change_status
+from .roster import RosterFormatError, import_roster, iter_roster
+from .search import SearchUnavailable, match_condition, search_issues
+from .scheduling import apply_seating_plan, find_seating_conflicts
 
 # Create a Blueprint for admin routes with a URL prefix
 admin = Blueprint('admin', __name__, url_prefix='/admin')
 
 
 @admin.route('/dashboard')
+@use_read_replica
 @login_required
 def admin_dashboard():
     """
     Admin dashboard route that displays rooms, subjects, PC assignments,
     maintenance tasks, new issues, and pending borrow requests.
+
+    Maintenance tasks, issues and borrow requests grow with history, so
+    their tables are paged server-side through the ``*_data`` endpoints.
     """
     if current_user.role != 'Admin':
         flash('You do not have permission to access this page.', 'danger')
         return redirect(url_for('main.dashboard'))
 
-    # Fetch data for the dashboard
-    rooms = Room.query.all()
-    subjects = Subject.query.all()
-    pc_assignments = PCAssignment.query.all()
-    maintenances = Maintenance.query.order_by(
-        Maintenance.scheduled_date.desc()
-    ).all()
-    new_issues = IssueReport.query.filter_by(status='Pending').all()
-    pending_borrow_requests = BorrowRequest.query.filter_by(
-        status=BorrowRequestStatus.Pending
-    ).all()
-
-    # Prepare a dictionary to hold current maintenance for each equipment
-    maintenance_dict = {}
-    for assignment in pc_assignments:
-        equipment = assignment.equipment
-        current_maintenance = Maintenance.query.filter(
-            Maintenance.equipment_id == equipment.id,
-            Maintenance.status.in_(['Scheduled', 'In Progress'])
-        ).first()
-        maintenance_dict[equipment.id] = current_maintenance
+    # Data for the dashboard, eager loading every relationship the template
+    # touches so the page costs a fixed number of queries. The tables are
+    # cached fragments, so each query only runs when its fragment is stale.
+    rooms = Lazy(lambda: Room.query.order_by(Room.id).all())
+    room_pc_counts = Lazy(lambda: dict(
+        db.session.query(Equipment.room_id, func.count(Equipment.id))
+        .filter(Equipment.room_id.isnot(None))
+        .group_by(Equipment.room_id)
+        .all()
+    ))
+    subjects = Lazy(lambda: Subject.query.options(joinedload(Subject.room)).all())
+    pc_assignments = Lazy(lambda: PCAssignment.query.options(
+        joinedload(PCAssignment.student),
+        joinedload(PCAssignment.subject),
+        joinedload(PCAssignment.equipment).joinedload(Equipment.room)
+    ).all())
+    # Current maintenance for each assigned equipment, in one aggregate query
+    maintenance_dict = Lazy(lambda: Maintenance.active_by_equipment(
+        {assignment.equipment_id for assignment in pc_assignments}
+    ))
 
     # Render the admin dashboard template with fetched data
     return render_template(
         'admin/admin_dashboard.html',
         rooms=rooms,
+        room_pc_counts=room_pc_counts,
         subjects=subjects,
         pc_assignments=pc_assignments,
-        maintenances=maintenances,
-        new_issues=new_issues,
-        pending_borrow_requests=pending_borrow_requests,
-        maintenance_dict=maintenance_dict
+        maintenance_dict=maintenance_dict,
+        stats=dashboard_stats(),
+        BorrowRequestStatus=BorrowRequestStatus
     )
 
 
+def _room_name(equipment):
+    return equipment.room.room_name if equipment.room else None
+
+
+def _equipment_label(equipment):
+    room_name = _room_name(equipment)
+    return f'{equipment.equipment_name} ({room_name or "No Room"})'
+
+
+@admin.route('/user_cache_stats')
+@admin_required
+def user_cache_stats():
+    """
+    API endpoint exposing the logged-in user cache hit/miss counters.
+    """
+    return jsonify(user_cache.stats())
+
+
+@admin.route('/fragment_cache_stats')
+@admin_required
+def fragment_cache_stats():
+    """
+    API endpoint exposing the template fragment cache counters.
+    """
+    return jsonify(fragment_cache.stats())
+
+
+@admin.route('/metrics')
+@admin_required
+def metrics():
+    """
+    Per-endpoint request timings and cache hit counts in the Prometheus text
+    format. Needs ``INSTRUMENTATION``.
+    """
+    if not current_app.config['INSTRUMENTATION']:
+        return jsonify({'error': 'Instrumentation is disabled; set INSTRUMENTATION=1.'}), 404
+    body = instrumentation.prometheus({
+        'user': user_cache.stats(),
+        'fragment': fragment_cache.stats(),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+@admin.route('/stats')
+@admin_required
+def stats():
+    """
+    API endpoint with the dashboard's headline figures, read from the
+    incrementally maintained counters. ``?raw=1`` adds every counter.
+    """
+    payload = dashboard_stats()
+    if request.args.get('raw'):
+        payload['counters'] = read_counters()
+    return jsonify(payload)
+
+
+@admin.route('/events')
+@admin_required
+def event_stream():
+    """
+    Server-Sent Events stream of issue report, borrow request and
+    maintenance changes for the live dashboard.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    heartbeat = current_app.config['EVENT_HEARTBEAT']
+    max_age = current_app.config['EVENT_STREAM_MAX_AGE']
+    # The stream outlives the view; don't keep a database connection for it
+    db.session.remove()
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        for event in feed.stream(last_event_id, heartbeat, max_age):
+            yield format_sse(event)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # CRUD Operations for Rooms
 
 @admin.route('/rooms/create', methods=['GET', 'POST'])
 @admin_required
 def create_room():
     """
-    Route to create a new room. Automatically adds 35 PCs to the room.
+    Route to create a new room. Automatically adds PCs to the room
+    (PCS_PER_ROOM by default, or the number given in the form).
     """
+    default_pc_count = current_app.config['PCS_PER_ROOM']
     if request.method == 'POST':
         room_name = request.form['room_name'].strip()
+        pc_count = request.form.get('pc_count', type=int, default=default_pc_count)
         if not room_name:
             flash('Room name cannot be empty.', 'danger')
             return redirect(url_for('admin.create_room'))
 
+        if pc_count is None or pc_count < 0:
+            flash('Number of PCs cannot be negative.', 'danger')
+            return redirect(url_for('admin.create_room'))
+
         # Check if the room already exists
         existing_room = Room.query.filter_by(room_name=room_name).first()
         if existing_room:
             flash('Room already exists.', 'danger')
             return redirect(url_for('admin.create_room'))
 
-        # Create new room
-        new_room = Room(room_name=room_name)
-        db.session.add(new_room)
-        db.session.commit()
+        # Create the room and bulk insert its PCs in one transaction
+        create_room_with_pcs(room_name, pc_count)
 
-        # Add 35 PCs to the new room
-        for i in range(1, 36):
-            pc = Equipment(
-                room_id=new_room.id,
-                equipment_name=f'PC-{i}',
-                status='Operational',
-                is_available=True,
-                equipment_type=EquipmentType.PC  # Ensure equipment type is PC
-            )
-            db.session.add(pc)
-        db.session.commit()
-
-        flash('Room created successfully with 35 PCs.', 'success')
+        flash(f'Room created successfully with {pc_count} PCs.', 'success')
         return redirect(url_for('admin.admin_dashboard'))
 
     # Render the room creation form
-    return render_template('admin/create_room.html')
+    return render_template('admin/create_room.html', default_pc_count=default_pc_count)
 
 
 @admin.route('/rooms/<int:room_id>/edit', methods=['GET', 'POST'])
@@ -226,6 +328,30 @@ def create_subject():
             flash('Start time must be before end time.', 'danger')
             return redirect(url_for('admin.create_subject'))
 
+        # Optional weekly recurrence: the first meeting is start_time/end_time
+        try:
+            recurrence_days = format_days(
+                parse_days(','.join(request.form.getlist('recurrence_days')))
+            )
+        except ValueError:
+            flash('Invalid weekday selection.', 'danger')
+            return redirect(url_for('admin.create_subject'))
+        term_end = None
+        exception_dates = set()
+        if recurrence_days:
+            if end_time.date() != start_time.date():
+                flash('A recurring class must start and end on the same day.', 'danger')
+                return redirect(url_for('admin.create_subject'))
+            try:
+                term_end = datetime.strptime(request.form['term_end'], '%Y-%m-%d').date()
+                exception_dates = _parse_dates(request.form.get('exception_dates', ''))
+            except (KeyError, ValueError):
+                flash('Invalid term end or exception date.', 'danger')
+                return redirect(url_for('admin.create_subject'))
+            if term_end < start_time.date():
+                flash('Term end must not be before the first class.', 'danger')
+                return redirect(url_for('admin.create_subject'))
+
         # Check if subject code already exists
         existing_subject = Subject.query.filter_by(subject_code=subject_code).first()
         if existing_subject:
@@ -238,7 +364,13 @@ def create_subject():
             subject_name=subject_name,
             room_id=room_id,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            recurrence_days=recurrence_days,
+            term_start=start_time.date() if recurrence_days else None,
+            term_end=term_end,
+            exceptions=[
+                SubjectException(exception_date=day) for day in sorted(exception_dates)
+            ]
         )
         db.session.add(subject)
         db.session.commit()
@@ -246,7 +378,63 @@ def create_subject():
         return redirect(url_for('admin.admin_dashboard'))
 
     # Render the subject creation form
-    return render_template('admin/create_subject.html', rooms=rooms)
+    return render_template('admin/create_subject.html', rooms=rooms,
+                           weekdays=list(zip(WEEKDAY_CODES, WEEKDAY_NAMES)))
+
+
+def _parse_dates(text):
+    """
+    Parse comma or newline separated YYYY-MM-DD dates into a set.
+    """
+    return {
+        datetime.strptime(part.strip(), '%Y-%m-%d').date()
+        for part in text.replace(',', '\n').splitlines()
+        if part.strip()
+    }
+
+
+@admin.route('/subjects/<int:subject_id>/exceptions', methods=['GET', 'POST'])
+@admin_required
+def subject_exceptions(subject_id):
+    """
+    Add or remove dates on which a recurring subject does not meet.
+    """
+    subject = Subject.query.get_or_404(subject_id)
+    if not subject.recurrence_days:
+        flash('Only recurring subjects have exception dates.', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    if request.method == 'POST':
+        remove_id = request.form.get('remove_id', type=int)
+        if remove_id is not None:
+            exception = SubjectException.query.filter_by(
+                id=remove_id, subject_id=subject.id
+            ).first_or_404()
+            db.session.delete(exception)
+            db.session.commit()
+            flash('Exception date removed.', 'success')
+            return redirect(url_for('admin.subject_exceptions', subject_id=subject.id))
+
+        try:
+            dates = _parse_dates(request.form.get('exception_dates', ''))
+        except ValueError:
+            flash('Dates must be in YYYY-MM-DD format.', 'danger')
+            return redirect(url_for('admin.subject_exceptions', subject_id=subject.id))
+
+        new_dates = sorted(dates - subject.exception_dates)
+        outside = [d for d in new_dates if not subject.term_start <= d <= subject.term_end]
+        if outside:
+            flash('Dates outside the term: ' + ', '.join(map(str, outside)), 'danger')
+            return redirect(url_for('admin.subject_exceptions', subject_id=subject.id))
+
+        db.session.add_all([
+            SubjectException(subject_id=subject.id, exception_date=day) for day in new_dates
+        ])
+        db.session.commit()
+        flash(f'{len(new_dates)} exception date(s) added.', 'success')
+        return redirect(url_for('admin.subject_exceptions', subject_id=subject.id))
+
+    return render_template('admin/subject_exceptions.html', subject=subject)
 
 
 @admin.route('/subjects/<int:subject_id>/assign_students', methods=['GET', 'POST'])
@@ -259,15 +447,20 @@ def assign_students(subject_id):
     users = User.query.filter_by(role='User').all()
 
     if request.method == 'POST':
-        student_ids = request.form.getlist('student_ids')
-        # Remove existing assignments
+        student_ids = {int(student_id) for student_id in request.form.getlist('student_ids')}
+        previous_ids = {
+            row[0] for row in db.session.query(StudentSubject.student_id)
+            .filter_by(subject_id=subject.id).all()
+        }
+
+        # Replace the enrollments and bump the affected students' calendars
+        # in one transaction
         StudentSubject.query.filter_by(subject_id=subject.id).delete()
-        db.session.commit()
-
-        # Assign new students
-        for student_id in student_ids:
-            assignment = StudentSubject(student_id=student_id, subject_id=subject.id)
-            db.session.add(assignment)
+        db.session.add_all([
+            StudentSubject(student_id=student_id, subject_id=subject.id)
+            for student_id in student_ids
+        ])
+        touch_schedules(previous_ids ^ student_ids)
         db.session.commit()
         flash('Students assigned successfully.', 'success')
         return redirect(url_for('admin.admin_dashboard'))
@@ -292,46 +485,40 @@ def assign_pcs(subject_id):
     room_pcs = Equipment.query.filter_by(room_id=subject.room_id).all()
 
     if request.method == 'POST':
-        # Remove existing PC assignments for this subject
-        PCAssignment.query.filter_by(subject_id=subject.id).delete()
-        db.session.commit()
-
-        # Assign PCs to students
+        # Build the whole seating plan from the form before touching the DB
+        plan = {}
         for student in students:
-            equipment_id = request.form.get(f'pc_student_{student.id}')
+            equipment_id = request.form.get(f'pc_student_{student.id}', type=int)
             if equipment_id:
-                # Check for overlapping assignments
-                overlapping_assignments = PCAssignment.query.join(Subject).filter(
-                    PCAssignment.equipment_id == equipment_id,
-                    Subject.start_time < subject.end_time,
-                    Subject.end_time > subject.start_time
-                ).all()
-                if overlapping_assignments:
-                    flash(
-                        f"PC {Equipment.query.get(equipment_id).equipment_name} "
-                        "is already assigned during this time.",
-                        'danger'
-                    )
-                    return redirect(url_for('admin.assign_pcs', subject_id=subject.id))
-
-                assignment = PCAssignment(
-                    subject_id=subject.id,
-                    student_id=student.id,
-                    equipment_id=equipment_id
-                )
-                db.session.add(assignment)
-        db.session.commit()
+                plan[student.id] = equipment_id
+
+        # Validate every seat at once and report all conflicts together
+        conflicts = find_seating_conflicts(subject, plan, room_pcs, students)
+        if conflicts:
+            for conflict in conflicts:
+                flash(conflict, 'danger')
+            return redirect(url_for('admin.assign_pcs', subject_id=subject.id))
+
+        apply_seating_plan(subject, plan)
         flash('PCs assigned to students successfully.', 'success')
         return redirect(url_for('admin.admin_dashboard'))
 
     # Map student IDs to their assigned PC IDs
     pc_assignments = {pa.student_id: pa.equipment_id for pa in subject.pc_assignments}
+    # Whether each PC is free whenever the subject meets
+    room = occupancy.room(subject.room_id)
+    exceptions = SubjectException.dates_by_subject([subject.id]).get(subject.id, ())
+    pc_states = {
+        equipment_id: room.schedule_state(equipment_id, subject, exceptions)
+        for equipment_id in room.pcs
+    }
     return render_template(
         'admin/assign_pcs.html',
         subject=subject,
         students=students,
         pcs=room_pcs,
-        pc_assignments=pc_assignments
+        pc_assignments=pc_assignments,
+        pc_states=pc_states
     )
 
 
@@ -343,10 +530,48 @@ def list_maintenances():
     """
     Route to list all maintenance tasks.
     """
-    maintenances = Maintenance.query.order_by(
-        Maintenance.scheduled_date.desc()
-    ).all()
-    return render_template('admin/list_maintenances.html', maintenances=maintenances)
+    return render_template('admin/list_maintenances.html')
+
+
+@admin.route('/maintenances/data')
+@use_read_replica
+@admin_required
+def maintenances_data():
+    """
+    DataTables server-side endpoint for the maintenance task lists.
+    """
+    query = Maintenance.query.join(Maintenance.equipment).outerjoin(
+        Equipment.room
+    ).join(Maintenance.reporter)
+    columns = [
+        Column('equipment', lambda m: _equipment_label(m.equipment),
+               Equipment.equipment_name, searchable=True),
+        Column('description', lambda m: m.description,
+               Maintenance.description, searchable=True),
+        Column('status', lambda m: m.status, Maintenance.status,
+               filter_expression=Maintenance.status),
+        Column('scheduled_date', lambda m: format_datetime(m.scheduled_date),
+               Maintenance.scheduled_date),
+        Column('completed_date', lambda m: format_datetime(m.completed_date),
+               Maintenance.completed_date),
+        Column('reported_by', lambda m: m.reporter.full_name,
+               User.full_name, searchable=True),
+        Column('actions', lambda m: {
+            'edit_url': url_for('admin.edit_maintenance', maintenance_id=m.id),
+            'delete_url': url_for('admin.delete_maintenance', maintenance_id=m.id),
+        }),
+        Column('room', lambda m: _room_name(m.equipment), Room.room_name,
+               searchable=True),
+    ]
+    table = DataTable(
+        Maintenance, query, columns,
+        default_order=Maintenance.scheduled_date.desc(),
+        load_options=[
+            joinedload(Maintenance.equipment).joinedload(Equipment.room),
+            joinedload(Maintenance.reporter),
+        ]
+    )
+    return jsonify(table.response(request.args))
 
 
 @admin.route('/maintenances/create', methods=['GET', 'POST'])
@@ -357,10 +582,14 @@ def create_maintenance():
     """
     equipments = Equipment.query.all()
     if request.method == 'POST':
-        equipment_id = request.form['equipment_id']
+        equipment_id = request.form.get('equipment_id', type=int)
         description = request.form['description'].strip()
         scheduled_date_str = request.form['scheduled_date']
 
+        if equipment_id is None:
+            flash('Please select the equipment to maintain.', 'danger')
+            return redirect(url_for('admin.create_maintenance'))
+
         # Parse scheduled date
         try:
             scheduled_date = datetime.strptime(scheduled_date_str, '%Y-%m-%dT%H:%M')
@@ -399,7 +628,11 @@ def edit_maintenance(maintenance_id):
     equipments = Equipment.query.all()
 
     if request.method == 'POST':
-        maintenance.equipment_id = request.form['equipment_id']
+        equipment_id = request.form.get('equipment_id', type=int)
+        if equipment_id is None:
+            flash('Please select the equipment to maintain.', 'danger')
+            return redirect(url_for('admin.edit_maintenance', maintenance_id=maintenance.id))
+        maintenance.equipment_id = equipment_id
         maintenance.description = request.form['description'].strip()
         scheduled_date_str = request.form['scheduled_date']
 
@@ -460,14 +693,54 @@ def delete_maintenance(maintenance_id):
 @admin_required
 def get_available_pcs(room_id):
     """
-    API endpoint to get a list of available PCs in a specific room.
+    API endpoint listing the PCs in a room that are operational, not under
+    maintenance and not booked by a class between ``start`` and ``end``.
     """
     room = Room.query.get_or_404(room_id)
-    pcs = Equipment.query.filter_by(room_id=room_id).all()
+    try:
+        start, end = _availability_window(request.args)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    return jsonify(occupancy.room(room.id).free_pcs(start, end))
+
+
+@admin.route('/rooms/available_pcs')
+@admin_required
+def get_available_pcs_all_rooms():
+    """
+    Bulk form of ``get_available_pcs`` covering every room at once.
+    """
+    try:
+        start, end = _availability_window(request.args)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
 
-    # Create a list of PCs with their ID and name
-    pc_list = [{'id': pc.id, 'name': pc.equipment_name} for pc in pcs]
-    return jsonify(pc_list)
+    room_ids = [room_id for room_id, in db.session.query(Room.id).order_by(Room.id)]
+    rooms = occupancy.rooms(room_ids)
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'rooms': {str(room_id): rooms[room_id].free_pcs(start, end) for room_id in room_ids},
+    })
+
+
+def _availability_window(args):
+    """
+    Read the ``start``/``end`` ISO 8601 query parameters. ``start`` defaults
+    to now; without ``end`` the PCs free at the instant ``start`` are asked
+    for.
+    """
+    try:
+        start = datetime.fromisoformat(args['start']) if args.get('start') else datetime.now()
+        end = datetime.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        raise ValueError('start and end must be ISO 8601 date/times.') from None
+    if end is None:
+        end = start + timedelta(microseconds=1)
+    if end <= start:
+        raise ValueError('end must be after start.')
+    return start, end
 
 
 # Issue Reports Management
@@ -478,8 +751,87 @@ def view_issue_reports():
     """
     Route to view all issue reports submitted by students.
     """
-    issues = IssueReport.query.order_by(IssueReport.created_at.desc()).all()
-    return render_template('admin/view_issue_reports.html', issues=issues)
+    return render_template('admin/view_issue_reports.html')
+
+
+@admin.route('/issue_reports/data')
+@use_read_replica
+@admin_required
+def issue_reports_data():
+    """
+    DataTables server-side endpoint for the issue report lists.
+    """
+    query = IssueReport.query.join(IssueReport.user).join(
+        IssueReport.equipment
+    ).outerjoin(Equipment.room)
+    columns = [
+        Column('reported_by', lambda i: i.user.full_name,
+               User.full_name, searchable=True),
+        Column('equipment', lambda i: _equipment_label(i.equipment),
+               Equipment.equipment_name, searchable=True),
+        Column('issue_type', lambda i: i.issue_type.value, IssueReport.issue_type,
+               filter_expression=IssueReport.issue_type, filter_type=IssueType),
+        Column('software', lambda i: i.software or '-',
+               IssueReport.software, searchable=True),
+        Column('description', lambda i: i.description,
+               IssueReport.description, searchable=True),
+        Column('created_at', lambda i: format_datetime(i.created_at),
+               IssueReport.created_at),
+        Column('status', lambda i: i.status, IssueReport.status,
+               filter_expression=IssueReport.status),
+        Column('actions', lambda i: {
+            'update_status_url': url_for('admin.update_issue_status', issue_id=i.id),
+        }),
+        Column('room', lambda i: _room_name(i.equipment), Room.room_name,
+               searchable=True),
+    ]
+    table = DataTable(
+        IssueReport, query, columns,
+        default_order=IssueReport.created_at.desc(),
+        load_options=[
+            joinedload(IssueReport.user),
+            joinedload(IssueReport.equipment).joinedload(Equipment.room),
+        ],
+        search=match_condition
+    )
+    return jsonify(table.response(request.args))
+
+
+@admin.route('/issue_reports/search')
+@use_read_replica
+@admin_required
+def search_issue_reports():
+    """
+    API endpoint for full-text search over issue reports, best matches
+    first. ``cursor`` from one page fetches the next.
+    """
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    try:
+        page = search_issues(query, limit, request.args.get('cursor'))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    except SearchUnavailable as exc:
+        return jsonify({'error': str(exc)}), 503
+
+    return jsonify({
+        'results': [
+            {
+                'id': result.issue.id,
+                'score': round(result.score, 4),
+                'reported_by': result.issue.user.full_name,
+                'equipment': _equipment_label(result.issue.equipment),
+                'issue_type': result.issue.issue_type.value,
+                'software': result.issue.software,
+                'status': result.issue.status,
+                'created_at': format_datetime(result.issue.created_at),
+                'snippet': str(result.snippet),
+                'update_status_url': url_for('admin.update_issue_status', issue_id=result.issue.id),
+            }
+            for result in page.results
+        ],
+        'next_cursor': page.next_cursor,
+    })
 
 
 @admin.route('/issue_reports/<int:issue_id>/update_status', methods=['POST'])
@@ -490,12 +842,64 @@ def update_issue_status(issue_id):
     """
     issue = IssueReport.query.get_or_404(issue_id)
     new_status = request.form['status']
-    issue.status = new_status
+    issue.set_status(new_status)
     db.session.commit()
     flash('Issue status updated successfully.', 'success')
     return redirect(url_for('admin.view_issue_reports'))
 
 
+@admin.route('/issue_clusters')
+@use_read_replica
+@admin_required
+def view_issue_clusters():
+    """
+    Route to list groups of open issue reports that look like duplicates.
+    """
+    open_clusters = db.session.query(IssueReport.cluster_id).filter(
+        IssueReport.cluster_id.isnot(None),
+        IssueReport.status != 'Resolved'
+    ).group_by(IssueReport.cluster_id).having(func.count() >= 2)
+    clusters = IssueCluster.query.filter(
+        IssueCluster.id.in_(open_clusters)
+    ).options(
+        selectinload(IssueCluster.issues).joinedload(IssueReport.user),
+        selectinload(IssueCluster.issues).joinedload(IssueReport.equipment)
+        .joinedload(Equipment.room),
+    ).order_by(IssueCluster.created_at.desc()).all()
+    return render_template('admin/issue_clusters.html', clusters=clusters,
+                           equipment_label=_equipment_label)
+
+
+@admin.route('/issue_clusters/<int:cluster_id>/resolve', methods=['POST'])
+@admin_required
+def resolve_issue_cluster(cluster_id):
+    """
+    Route to resolve every open report in a cluster at once.
+    """
+    cluster = IssueCluster.query.get_or_404(cluster_id)
+    resolved = 0
+    for issue in cluster.issues:
+        if issue.status != 'Resolved':
+            issue.set_status('Resolved')
+            resolved += 1
+    db.session.commit()
+    flash(f'Resolved {resolved} issue report(s).', 'success')
+    return redirect(url_for('admin.view_issue_clusters'))
+
+
+@admin.route('/issue_reports/<int:issue_id>/uncluster', methods=['POST'])
+@admin_required
+def uncluster_issue(issue_id):
+    """
+    Route to take a report that is not really a duplicate out of its cluster.
+    """
+    issue = IssueReport.query.get_or_404(issue_id)
+    issue.cluster = None
+    db.session.commit()
+    flash('Issue report removed from its group.', 'success')
+    return redirect(url_for('admin.view_issue_clusters'))
+
+
 # Borrow Requests Management
 
 @admin.route('/borrow_requests')
@@ -504,16 +908,91 @@ def view_borrow_requests():
     """
     Route to view all laptop borrow requests.
     """
-    requests = BorrowRequest.query.order_by(
-        BorrowRequest.request_date.desc()
-    ).all()
     return render_template(
         'admin/borrow_requests.html',
-        requests=requests,
         BorrowRequestStatus=BorrowRequestStatus
     )
 
 
+@admin.route('/borrow_requests/data')
+@use_read_replica
+@admin_required
+def borrow_requests_data():
+    """
+    DataTables server-side endpoint for the borrow request lists.
+    """
+    query = BorrowRequest.query.join(BorrowRequest.user).outerjoin(
+        BorrowRequest.equipment
+    )
+    columns = [
+        Column('id', lambda r: r.id, BorrowRequest.id),
+        Column('user', lambda r: r.user.full_name, User.full_name,
+               searchable=True),
+        Column('equipment', lambda r: r.equipment.equipment_name if r.equipment else 'Any laptop',
+               Equipment.equipment_name, searchable=True),
+        Column('status', lambda r: r.status.value, BorrowRequest.status,
+               filter_expression=BorrowRequest.status,
+               filter_type=BorrowRequestStatus),
+        Column('request_date', lambda r: format_datetime(r.request_date),
+               BorrowRequest.request_date),
+        Column('actions', lambda r: {
+            'update_status_url': url_for(
+                'admin.update_borrow_request_status', request_id=r.id
+            ),
+        }),
+    ]
+    table = DataTable(
+        BorrowRequest, query, columns,
+        default_order=BorrowRequest.request_date.desc(),
+        load_options=[
+            joinedload(BorrowRequest.user),
+            joinedload(BorrowRequest.equipment),
+        ]
+    )
+    return jsonify(table.response(request.args))
+
+
+@admin.route('/borrow_requests/allocate', methods=['GET', 'POST'])
+@admin_required
+def allocate_borrow_requests():
+    """
+    Approve the pending borrow requests for a time slot in one pass,
+    handing out free laptops oldest request first.
+    """
+    now = datetime.now().replace(second=0, microsecond=0)
+    form = {
+        'start': now.strftime('%Y-%m-%dT%H:%M'),
+        'end': (now + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M'),
+        'per_student': 1,
+    }
+    report = None
+
+    if request.method == 'POST':
+        form.update(request.form.to_dict())
+        try:
+            window_start = datetime.strptime(form['start'], '%Y-%m-%dT%H:%M')
+            window_end = datetime.strptime(form['end'], '%Y-%m-%dT%H:%M')
+            per_student = int(form['per_student'])
+        except ValueError:
+            flash('Invalid time slot or per-student limit.', 'danger')
+            return redirect(url_for('admin.allocate_borrow_requests'))
+        if window_start >= window_end or per_student < 1:
+            flash('The slot must end after it starts and the limit must be at least 1.', 'danger')
+            return redirect(url_for('admin.allocate_borrow_requests'))
+
+        try:
+            report = allocate_laptops(window_start, window_end, current_user.id, per_student)
+        except ReservationConflict as exc:
+            flash(f'{exc} Please run the allocation again.', 'warning')
+            return redirect(url_for('admin.allocate_borrow_requests'))
+
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(report.as_dict())
+        flash(f'{len(report.allocated)} of {report.considered} request(s) approved.', 'success')
+
+    return render_template('admin/allocate_laptops.html', form=form, report=report)
+
+
 @admin.route('/borrow_requests/<int:request_id>/update_status', methods=['POST'])
 @admin_required
 def update_borrow_request_status(request_id):
@@ -521,25 +1000,24 @@ def update_borrow_request_status(request_id):
     Route to update the status of a borrow request.
     """
     borrow_request = BorrowRequest.query.get_or_404(request_id)
-    new_status_value = request.form['status']
 
-    # Validate and set new status
     try:
-        new_status = BorrowRequestStatus(new_status_value)
-        borrow_request.status = new_status
+        new_status = BorrowRequestStatus(request.form['status'])
     except ValueError:
         flash('Invalid status.', 'danger')
         return redirect(url_for('admin.view_borrow_requests'))
 
-    borrow_request.admin_id = current_user.id
-
-    # Update laptop availability based on status
-    if new_status == BorrowRequestStatus.Approved:
-        borrow_request.equipment.is_available = False
-    elif new_status == BorrowRequestStatus.Returned:
-        borrow_request.equipment.is_available = True
+    # Approval claims the laptop atomically, so concurrent approvals for the
+    # same laptop cannot both succeed
+    try:
+        change_status(borrow_request.id, new_status, current_user.id)
+    except ValueError as exc:
+        flash(str(exc), 'danger')
+        return redirect(url_for('admin.view_borrow_requests'))
+    except ReservationConflict as exc:
+        flash(str(exc), 'warning')
+        return redirect(url_for('admin.view_borrow_requests'))
 
-    db.session.commit()
     flash('Borrow request status updated successfully.', 'success')
     return redirect(url_for('admin.view_borrow_requests'))
 
@@ -619,26 +1097,26 @@ def add_laptops():
             flash('Number of laptops must be at least 1.', 'danger')
             return redirect(url_for('admin.add_laptops'))
 
-        added_laptops = []
-        for i in range(starting_index, starting_index + num_laptops):
-            laptop_name = f'Laptop-{i}'
-            # Check if laptop already exists
-            existing_laptop = Equipment.query.filter_by(
-                equipment_name=laptop_name
-            ).first()
-            if existing_laptop:
+        laptop_names = [
+            f'Laptop-{i}' for i in range(starting_index, starting_index + num_laptops)
+        ]
+        # Check which laptops already exist with a single query
+        existing_names = existing_equipment_names(laptop_names)
+        for laptop_name in laptop_names:
+            if laptop_name in existing_names:
                 flash(f'{laptop_name} already exists.', 'warning')
-                continue  # Skip adding this laptop
-
-            laptop = Equipment(
-                equipment_name=laptop_name,
-                equipment_type=EquipmentType.Laptop,
-                status='Operational',
-                is_available=True
-            )
-            db.session.add(laptop)
-            added_laptops.append(laptop_name)
 
+        added_laptops = [name for name in laptop_names if name not in existing_names]
+        if added_laptops:
+            db.session.execute(insert(Equipment), [
+                {
+                    'equipment_name': laptop_name,
+                    'equipment_type': EquipmentType.Laptop,
+                    'status': 'Operational',
+                    'is_available': True,
+                }
+                for laptop_name in added_laptops
+            ])
         db.session.commit()
 
         if added_laptops:
@@ -650,3 +1128,204 @@ def add_laptops():
 
     # Render the add laptops form
     return render_template('admin/add_laptops.html')
+
+
+@admin.route('/equipment/import', methods=['GET', 'POST'])
+@admin_required
+def import_equipment():
+    """
+    Route to bulk import equipment from a CSV or JSON inventory file.
+    """
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('inventory_file')
+        if not upload or not upload.filename:
+            flash('Please choose an inventory file to upload.', 'danger')
+            return redirect(url_for('admin.import_equipment'))
+
+        try:
+            records = parse_inventory(upload.stream, upload.filename)
+        except InventoryFormatError as exc:
+            flash(str(exc), 'danger')
+            return redirect(url_for('admin.import_equipment'))
+
+        report = import_inventory(records, create_rooms='create_rooms' in request.form)
+        flash(
+            f'Imported {report.created} equipment, skipped {len(report.skipped)} '
+            f'existing, {len(report.errors)} rows with errors.',
+            'success' if report.ok else 'warning'
+        )
+
+    return render_template('admin/import_equipment.html', report=report)
+
+
+@admin.route('/students/import', methods=['GET', 'POST'])
+@admin_required
+def import_students():
+    """
+    Route to bulk import students from a CSV, JSON Lines or JSON roster.
+
+    Passwords are hashed inside the request, so uploads are capped at
+    ROSTER_UPLOAD_MAX_ROWS rows; larger intakes go through ``flask roster
+    import``, which hashes across every CPU.
+    """
+    max_rows = current_app.config['ROSTER_UPLOAD_MAX_ROWS']
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('roster_file')
+        if not upload or not upload.filename:
+            flash('Please choose a roster file to upload.', 'danger')
+            return redirect(url_for('admin.import_students'))
+
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        try:
+            # Checked before anything is written, so a large file imports nothing
+            records = list(islice(iter_roster(stream, upload.filename), max_rows + 1))
+            if len(records) > max_rows:
+                flash(
+                    f'Rosters of more than {max_rows} students must be imported with '
+                    f'"flask roster import {upload.filename}" on the server.',
+                    'danger'
+                )
+                return redirect(url_for('admin.import_students'))
+            report = import_roster(records)
+        except RosterFormatError as exc:
+            flash(str(exc), 'danger')
+            return redirect(url_for('admin.import_students'))
+        except UnicodeDecodeError:
+            flash('Roster file must be UTF-8 encoded.', 'danger')
+            return redirect(url_for('admin.import_students'))
+
+        flash(
+            f'Imported {report.created} students, skipped {len(report.skipped)}, '
+            f'{len(report.errors)} rows with errors.',
+            'success' if not report.errors else 'warning'
+        )
+
+    return render_template('admin/import_students.html', report=report, max_rows=max_rows)
+
+
+# Reports
+
+def _report_dates(args):
+    """
+    Read the ``start``/``end`` (YYYY-MM-DD) query parameters, defaulting to
+    the 90 days up to today.
+    """
+    try:
+        end_date = date.fromisoformat(args['end']) if args.get('end') else date.today()
+        start_date = (date.fromisoformat(args['start']) if args.get('start')
+                      else end_date - timedelta(days=89))
+    except ValueError:
+        raise ValueError('start and end must be dates (YYYY-MM-DD).') from None
+    if start_date > end_date:
+        raise ValueError('start must not be after end.')
+    return start_date, end_date
+
+
+@admin.route('/reports')
+@use_read_replica
+@admin_required
+def reports():
+    """
+    Route showing every issue and maintenance report for a date range.
+    """
+    try:
+        start_date, end_date = _report_dates(request.args)
+    except ValueError as exc:
+        flash(str(exc), 'danger')
+        return redirect(url_for('admin.reports'))
+
+    start, end = date_range(start_date, end_date)
+    results = {name: run_report(name, start, end) for name in REPORTS}
+    return render_template(
+        'admin/reports.html',
+        start_date=start_date,
+        end_date=end_date,
+        reports=REPORTS,
+        results=results,
+        slice_dimensions=SLICE_DIMENSIONS,
+        exports=EXPORTS,
+        export_formats=FORMATS
+    )
+
+
+@admin.route('/reports/data')
+@use_read_replica
+@admin_required
+def reports_data():
+    """
+    API endpoint returning report rows for a date range: every report, the
+    one named by ``report``, or an ad-hoc slice grouped by the comma
+    separated dimensions in ``by``.
+    """
+    try:
+        start_date, end_date = _report_dates(request.args)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    start, end = date_range(start_date, end_date)
+    payload = {'start': start_date.isoformat(), 'end': end_date.isoformat()}
+
+    if request.args.get('by'):
+        try:
+            payload['slice'] = slice_issues(start, end, request.args['by'].split(','))
+        except ValueError as exc:
+            return jsonify({'error': str(exc)}), 400
+        except SlicingUnavailable as exc:
+            return jsonify({'error': str(exc)}), 501
+        return jsonify(payload)
+
+    names = [request.args['report']] if request.args.get('report') else list(REPORTS)
+    unknown = [name for name in names if name not in REPORTS]
+    if unknown:
+        return jsonify({'error': f"Unknown report '{unknown[0]}'."}), 404
+    payload['reports'] = {name: run_report(name, start, end) for name in names}
+    return jsonify(payload)
+
+
+# Exports
+
+def _export_range(args):
+    """
+    Read the optional ``start``/``end`` (YYYY-MM-DD) query parameters as the
+    datetimes bounding those whole days.
+    """
+    try:
+        start = date.fromisoformat(args['start']) if args.get('start') else None
+        end = date.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        raise ValueError('start and end must be dates (YYYY-MM-DD).') from None
+    if start and end and start > end:
+        raise ValueError('start must not be after end.')
+    return (
+        datetime.combine(start, datetime.min.time()) if start else None,
+        datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None,
+    )
+
+
+@admin.route('/exports/<name>.<format>')
+@use_read_replica
+@admin_required
+def export_data(name, format):
+    """
+    Stream a full export of issue reports, maintenances or borrow requests
+    as CSV or XLSX, filtered by the optional ``start``, ``end`` and
+    ``status`` query parameters.
+    """
+    try:
+        start, end = _export_range(request.args)
+        content = export_stream(name, format, start, end, request.args.get('status'))
+    except ValueError as exc:
+        flash(str(exc), 'danger')
+        return redirect(url_for('admin.reports'))
+    except ExportUnavailable as exc:
+        flash(str(exc), 'warning')
+        return redirect(url_for('admin.reports'))
+
+    mimetype, extension = FORMATS[format]
+    response = Response(stream_with_context(content), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename={name}-{date.today():%Y%m%d}.{extension}'
+    )
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
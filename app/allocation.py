@@ -0,0 +1,207 @@
+# app/allocation.py
+
+"""
+Batch allocation of laptops to pending borrow requests.
+
+``allocate_laptops`` takes every pending request whose class meets in a time
+slot and hands out the free laptops in one pass. Requests are served in
+request order, so the earliest requests are filled first, and each student
+is capped at ``per_student`` laptops on loan. Requests that named a laptop
+are served first and get that laptop if it is still free, so an earlier
+request for any laptop cannot take it from them; the remaining requests,
+including named ones whose laptop is gone, get any free laptop.
+
+All assignments are written in one transaction of two compare-and-swap
+UPDATEs. If a laptop or request changed while the plan was being made, the
+transaction is rolled back and the allocation is planned again.
+"""
+
+from collections import Counter, namedtuple
+
+from sqlalchemy import case, or_, true
+
+from . import db
+from .counters import count_transition
+from .events import queue_event
+from .fragments import touch
+from .models import (
+    BorrowRequest, BorrowRequestStatus, Equipment, EquipmentType, Subject,
+    SubjectException, User
+)
+from .notifications import notify_status
+from .recurrence import occurrences
+from .reservations import ReservationConflict
+
+Allocation = namedtuple('Allocation', 'request_id student laptop student_id')
+Unserved = namedtuple('Unserved', 'request_id student reason')
+
+
+class AllocationReport:
+    """
+    What one allocation run did.
+    """
+
+    def __init__(self, window_start, window_end):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.considered = 0
+        self.allocated = []
+        self.unserved = []
+        self.laptops_left = 0
+        self.attempts = 0
+
+    def as_dict(self):
+        return {
+            'window_start': self.window_start.isoformat(),
+            'window_end': self.window_end.isoformat(),
+            'considered': self.considered,
+            'allocated': [a._asdict() for a in self.allocated],
+            'unserved': [u._asdict() for u in self.unserved],
+            'laptops_left': self.laptops_left,
+            'attempts': self.attempts,
+        }
+
+
+def _pending_requests(window_start, window_end):
+    """
+    Pending requests, oldest first, whose class meets in the window.
+    Requests without a subject have no slot and are always included.
+    """
+    rows = db.session.query(
+        BorrowRequest.id, BorrowRequest.user_id, BorrowRequest.equipment_id,
+        BorrowRequest.subject_id, User.full_name,
+        Subject.start_time, Subject.end_time,
+        Subject.recurrence_days, Subject.term_start, Subject.term_end
+    ).join(
+        User, BorrowRequest.user_id == User.id
+    ).outerjoin(
+        Subject, BorrowRequest.subject_id == Subject.id
+    ).filter(
+        BorrowRequest.status == BorrowRequestStatus.Pending,
+        or_(BorrowRequest.subject_id.is_(None), Subject.overlapping(window_start, window_end))
+    ).order_by(BorrowRequest.request_date, BorrowRequest.id).all()
+
+    exceptions = SubjectException.dates_by_subject(
+        row.subject_id for row in rows if row.recurrence_days
+    )
+    return [
+        row for row in rows
+        if row.subject_id is None or next(occurrences(
+            row, window_start, window_end, exceptions.get(row.subject_id, ())
+        ), None) is not None
+    ]
+
+
+def plan_allocation(window_start, window_end, per_student=1):
+    """
+    Decide which laptop each pending request gets, without writing.
+    Returns ``(report, assignments)`` where ``assignments`` maps request
+    ids to laptop ids.
+    """
+    report = AllocationReport(window_start, window_end)
+    pending = _pending_requests(window_start, window_end)
+    report.considered = len(pending)
+
+    free = dict(db.session.query(Equipment.id, Equipment.equipment_name).filter(
+        Equipment.equipment_type == EquipmentType.Laptop,
+        Equipment.is_available == true(),
+        Equipment.status == 'Operational'
+    ).order_by(Equipment.equipment_name, Equipment.id).all())
+
+    student_ids = {row.user_id for row in pending}
+    on_loan = Counter(dict(db.session.query(
+        BorrowRequest.user_id, db.func.count()
+    ).filter(
+        BorrowRequest.status == BorrowRequestStatus.Approved,
+        BorrowRequest.user_id.in_(student_ids)
+    ).group_by(BorrowRequest.user_id).all())) if student_ids else Counter()
+
+    assignments = {}
+
+    def assign(row, laptop_id):
+        report.allocated.append(
+            Allocation(row.id, row.full_name, free.pop(laptop_id), row.user_id)
+        )
+        assignments[row.id] = laptop_id
+        on_loan[row.user_id] += 1
+
+    for row in pending:
+        if row.equipment_id in free and on_loan[row.user_id] < per_student:
+            assign(row, row.equipment_id)
+
+    for row in pending:
+        if row.id in assignments:
+            continue
+        if on_loan[row.user_id] >= per_student:
+            report.unserved.append(Unserved(
+                row.id, row.full_name, f'already has {per_student} laptop(s)'
+            ))
+        elif not free:
+            report.unserved.append(Unserved(row.id, row.full_name, 'no laptop free'))
+        else:
+            assign(row, next(iter(free)))
+
+    position = {row.id: index for index, row in enumerate(pending)}
+    report.allocated.sort(key=lambda allocation: position[allocation.request_id])
+    report.laptops_left = len(free)
+    return report, assignments
+
+
+def allocate_laptops(window_start, window_end, admin_id, per_student=1, max_attempts=3):
+    """
+    Allocate free laptops to the pending requests for the window and
+    approve them in one transaction. Returns an ``AllocationReport``.
+    """
+    requests = BorrowRequest.__table__
+    equipment = Equipment.__table__
+
+    for attempt in range(1, max_attempts + 1):
+        report, assignments = plan_allocation(window_start, window_end, per_student)
+        report.attempts = attempt
+        if not assignments:
+            db.session.rollback()
+            return report
+
+        laptop_ids = list(assignments.values())
+        connection = db.session.connection()
+        try:
+            claimed = connection.execute(
+                equipment.update().where(
+                    equipment.c.id.in_(laptop_ids), equipment.c.is_available == true()
+                ).values(is_available=False)
+            )
+            if claimed.rowcount != len(laptop_ids):
+                raise ReservationConflict('A laptop was loaned out during allocation.')
+
+            approved = connection.execute(
+                requests.update().where(
+                    requests.c.id.in_(list(assignments)),
+                    requests.c.status == BorrowRequestStatus.Pending
+                ).values(
+                    status=BorrowRequestStatus.Approved,
+                    admin_id=admin_id,
+                    equipment_id=case(assignments, value=requests.c.id)
+                )
+            )
+            if approved.rowcount != len(assignments):
+                raise ReservationConflict('A request was processed during allocation.')
+            count_transition(connection, BorrowRequest, BorrowRequestStatus.Pending,
+                             BorrowRequestStatus.Approved, len(assignments))
+            notify_status(connection, BorrowRequest, [
+                (allocation.request_id, allocation.student_id, BorrowRequestStatus.Approved)
+                for allocation in report.allocated
+            ])
+            touch(db.session, BorrowRequest.__tablename__, Equipment.__tablename__)
+            for allocation in report.allocated:
+                queue_event(db.session, 'borrow_request', 'status_changed',
+                            id=allocation.request_id, status=BorrowRequestStatus.Approved,
+                            equipment_id=assignments[allocation.request_id])
+            db.session.commit()
+            return report
+        except ReservationConflict:
+            db.session.rollback()
+            if attempt == max_attempts:
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
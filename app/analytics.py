@@ -0,0 +1,365 @@
+# app/analytics.py
+
+"""
+Reports over the issue and maintenance history.
+
+Every report is a single GROUP BY query over a date range, so the database
+does the counting and only the summary rows reach Python. Results are
+cached in ``report_cache`` by report, range and parameters.
+
+For ad-hoc questions ``slice_issues`` loads the issues in a range into a
+pandas DataFrame and groups them by any combination of dimensions. It needs
+the optional ``pandas`` package.
+"""
+
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Date, Float, String, case, func, select, type_coerce
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from . import db
+from .cache import TTLCache
+from .models import Equipment, IssueReport, IssueType, Maintenance, Room
+
+# Report results by (report, start, end, parameters); TTL set in create_app
+report_cache = TTLCache(maxsize=256, ttl=600)
+# Issue DataFrames by range, so repeated slices of a range skip the load
+frame_cache = TTLCache(maxsize=4, ttl=600)
+
+NO_ROOM = 'No Room'
+
+
+class SlicingUnavailable(RuntimeError):
+    """
+    Raised when the in-memory slicing path is used without pandas.
+    """
+
+
+class week_start(FunctionElement):
+    """
+    The Monday of the week containing a datetime, as a date.
+    """
+    type = Date()
+    name = 'week_start'
+    inherit_cache = True
+
+
+@compiles(week_start)
+def _week_start_mysql(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    return f'DATE(DATE_SUB({value}, INTERVAL WEEKDAY({value}) DAY))'
+
+
+@compiles(week_start, 'sqlite')
+def _week_start_sqlite(element, compiler, **kw):
+    # 'weekday 0' moves forward to Sunday (or stays on one)
+    return f"date({compiler.process(element.clauses, **kw)}, 'weekday 0', '-6 days')"
+
+
+@compiles(week_start, 'postgresql')
+def _week_start_postgresql(element, compiler, **kw):
+    return f"CAST(date_trunc('week', {compiler.process(element.clauses, **kw)}) AS DATE)"
+
+
+class seconds_between(FunctionElement):
+    """
+    Seconds from the first datetime to the second.
+    """
+    type = Float()
+    name = 'seconds_between'
+    inherit_cache = True
+
+
+@compiles(seconds_between)
+def _seconds_between_mysql(element, compiler, **kw):
+    start, end = (compiler.process(c, **kw) for c in element.clauses)
+    return f'TIMESTAMPDIFF(SECOND, {start}, {end})'
+
+
+@compiles(seconds_between, 'sqlite')
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = (compiler.process(c, **kw) for c in element.clauses)
+    return f'((julianday({end}) - julianday({start})) * 86400.0)'
+
+
+@compiles(seconds_between, 'postgresql')
+def _seconds_between_postgresql(element, compiler, **kw):
+    start, end = (compiler.process(c, **kw) for c in element.clauses)
+    return f'EXTRACT(EPOCH FROM ({end} - {start}))'
+
+
+def _hours(seconds):
+    return None if seconds is None else round(float(seconds) / 3600, 2)
+
+
+def _iso(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+def _in_range(column, start, end):
+    return column >= start, column < end
+
+
+def date_range(start_date, end_date):
+    """
+    The datetimes bounding whole days ``start_date`` to ``end_date``
+    inclusive, as used by every report.
+    """
+    return (datetime.combine(start_date, time.min),
+            datetime.combine(end_date + timedelta(days=1), time.min))
+
+
+def issues_per_room_week(start, end):
+    """
+    Issues reported in each room, by week.
+    """
+    week = week_start(IssueReport.created_at).label('week')
+    rows = db.session.query(
+        week, Room.id, Room.room_name, func.count(IssueReport.id)
+    ).select_from(IssueReport).join(
+        Equipment, IssueReport.equipment_id == Equipment.id
+    ).outerjoin(
+        Room, Equipment.room_id == Room.id
+    ).filter(
+        *_in_range(IssueReport.created_at, start, end)
+    ).group_by(week, Room.id, Room.room_name).order_by(week, Room.room_name).all()
+    return [
+        {'week': _iso(week), 'room_id': room_id, 'room': room_name or NO_ROOM, 'issues': count}
+        for week, room_id, room_name, count in rows
+    ]
+
+
+def resolution_time_by_type(start, end):
+    """
+    Issues reported and resolved per issue type, with the mean, fastest and
+    slowest time to resolve.
+    """
+    resolved = IssueReport.resolved_at.isnot(None)
+    seconds = case((resolved, seconds_between(IssueReport.created_at, IssueReport.resolved_at)))
+    rows = db.session.query(
+        IssueReport.issue_type,
+        func.count(IssueReport.id),
+        func.count(IssueReport.resolved_at),
+        func.avg(seconds), func.min(seconds), func.max(seconds)
+    ).filter(
+        *_in_range(IssueReport.created_at, start, end)
+    ).group_by(IssueReport.issue_type).order_by(IssueReport.issue_type).all()
+    return [
+        {
+            'issue_type': issue_type.value,
+            'reported': reported,
+            'resolved': resolved_count,
+            'mean_hours_to_resolve': _hours(mean),
+            'min_hours_to_resolve': _hours(fastest),
+            'max_hours_to_resolve': _hours(slowest),
+        }
+        for issue_type, reported, resolved_count, mean, fastest, slowest in rows
+    ]
+
+
+def top_software(start, end, limit=10):
+    """
+    The software titles named most often in issue reports. Titles are
+    compared without case or surrounding spaces.
+    """
+    title = func.lower(func.trim(IssueReport.software))
+    rows = db.session.query(
+        func.min(IssueReport.software), func.count(IssueReport.id),
+        func.count(IssueReport.resolved_at)
+    ).filter(
+        IssueReport.software.isnot(None),
+        title != '',
+        *_in_range(IssueReport.created_at, start, end)
+    ).group_by(title).order_by(func.count(IssueReport.id).desc(), title).limit(limit).all()
+    return [
+        {'software': software.strip(), 'issues': count, 'resolved': resolved}
+        for software, count, resolved in rows
+    ]
+
+
+def repeat_failures(start, end, min_reports=3, limit=50):
+    """
+    Equipment with at least ``min_reports`` issues in the range.
+    """
+    count = func.count(IssueReport.id)
+    rows = db.session.query(
+        Equipment.id, Equipment.equipment_name, Room.room_name, count,
+        func.sum(case((IssueReport.resolved_at.is_(None), 1), else_=0)),
+        func.min(IssueReport.created_at), func.max(IssueReport.created_at)
+    ).select_from(IssueReport).join(
+        Equipment, IssueReport.equipment_id == Equipment.id
+    ).outerjoin(
+        Room, Equipment.room_id == Room.id
+    ).filter(
+        *_in_range(IssueReport.created_at, start, end)
+    ).group_by(
+        Equipment.id, Equipment.equipment_name, Room.room_name
+    ).having(count >= min_reports).order_by(count.desc(), Equipment.equipment_name).limit(limit).all()
+    return [
+        {
+            'equipment_id': equipment_id,
+            'equipment': name,
+            'room': room_name or NO_ROOM,
+            'issues': issues,
+            'unresolved': int(unresolved or 0),
+            'first_reported': _iso(first),
+            'last_reported': _iso(last),
+        }
+        for equipment_id, name, room_name, issues, unresolved, first, last in rows
+    ]
+
+
+def maintenance_turnaround(start, end):
+    """
+    Maintenance tasks scheduled per room, and the mean hours from the
+    scheduled date to completion.
+    """
+    completed = Maintenance.completed_date.isnot(None)
+    seconds = case((completed, seconds_between(Maintenance.scheduled_date, Maintenance.completed_date)))
+    rows = db.session.query(
+        Room.room_name, func.count(Maintenance.id),
+        func.count(Maintenance.completed_date), func.avg(seconds)
+    ).select_from(Maintenance).join(
+        Equipment, Maintenance.equipment_id == Equipment.id
+    ).outerjoin(
+        Room, Equipment.room_id == Room.id
+    ).filter(
+        *_in_range(Maintenance.scheduled_date, start, end)
+    ).group_by(Room.room_name).order_by(Room.room_name).all()
+    return [
+        {
+            'room': room_name or NO_ROOM,
+            'tasks': tasks,
+            'completed': completed_count,
+            'mean_hours_to_complete': _hours(mean),
+        }
+        for room_name, tasks, completed_count, mean in rows
+    ]
+
+
+Report = namedtuple('Report', 'title function')
+
+REPORTS = {
+    'issues_per_room_week': Report('Issues per Room per Week', issues_per_room_week),
+    'resolution_time_by_type': Report('Time to Resolve by Issue Type', resolution_time_by_type),
+    'top_software': Report('Most Reported Software', top_software),
+    'repeat_failures': Report('Equipment with Repeat Failures', repeat_failures),
+    'maintenance_turnaround': Report('Maintenance Turnaround by Room', maintenance_turnaround),
+}
+
+
+def run_report(name, start, end, **params):
+    """
+    Rows of report ``name`` for ``start`` <= time < ``end``, from the cache
+    when the same report was run recently.
+    """
+    report = REPORTS[name]
+    key = (name, start, end, tuple(sorted(params.items())))
+    rows = report_cache.get(key)
+    if rows is None:
+        rows = report.function(start, end, **params)
+        report_cache.set(key, rows)
+    return rows
+
+
+# Columns of the issue DataFrame that slices may group by
+SLICE_DIMENSIONS = ('week', 'room', 'equipment', 'issue_type', 'software', 'status')
+
+
+def issue_frame(start, end):
+    """
+    The issues reported in the range as a pandas DataFrame, one row each,
+    with their room, week and hours to resolve.
+    """
+    try:
+        import pandas as pd  # optional dependency, only needed for slicing
+    except ImportError:
+        raise SlicingUnavailable('Slicing reports needs the pandas package.') from None
+
+    # Columns are fetched raw and converted by pandas a column at a time,
+    # which is far cheaper than SQLAlchemy converting every value
+    rows = db.session.execute(select(
+        IssueReport.id,
+        type_coerce(IssueReport.created_at, String),
+        type_coerce(IssueReport.resolved_at, String),
+        IssueReport.status,
+        type_coerce(IssueReport.issue_type, String),
+        IssueReport.software, Equipment.equipment_name, Room.room_name
+    ).join(
+        Equipment, IssueReport.equipment_id == Equipment.id
+    ).outerjoin(
+        Room, Equipment.room_id == Room.id
+    ).where(
+        *_in_range(IssueReport.created_at, start, end)
+    )).all()
+
+    frame = pd.DataFrame.from_records(rows, columns=[
+        'id', 'created_at', 'resolved_at', 'status', 'issue_type', 'software',
+        'equipment', 'room'
+    ])
+    frame['created_at'] = pd.to_datetime(frame['created_at'], format='ISO8601')
+    frame['resolved_at'] = pd.to_datetime(frame['resolved_at'], format='ISO8601')
+    frame['issue_type'] = frame['issue_type'].map(
+        {issue_type.name: issue_type.value for issue_type in IssueType}
+    )
+    frame['room'] = frame['room'].fillna(NO_ROOM)
+    frame['software'] = frame['software'].str.strip().str.lower()
+    frame['week'] = (
+        frame['created_at'].dt.normalize()
+        - pd.to_timedelta(frame['created_at'].dt.weekday, unit='D')
+    ).dt.date
+    frame['hours_to_resolve'] = (
+        frame['resolved_at'] - frame['created_at']
+    ).dt.total_seconds() / 3600
+    return frame
+
+
+def slice_issues(start, end, by):
+    """
+    Issue counts and mean hours to resolve grouped by the dimensions in
+    ``by`` (see ``SLICE_DIMENSIONS``). Cached like the reports.
+    """
+    by = tuple(by)
+    unknown = [dimension for dimension in by if dimension not in SLICE_DIMENSIONS]
+    if not by or unknown:
+        raise ValueError(
+            f"Slice by one or more of {', '.join(SLICE_DIMENSIONS)}"
+            + (f"; unknown: {', '.join(unknown)}" if unknown else '')
+        )
+
+    key = ('slice', start, end, by)
+    rows = report_cache.get(key)
+    if rows is not None:
+        return rows
+
+    frame = frame_cache.get((start, end))
+    if frame is None:
+        frame = issue_frame(start, end)
+        frame_cache.set((start, end), frame)
+    grouped = frame.groupby(list(by), dropna=False).agg(
+        issues=('id', 'count'),
+        resolved=('resolved_at', 'count'),
+        mean_hours_to_resolve=('hours_to_resolve', 'mean'),
+    ).reset_index().sort_values('issues', ascending=False, kind='stable')
+    grouped['mean_hours_to_resolve'] = grouped['mean_hours_to_resolve'].round(2)
+    rows = [
+        {key: _json_cell(value) for key, value in record.items()}
+        for record in grouped.to_dict('records')
+    ]
+    report_cache.set(key, rows)
+    return rows
+
+
+def _json_cell(value):
+    # pandas hands back NaN for missing values and numpy scalars for numbers
+    if value != value:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value.item() if hasattr(value, 'item') else value
@@ -0,0 +1,286 @@
+# app/assets.py
+
+"""
+Static asset pipeline.
+
+``flask assets build`` downloads the third-party libraries listed in
+``VENDOR`` into ``static/vendor`` (once; the files can be committed so later
+builds work offline), then copies every static file into ``static/dist``
+under a name carrying a hash of its content, e.g. ``css/styles.1a2b3c4d.css``,
+together with gzip and, when the optional ``brotli`` package is installed,
+brotli copies. ``static/dist/manifest.json`` maps each source name to its
+fingerprinted file.
+
+Templates link assets with ``asset_url('css/styles.css')``. Built assets
+are served from ``/assets/`` with a year-long ``immutable`` Cache-Control,
+in the best encoding the browser accepts: a changed file gets a new name,
+so browsers never need to revalidate and repeat page loads fetch no assets.
+Without a build, ``asset_url`` falls back to the plain static file, or to
+the CDN for a library that was never vendored.
+"""
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import mimetypes
+import os
+import re
+import shutil
+import threading
+from urllib.request import urlopen
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+# Vendored libraries: static name and the CDN copy it is downloaded from
+VENDOR = {
+    'vendor/bootstrap-4.5.0/bootstrap.min.css':
+        'https://stackpath.bootstrapcdn.com/bootstrap/4.5.0/css/bootstrap.min.css',
+    'vendor/bootstrap-4.5.0/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@4.5.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-5.3.2/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+    'vendor/jquery-3.5.1/jquery.slim.min.js':
+        'https://code.jquery.com/jquery-3.5.1.slim.min.js',
+    'vendor/jquery-3.7.0/jquery.min.js':
+        'https://code.jquery.com/jquery-3.7.0.min.js',
+    'vendor/datatables-1.13.6/dataTables.bootstrap5.min.css':
+        'https://cdn.datatables.net/1.13.6/css/dataTables.bootstrap5.min.css',
+    'vendor/datatables-1.13.6/jquery.dataTables.min.js':
+        'https://cdn.datatables.net/1.13.6/js/jquery.dataTables.min.js',
+    'vendor/datatables-1.13.6/dataTables.bootstrap5.min.js':
+        'https://cdn.datatables.net/1.13.6/js/dataTables.bootstrap5.min.js',
+    'vendor/fullcalendar-5.11.3/main.min.css':
+        'https://cdn.jsdelivr.net/npm/fullcalendar@5.11.3/main.min.css',
+    'vendor/fullcalendar-5.11.3/main.min.js':
+        'https://cdn.jsdelivr.net/npm/fullcalendar@5.11.3/main.min.js',
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 8
+# Files smaller than this gain nothing from compression
+MIN_COMPRESS_SIZE = 512
+# Suffix of the pre-compressed copy, by Content-Encoding
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Extensions worth compressing
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.html'}
+
+# Source map comments point at files that are not vendored
+_SOURCE_MAP = re.compile(rb'\n?/[/*]# sourceMappingURL=[^\n]*?(?:\*/)?\s*$')
+
+
+def _gzip(data):
+    # mtime=0 keeps the output identical between builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    import brotli  # optional dependency, only needed for .br copies
+    return brotli.compress(data, quality=11)
+
+
+def compressors():
+    """
+    ``(encoding, compress)`` for each available encoding, best first.
+    """
+    available = []
+    if importlib.util.find_spec('brotli') is not None:
+        available.append(('br', _brotli))
+    available.append(('gzip', _gzip))
+    return available
+
+
+def fingerprint(name, data):
+    """
+    ``name`` with a hash of ``data`` before its extension.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    root, ext = os.path.splitext(name)
+    return f'{root}.{digest}{ext}'
+
+
+def vendor(static_folder, refresh=False, fetch=urlopen, progress=None):
+    """
+    Download the ``VENDOR`` libraries missing from ``static_folder`` (all of
+    them with ``refresh``). Returns the names downloaded.
+    """
+    downloaded = []
+    for name, url in VENDOR.items():
+        path = os.path.join(static_folder, *name.split('/'))
+        if os.path.exists(path) and not refresh:
+            continue
+        with fetch(url) as response:
+            data = _SOURCE_MAP.sub(b'\n', response.read())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as stream:
+            stream.write(data)
+        downloaded.append(name)
+        if progress:
+            progress(name)
+    return downloaded
+
+
+def _sources(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def build(static_folder, clean=False):
+    """
+    Fingerprint and compress every file under ``static_folder`` into its
+    ``dist`` directory and write the manifest. Files of earlier builds are
+    kept, so pages rendered before a deploy can still load theirs, unless
+    ``clean`` is set. Returns the manifest.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    encoders = compressors()
+    manifest = {}
+    for name, path in _sources(static_folder):
+        with open(path, 'rb') as stream:
+            data = stream.read()
+        target = fingerprint(name, data)
+        entry = {'path': target, 'encodings': []}
+        target_path = os.path.join(dist, *target.split('/'))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if not os.path.exists(target_path):
+            shutil.copyfile(path, target_path)
+
+        if (os.path.splitext(name)[1].lower() in COMPRESSIBLE
+                and len(data) >= MIN_COMPRESS_SIZE):
+            for encoding, compress in encoders:
+                suffix = SUFFIXES[encoding]
+                if not os.path.exists(target_path + suffix):
+                    compressed = compress(data)
+                    # Only keep copies that are clearly smaller
+                    if len(compressed) > len(data) * 0.9:
+                        continue
+                    with open(target_path + suffix, 'wb') as stream:
+                        stream.write(compressed)
+                entry['encodings'].append(encoding)
+        manifest[name] = entry
+
+    if clean:
+        _remove_stale(dist, manifest)
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as stream:
+        json.dump(manifest, stream, indent=2, sort_keys=True)
+    return manifest
+
+
+def _remove_stale(dist, manifest):
+    keep = {MANIFEST}
+    for entry in manifest.values():
+        keep.add(entry['path'])
+        keep.update(entry['path'] + SUFFIXES[encoding] for encoding in entry['encodings'])
+    for name, path in _sources(dist):
+        if name not in keep:
+            os.remove(path)
+
+
+class AssetManifest:
+    """
+    The build manifest of the app's static folder, loaded on first use.
+    With ``reload`` (debug mode) it is re-read whenever the file changes.
+    """
+
+    def __init__(self):
+        self.static_folder = None
+        self.reload = False
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._entries = {}
+        self._encodings = {}
+
+    def configure(self, static_folder, reload=False):
+        self.static_folder = static_folder
+        self.reload = reload
+        self._loaded_mtime = None
+
+    @property
+    def dist(self):
+        return os.path.join(self.static_folder, DIST_DIR)
+
+    def _load(self):
+        path = os.path.join(self.dist, MANIFEST)
+        if self._loaded_mtime is not None and not self.reload:
+            return
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = 0
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            entries = {}
+            if mtime:
+                with open(path, encoding='utf-8') as stream:
+                    entries = json.load(stream)
+            self._entries = entries
+            self._encodings = {entry['path']: entry['encodings'] for entry in entries.values()}
+            self._loaded_mtime = mtime
+
+    def lookup(self, name):
+        """
+        The fingerprinted path of ``name``, or ``None`` if it was not built.
+        """
+        self._load()
+        entry = self._entries.get(name)
+        return entry['path'] if entry else None
+
+    def encodings(self, path):
+        """
+        Encodings a fingerprinted ``path`` was pre-compressed in, best first,
+        or ``None`` if it is not part of the build.
+        """
+        self._load()
+        return self._encodings.get(path)
+
+
+manifest = AssetManifest()
+
+
+def asset_url(name):
+    """
+    URL of the static file ``name``: its fingerprinted copy once built,
+    the plain static file otherwise, or the CDN for an unvendored library.
+    """
+    path = manifest.lookup(name)
+    if path is not None:
+        return url_for('assets.dist', filename=path)
+    if name in VENDOR and not os.path.exists(
+            os.path.join(manifest.static_folder, *name.split('/'))):
+        return VENDOR[name]
+    return url_for('static', filename=name)
+
+
+assets = Blueprint('assets', __name__)
+
+
+@assets.route('/assets/<path:filename>')
+def dist(filename):
+    """
+    Serve a built asset, pre-compressed when the browser accepts it.
+    """
+    encodings = manifest.encodings(filename)
+    if encodings is None:
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    chosen = next(
+        (encoding for encoding in encodings if request.accept_encodings[encoding]), None
+    )
+    response = send_from_directory(
+        manifest.dist, filename + SUFFIXES[chosen] if chosen else filename,
+        mimetype=mimetype, max_age=current_app.config['ASSETS_MAX_AGE']
+    )
+    if chosen:
+        response.headers['Content-Encoding'] = chosen
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
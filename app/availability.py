@@ -0,0 +1,290 @@
+# app/availability.py
+
+"""
+PC availability engine.
+
+Answers "which PCs in room R are operational and free between T1 and T2" by
+combining each PC's status, its active maintenance windows and the class
+schedules it is booked for.
+
+Each room's occupancy is loaded once into an in-process ``RoomOccupancy``
+and kept in ``occupancy``. Writes invalidate only the rooms they touch: ORM
+flushes record the affected rooms, PCs and subjects, bulk statements on the
+same tables drop the whole index, and the change is applied when the
+transaction commits. Entries also expire after AVAILABILITY_TTL seconds,
+which bounds how stale another worker process can be.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import (
+    ACTIVE_MAINTENANCE_STATUSES, Equipment, EquipmentType, Maintenance,
+    PCAssignment, Subject, SubjectException
+)
+from .recurrence import first_overlap, occurrences, schedule_span
+from .scheduling import IntervalIndex
+
+# Maintenance without a completion date blocks the PC indefinitely
+OPEN_ENDED = datetime.max
+
+_WATCHED_TABLES = {
+    model.__table__.name
+    for model in (Equipment, Maintenance, PCAssignment, Subject, SubjectException)
+}
+
+
+class RoomOccupancy:
+    """
+    Everything needed to answer availability questions for one room.
+    """
+
+    def __init__(self, room_id, pcs, maintenances, bookings, exceptions):
+        self.room_id = room_id
+        # id -> (name, status), in name order
+        self.pcs = pcs
+        self.maintenance = IntervalIndex()
+        for equipment_id, start, end in maintenances:
+            window = (start, end or OPEN_ENDED)
+            self.maintenance.add(equipment_id, *window, window)
+        self.bookings = IntervalIndex()
+        self.subject_ids = set()
+        for equipment_id, schedule in bookings:
+            self.bookings.add(equipment_id, *schedule_span(schedule), schedule)
+            self.subject_ids.add(schedule.id)
+        self.exceptions = exceptions
+
+    def pc_state(self, equipment_id, start, end):
+        """
+        Return ``'free'``, or why the PC is not free in ``[start, end)``:
+        ``'status'``, ``'maintenance'`` or ``'booked'``.
+        """
+        name, status = self.pcs[equipment_id]
+        if status != 'Operational':
+            return 'status'
+        if self.maintenance.overlapping(equipment_id, start, end):
+            return 'maintenance'
+        for schedule in self.bookings.overlapping(equipment_id, start, end):
+            exceptions = self.exceptions.get(schedule.id, ())
+            if next(occurrences(schedule, start, end, exceptions), None) is not None:
+                return 'booked'
+        return 'free'
+
+    def schedule_state(self, equipment_id, schedule, exceptions=()):
+        """
+        ``pc_state`` over every occurrence of a subject's ``schedule``. The
+        PC's bookings for that same subject are not counted.
+        """
+        name, status = self.pcs[equipment_id]
+        if status != 'Operational':
+            return 'status'
+        start, end = schedule_span(schedule)
+        for window in self.maintenance.overlapping(equipment_id, start, end):
+            if next(occurrences(schedule, *window, exceptions), None) is not None:
+                return 'maintenance'
+        for booking in self.bookings.overlapping(equipment_id, start, end):
+            if booking.id != schedule.id and first_overlap(
+                    schedule, booking, exceptions, self.exceptions.get(booking.id, ())):
+                return 'booked'
+        return 'free'
+
+    def free_pcs(self, start, end):
+        return [
+            {'id': equipment_id, 'name': name}
+            for equipment_id, (name, _) in self.pcs.items()
+            if self.pc_state(equipment_id, start, end) == 'free'
+        ]
+
+
+def load_rooms(room_ids):
+    """
+    Build ``RoomOccupancy`` objects for ``room_ids`` with at most four
+    queries, whatever the number of rooms.
+    """
+    room_ids = set(room_ids)
+    if not room_ids:
+        return {}
+
+    pcs = {room_id: {} for room_id in room_ids}
+    pc_rooms = {}
+    for equipment_id, room_id, name, status in db.session.query(
+        Equipment.id, Equipment.room_id, Equipment.equipment_name, Equipment.status
+    ).filter(
+        Equipment.room_id.in_(room_ids),
+        Equipment.equipment_type == EquipmentType.PC
+    ).order_by(Equipment.equipment_name, Equipment.id):
+        pcs[room_id][equipment_id] = (name, status)
+        pc_rooms[equipment_id] = room_id
+
+    maintenances = {room_id: [] for room_id in room_ids}
+    for equipment_id, room_id, start, end in db.session.query(
+        Maintenance.equipment_id, Equipment.room_id,
+        Maintenance.scheduled_date, Maintenance.completed_date
+    ).join(
+        Equipment, Maintenance.equipment_id == Equipment.id
+    ).filter(
+        Equipment.room_id.in_(room_ids),
+        Maintenance.status.in_(ACTIVE_MAINTENANCE_STATUSES)
+    ):
+        maintenances[room_id].append((equipment_id, start, end))
+
+    bookings = {room_id: [] for room_id in room_ids}
+    recurring_ids = set()
+    rows = db.session.query(
+        PCAssignment.equipment_id, Subject.id, Subject.start_time, Subject.end_time,
+        Subject.recurrence_days, Subject.term_start, Subject.term_end
+    ).join(
+        Subject, PCAssignment.subject_id == Subject.id
+    ).filter(
+        PCAssignment.equipment_id.in_(pc_rooms)
+    ) if pc_rooms else ()
+    for row in rows:
+        bookings[pc_rooms[row.equipment_id]].append((row.equipment_id, row))
+        if row.recurrence_days:
+            recurring_ids.add(row.id)
+    exceptions = SubjectException.dates_by_subject(recurring_ids)
+
+    return {
+        room_id: RoomOccupancy(
+            room_id, pcs[room_id], maintenances[room_id], bookings[room_id], exceptions
+        )
+        for room_id in room_ids
+    }
+
+
+class OccupancyIndex:
+    """
+    Thread-safe cache of ``RoomOccupancy`` by room id.
+    """
+
+    def __init__(self, ttl=300.0, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._rooms = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a commit
+        # is not cached
+        self._generation = 0
+
+    def configure(self, ttl=None):
+        if ttl is not None:
+            self.ttl = ttl
+        self.clear()
+
+    def rooms(self, room_ids):
+        """
+        Return ``{room_id: RoomOccupancy}``, loading missing or expired
+        rooms together.
+        """
+        now = self._clock()
+        found, missing = {}, set()
+        with self._lock:
+            generation = self._generation
+            for room_id in room_ids:
+                entry = self._rooms.get(room_id)
+                if entry is not None and entry[0] > now:
+                    found[room_id] = entry[1]
+                else:
+                    missing.add(room_id)
+        if missing:
+            loaded = load_rooms(missing)
+            with self._lock:
+                if generation == self._generation:
+                    for room_id, room in loaded.items():
+                        self._rooms[room_id] = (now + self.ttl, room)
+            found.update(loaded)
+        return found
+
+    def room(self, room_id):
+        return self.rooms([room_id])[room_id]
+
+    def invalidate(self, room_ids=(), pc_ids=(), subject_ids=()):
+        """
+        Drop cached rooms that contain any of the given rooms, PCs or
+        booked subjects.
+        """
+        room_ids, pc_ids, subject_ids = set(room_ids), set(pc_ids), set(subject_ids)
+        with self._lock:
+            self._generation += 1
+            for room_id, (_, room) in list(self._rooms.items()):
+                if (room_id in room_ids
+                        or not pc_ids.isdisjoint(room.pcs)
+                        or not subject_ids.isdisjoint(room.subject_ids)):
+                    del self._rooms[room_id]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._rooms.clear()
+
+    def __len__(self):
+        return len(self._rooms)
+
+
+# Expiry set from AVAILABILITY_TTL in create_app
+occupancy = OccupancyIndex()
+
+
+def _pending(session):
+    return session.info.setdefault(
+        'availability_changes', {'rooms': set(), 'pcs': set(), 'subjects': set(), 'all': False}
+    )
+
+
+def _ids(values):
+    # Ids set from form values may still be strings until the row is reloaded
+    return {int(value) for value in values if value is not None}
+
+
+def _old_value(obj, key):
+    history = db.inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else None
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed_changes(session, flush_context):
+    changes = _pending(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Equipment):
+            changes['pcs'].add(obj.id)
+            changes['rooms'].update({obj.room_id, _old_value(obj, 'room_id')})
+        elif isinstance(obj, Maintenance):
+            changes['pcs'].update({obj.equipment_id, _old_value(obj, 'equipment_id')})
+        elif isinstance(obj, PCAssignment):
+            changes['pcs'].update({obj.equipment_id, _old_value(obj, 'equipment_id')})
+        elif isinstance(obj, Subject):
+            changes['subjects'].add(obj.id)
+        elif isinstance(obj, SubjectException):
+            changes['subjects'].add(obj.subject_id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_bulk_changes(orm_execute_state):
+    # Bulk statements don't say which rows they touch, so drop everything
+    if orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is not None and table.name in _WATCHED_TABLES:
+        _pending(orm_execute_state.session)['all'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('availability_changes', None)
+    if changes is None:
+        return
+    if changes['all']:
+        occupancy.clear()
+    else:
+        occupancy.invalidate(_ids(changes['rooms']), _ids(changes['pcs']),
+                             _ids(changes['subjects']))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('availability_changes', None)
@@ -0,0 +1,262 @@
+# app/commands.py
+
+"""
+Flask CLI commands, registered on the app in ``create_app``.
+"""
+
+import os
+import time
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from . import db
+from .assets import build as build_assets, vendor as vendor_assets
+from .counters import reconcile
+from .dedup import rebuild as rebuild_clusters
+from .exports import EXPORTS, FORMATS, ExportUnavailable, export_stream
+from .models import User
+from .notifications import make_mailer, purge, send_batch
+from .roster import RosterFormatError, import_roster, iter_roster
+from .search import SearchUnavailable, create_index, reindex_all
+
+roster_cli = AppGroup('roster', help='Manage student rosters.')
+counters_cli = AppGroup('counters', help='Maintain the dashboard counters.')
+search_cli = AppGroup('search', help='Maintain the issue report search index.')
+dedup_cli = AppGroup('dedup', help='Maintain the duplicate issue report clusters.')
+notifications_cli = AppGroup('notifications', help='Send queued notifications.')
+assets_cli = AppGroup('assets', help='Build the fingerprinted static assets.')
+
+
+@roster_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Students inserted per transaction.')
+@click.option('--workers', type=int, default=None,
+              help='Password hashing processes (default: CPU count).')
+def import_roster_command(path, chunk_size, workers):
+    """Import students from a CSV, JSON Lines or JSON file."""
+    started = time.perf_counter()
+
+    def report_progress(report):
+        elapsed = time.perf_counter() - started
+        click.echo(
+            f'{report.processed} rows read, {report.created} created, '
+            f'{len(report.skipped)} skipped, {len(report.errors)} errors '
+            f'({elapsed:.1f}s)'
+        )
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        try:
+            report = import_roster(
+                iter_roster(stream, path),
+                chunk_size=chunk_size,
+                workers=workers or os.cpu_count() or 1,
+                progress=report_progress
+            )
+        except RosterFormatError as exc:
+            raise click.ClickException(str(exc))
+
+    for issue in report.errors:
+        click.echo(f'line {issue.line}: {issue.email or "-"}: {issue.message}', err=True)
+    for issue in report.skipped:
+        click.echo(f'line {issue.line}: {issue.email}: {issue.message}', err=True)
+    click.echo(f'Done: {report.created} students created in '
+               f'{time.perf_counter() - started:.1f}s.')
+
+
+@counters_cli.command('reconcile')
+@click.option('--every', type=float, default=None, metavar='SECONDS',
+              help='Keep running, reconciling at this interval.')
+def reconcile_counters_command(every):
+    """Recount the dashboard counters and correct any drift."""
+    while True:
+        corrections = reconcile()
+        for name, delta in sorted(corrections.items()):
+            click.echo(f'{name}: {delta:+d}')
+        click.echo(f'{len(corrections)} counter(s) corrected.')
+        if every is None:
+            return
+        db.session.remove()
+        time.sleep(every)
+
+
+@search_cli.command('reindex')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Issue reports indexed per transaction.')
+def reindex_search_command(batch_size):
+    """Create the search index if needed and rebuild it from scratch."""
+    started = time.perf_counter()
+    try:
+        indexed = reindex_all(
+            batch_size, progress=lambda count: click.echo(f'{count} reports indexed', err=True)
+        )
+    except SearchUnavailable as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Indexed {indexed} issue reports in {time.perf_counter() - started:.1f}s.')
+
+
+@dedup_cli.command('rebuild')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Issue reports signed per transaction.')
+def rebuild_dedup_command(batch_size):
+    """Sign every issue report and regroup duplicates from scratch."""
+    started = time.perf_counter()
+    processed = rebuild_clusters(
+        threshold=current_app.config['DEDUP_THRESHOLD'],
+        window=timedelta(days=current_app.config['DEDUP_WINDOW_DAYS']),
+        batch_size=batch_size,
+        progress=lambda count: click.echo(f'{count} reports signed', err=True)
+    )
+    click.echo(f'Signed {processed} issue reports in {time.perf_counter() - started:.1f}s.')
+
+
+@notifications_cli.command('send')
+@click.option('--batch-size', type=int, default=None,
+              help='Notifications claimed at a time (default: NOTIFY_BATCH_SIZE).')
+@click.option('--interval', default=5.0, show_default=True,
+              help='Seconds to wait when the outbox is empty.')
+@click.option('--once', is_flag=True, help='Exit once nothing is due instead of polling.')
+def send_notifications_command(batch_size, interval, once):
+    """Drain the notification outbox, retrying failed sends with backoff."""
+    config = current_app.config
+    mailer = make_mailer(config)
+    options = {
+        'batch_size': batch_size or config['NOTIFY_BATCH_SIZE'],
+        'max_attempts': config['NOTIFY_MAX_ATTEMPTS'],
+        'backoff': timedelta(seconds=config['NOTIFY_BACKOFF']),
+    }
+    sent = retried = failed = 0
+    try:
+        while True:
+            report = send_batch(mailer, config['MAIL_DEFAULT_SENDER'], **options)
+            if report.claimed:
+                sent += report.sent
+                retried += report.retried
+                failed += report.failed
+                click.echo(f'{report.sent} sent, {report.retried} to retry, '
+                           f'{report.failed} failed', err=True)
+                continue
+            if once:
+                break
+            db.session.remove()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    click.echo(f'Sent {sent} notifications ({retried} to retry, {failed} failed).')
+
+
+@notifications_cli.command('purge')
+@click.option('--days', default=30, show_default=True,
+              help='Delete notifications sent more than this many days ago.')
+def purge_notifications_command(days):
+    """Delete old sent notifications from the outbox."""
+    deleted = purge(timedelta(days=days))
+    click.echo(f'Deleted {deleted} sent notifications.')
+
+
+@assets_cli.command('build')
+@click.option('--refresh', is_flag=True, help='Download the vendored libraries again.')
+@click.option('--clean', is_flag=True, help='Delete files left by earlier builds.')
+def build_assets_command(refresh, clean):
+    """Vendor the CDN libraries, then fingerprint and compress all assets."""
+    static_folder = current_app.static_folder
+    try:
+        vendor_assets(static_folder, refresh,
+                      progress=lambda name: click.echo(f'Downloaded {name}', err=True))
+    except OSError as exc:
+        raise click.ClickException(f'Could not download the vendored libraries: {exc}')
+    manifest = build_assets(static_folder, clean)
+    compressed = sum(1 for entry in manifest.values() if entry['encodings'])
+    click.echo(f'Built {len(manifest)} assets ({compressed} pre-compressed).')
+
+
+@click.command('export')
+@with_appcontext
+@click.argument('name', type=click.Choice(list(EXPORTS)))
+@click.option('--format', 'format_', type=click.Choice(list(FORMATS)), default='csv',
+              show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), default='-',
+              help='File to write (default: standard output).')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='First day to include (YYYY-MM-DD).')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Last day to include (YYYY-MM-DD).')
+@click.option('--status', default=None, help='Only rows with this status.')
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Rows fetched from the database at a time.')
+def export_command(name, format_, output, start, end, status, chunk_size):
+    """Stream issue reports, maintenances or borrow requests to CSV or XLSX."""
+    try:
+        content = export_stream(
+            name, format_, start, end + timedelta(days=1) if end else None, status, chunk_size
+        )
+    except (ValueError, ExportUnavailable) as exc:
+        raise click.ClickException(str(exc))
+
+    written = 0
+    with click.open_file(output, 'wb') as stream:
+        for chunk in content:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            stream.write(chunk)
+            written += len(chunk)
+    if output != '-':
+        click.echo(f'Wrote {written} bytes to {output}.', err=True)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create any missing tables (use 'flask db upgrade' on migrated DBs)."""
+    db.create_all()
+    try:
+        create_index(db.session.connection())
+        db.session.commit()
+    except SearchUnavailable as exc:
+        click.echo(f'{exc} Issue search is disabled.')
+    click.echo('Database tables created.')
+
+
+@click.command('seed')
+@with_appcontext
+@click.option('--admin-email', default='admin@gmail.com', show_default=True)
+@click.option('--admin-password', default='admin', show_default=True)
+@click.option('--users-file', default='sample_users.json', show_default=True,
+              help='Roster of sample students; skipped if the file is missing.')
+def seed_command(admin_email, admin_password, users_file):
+    """Create the default admin and load the sample students."""
+    if not User.query.filter_by(email=admin_email).first():
+        admin = User(
+            username='admin',
+            full_name='Administrator',
+            email=admin_email,
+            role='Admin'
+        )
+        admin.set_password(admin_password)
+        db.session.add(admin)
+        db.session.commit()
+        click.echo(f'Created admin {admin_email}.')
+
+    if not os.path.exists(users_file):
+        click.echo(f'{users_file} not found; no sample students loaded.')
+        return
+
+    with open(users_file, encoding='utf-8-sig') as stream:
+        report = import_roster(iter_roster(stream, users_file))
+    click.echo(f'Loaded {report.created} sample students '
+               f'({len(report.skipped)} already present).')
+
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(roster_cli)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(export_command)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(dedup_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,294 @@
+# app/counters.py
+
+"""
+Incrementally maintained dashboard counters.
+
+``dashboard_counters`` holds one row per figure, named after what it counts:
+
+    issue_reports:<status>      borrow_requests:<status>
+    maintenances:<status>       equipment:<type>:<status>
+    room_open_issues:<room id>  (issues not yet Resolved, by room)
+
+Session events add and subtract from these rows in the same transaction as
+the change: inserts and deletions of issue reports, maintenance tasks,
+borrow requests and equipment, status changes of any of them, and ORM bulk
+inserts of equipment. Code that changes statuses with Core statements calls
+``count_transition`` itself.
+
+Changes the events cannot see (raw SQL, equipment moved between rooms) are
+corrected by ``reconcile``, run periodically with ``flask counters
+reconcile``. It recounts from the real tables and applies the difference
+as a delta, so increments committed while it runs are kept.
+"""
+
+from collections import Counter
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import (
+    ACTIVE_MAINTENANCE_STATUSES, BorrowRequest, DashboardCounter, Equipment,
+    EquipmentType, IssueReport, Maintenance
+)
+
+COUNTED = (IssueReport, Maintenance, BorrowRequest, Equipment)
+
+# Issue statuses that no longer count towards a room's open issues
+CLOSED_ISSUE_STATUSES = ('Resolved',)
+
+_UPSERTS = {'mysql': mysql.insert, 'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _value(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def counter_name(model, status, equipment_type=None):
+    """
+    Name of the status counter a row of ``model`` contributes to.
+    """
+    if model is Equipment:
+        return f'equipment:{_value(equipment_type)}:{_value(status)}'
+    return f'{model.__tablename__}:{_value(status)}'
+
+
+def bump(connection, deltas):
+    """
+    Add ``deltas`` (name -> change) to the counters, creating missing rows.
+    Rows are touched in name order so concurrent writers lock them in the
+    same order.
+    """
+    rows = [
+        {'name': name, 'value': delta, 'updated_at': datetime.utcnow()}
+        for name, delta in sorted(deltas.items()) if delta
+    ]
+    if not rows:
+        return
+    table = DashboardCounter.__table__
+    upsert = _UPSERTS.get(connection.dialect.name)
+    if upsert is None:
+        for row in rows:
+            updated = connection.execute(
+                table.update().where(table.c.name == row['name']).values(
+                    value=table.c.value + row['value'], updated_at=row['updated_at']
+                )
+            )
+            if updated.rowcount == 0:
+                connection.execute(table.insert(), row)
+        return
+
+    statement = upsert(table)
+    if connection.dialect.name == 'mysql':
+        statement = statement.on_duplicate_key_update(
+            value=table.c.value + statement.inserted.value,
+            updated_at=statement.inserted.updated_at
+        )
+    else:
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={'value': table.c.value + statement.excluded.value,
+                  'updated_at': statement.excluded.updated_at}
+        )
+    connection.execute(statement, rows)
+
+
+def count_transition(connection, model, old_status, new_status, count=1):
+    """
+    Record ``count`` rows of ``model`` moving from ``old_status`` to
+    ``new_status``; ``None`` means created or deleted.
+    """
+    deltas = Counter()
+    if old_status is not None:
+        deltas[counter_name(model, old_status)] -= count
+    if new_status is not None:
+        deltas[counter_name(model, new_status)] += count
+    bump(connection, deltas)
+
+
+def _is_open_issue(status):
+    return status is not None and status not in CLOSED_ISSUE_STATUSES
+
+
+class _Changes:
+    """
+    Counter deltas gathered during one flush.
+    """
+
+    def __init__(self):
+        self.deltas = Counter()
+        # equipment id -> change in open issues, resolved to rooms later
+        self.open_issues = Counter()
+
+    def add(self, obj, status, sign):
+        if status is None:
+            return
+        model = type(obj)
+        self.deltas[counter_name(model, status, getattr(obj, 'equipment_type', None))] += sign
+        if model is IssueReport and _is_open_issue(status) and obj.equipment_id is not None:
+            # Attributes set from form values may still be strings
+            self.open_issues[int(obj.equipment_id)] += sign
+
+    def apply(self, connection):
+        if self.open_issues:
+            equipment = Equipment.__table__
+            rooms = dict(connection.execute(
+                select(equipment.c.id, equipment.c.room_id).where(
+                    equipment.c.id.in_(list(self.open_issues))
+                )
+            ).all())
+            for equipment_id, delta in self.open_issues.items():
+                if rooms.get(equipment_id) is not None:
+                    self.deltas[f'room_open_issues:{rooms[equipment_id]}'] += delta
+        bump(connection, self.deltas)
+
+
+def _load_previous_status(target, value, oldvalue, initiator):
+    pass
+
+
+for _model in COUNTED:
+    # Load the old status when it is reassigned so the transition can be
+    # counted even if the attribute had been expired
+    event.listen(_model.status, 'set', _load_previous_status, active_history=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _count_deletions(session, flush_context, instances):
+    # Deleted rows are counted before the flush, while their status can
+    # still be loaded
+    changes = session.info.setdefault('counter_changes', _Changes())
+    for obj in session.deleted:
+        if isinstance(obj, COUNTED):
+            changes.add(obj, obj.status, -1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_changes(session, flush_context):
+    changes = session.info.pop('counter_changes', None) or _Changes()
+    for obj in session.new:
+        if isinstance(obj, COUNTED):
+            changes.add(obj, obj.status, 1)
+    for obj in session.dirty:
+        if not isinstance(obj, COUNTED):
+            continue
+        history = inspect(obj).attrs.status.history
+        if history.has_changes():
+            for old_status in history.deleted:
+                changes.add(obj, old_status, -1)
+            for new_status in history.added:
+                changes.add(obj, new_status, 1)
+    changes.apply(session.connection())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_counter_changes(session):
+    session.info.pop('counter_changes', None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _count_bulk_equipment_inserts(orm_execute_state):
+    if not orm_execute_state.is_insert:
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is None or table.name != Equipment.__tablename__:
+        return
+    rows = orm_execute_state.parameters
+    if isinstance(rows, dict):
+        rows = [rows]
+    bump(orm_execute_state.session.connection(), Counter(
+        counter_name(Equipment, row.get('status', 'Operational'),
+                     row.get('equipment_type', EquipmentType.PC))
+        for row in rows or ()
+    ))
+
+
+def recount(connection):
+    """
+    Count every figure from the real tables.
+    """
+    counts = Counter()
+    for model in (IssueReport, Maintenance, BorrowRequest):
+        for status, count in connection.execute(
+            select(model.status, func.count()).group_by(model.status)
+        ):
+            if status is not None:
+                counts[counter_name(model, status)] += count
+    for equipment_type, status, count in connection.execute(
+        select(Equipment.equipment_type, Equipment.status, func.count())
+        .group_by(Equipment.equipment_type, Equipment.status)
+    ):
+        if status is not None:
+            counts[counter_name(Equipment, status, equipment_type)] += count
+    for room_id, count in connection.execute(
+        select(Equipment.room_id, func.count())
+        .join(IssueReport, IssueReport.equipment_id == Equipment.id)
+        .where(Equipment.room_id.isnot(None),
+               IssueReport.status.notin_(CLOSED_ISSUE_STATUSES))
+        .group_by(Equipment.room_id)
+    ):
+        counts[f'room_open_issues:{room_id}'] += count
+    return counts
+
+
+def reconcile():
+    """
+    Correct drifted counters and return the corrections applied.
+    """
+    connection = db.session.connection()
+    try:
+        actual = recount(connection)
+        stored = dict(connection.execute(
+            select(DashboardCounter.name, DashboardCounter.value)
+        ).all())
+        corrections = {
+            name: actual.get(name, 0) - stored.get(name, 0)
+            for name in set(actual) | set(stored)
+            if actual.get(name, 0) != stored.get(name, 0)
+        }
+        bump(connection, corrections)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return corrections
+
+
+def read_counters():
+    return dict(db.session.query(DashboardCounter.name, DashboardCounter.value).all())
+
+
+def dashboard_stats():
+    """
+    The dashboard's headline figures, read from the counters table only.
+    """
+    counters = read_counters()
+    issue_prefix = f'{IssueReport.__tablename__}:'
+    return {
+        'pending_issues': counters.get(counter_name(IssueReport, 'Pending'), 0),
+        'open_issues': sum(
+            value for name, value in counters.items()
+            if name.startswith(issue_prefix)
+            and _is_open_issue(name[len(issue_prefix):])
+        ),
+        'active_maintenance': sum(
+            counters.get(counter_name(Maintenance, status), 0)
+            for status in ACTIVE_MAINTENANCE_STATUSES
+        ),
+        'pcs_under_maintenance': counters.get(
+            counter_name(Equipment, 'Under Maintenance', EquipmentType.PC), 0
+        ),
+        'pcs_out_of_service': counters.get(
+            counter_name(Equipment, 'Out of Service', EquipmentType.PC), 0
+        ),
+        'laptops_out': counters.get(counter_name(BorrowRequest, 'Approved'), 0),
+        'pending_borrow_requests': counters.get(counter_name(BorrowRequest, 'Pending'), 0),
+        'open_issues_by_room': {
+            int(name.split(':', 1)[1]): value
+            for name, value in counters.items()
+            if name.startswith('room_open_issues:') and value
+        },
+    }
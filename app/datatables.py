@@ -0,0 +1,215 @@
+# app/datatables.py
+
+"""
+Server-side processing for DataTables lists.
+
+Each list endpoint describes its columns once and lets ``DataTable`` turn the
+DataTables request parameters (paging, ordering, global search and per-column
+filters) into SQL, so only one page of rows ever leaves the database.
+
+Row counts without a global search are taken on the primary and kept in
+``count_cache`` under the listed table's fragment cache version, so they are
+only counted again after that table changes (or after DATATABLE_COUNT_TTL
+seconds). Global search matches anywhere in the searchable columns unless
+the list brings its own search, such as the full-text index.
+"""
+
+from sqlalchemy import or_
+
+from . import db
+from .cache import TTLCache
+from .fragments import fragment_cache
+from .replica import on_primary
+
+# Hard cap on the page size a client may ask for
+MAX_PAGE_LENGTH = 500
+
+# Expiry set from DATATABLE_COUNT_TTL in create_app
+count_cache = TTLCache(maxsize=256, ttl=300)
+
+
+class Column:
+    """
+    A single DataTables column.
+
+    ``expression`` is the SQL expression used for sorting (and for searching
+    when ``searchable`` is set). ``filter_expression`` is matched exactly
+    against the per-column search value, which is how the status dropdowns
+    filter their lists. ``render`` turns the loaded row into the JSON value.
+    """
+
+    def __init__(self, name, render, expression=None, searchable=False,
+                 filter_expression=None, filter_type=str):
+        self.name = name
+        self.render = render
+        self.expression = expression
+        self.searchable = searchable and expression is not None
+        self.filter_expression = filter_expression
+        self.filter_type = filter_type
+
+    @property
+    def orderable(self):
+        return self.expression is not None
+
+
+class DataTable:
+    """
+    Apply a DataTables request to a query.
+
+    ``query`` selects the rows to list and must already contain the joins the
+    column expressions refer to. ``model`` is the listed entity; pages are
+    fetched as primary keys first and then loaded with ``load_options``
+    (eager loads) so deep offsets only walk the index, not the wide rows.
+
+    ``search`` may turn the global search value into a filter condition, or
+    return ``None`` to fall back to substring matching.
+    """
+
+    def __init__(self, model, query, columns, default_order, load_options=(), search=None):
+        self.model = model
+        self.query = query
+        self.columns = columns
+        self.default_order = default_order
+        self.load_options = load_options
+        self.search = search
+
+    def response(self, args):
+        """
+        Build the DataTables JSON payload for the request ``args``.
+        """
+        draw = args.get('draw', type=int, default=0)
+        start = max(args.get('start', type=int, default=0), 0)
+        length = args.get('length', type=int, default=10)
+        if length < 0 or length > MAX_PAGE_LENGTH:
+            length = MAX_PAGE_LENGTH
+
+        column_filters = self._column_filters(args)
+        records_total = self._cached_count(self.query, ())
+
+        search_value = args.get('search[value]', '').strip()
+        filtered = self._apply_filters(self.query, search_value, column_filters)
+        if filtered is self.query:
+            records_filtered = records_total
+        elif search_value:
+            records_filtered = self._count(filtered)
+        else:
+            records_filtered = self._cached_count(filtered, column_filters)
+
+        page_ids = [
+            row[0] for row in filtered.with_entities(self.model.id)
+            .order_by(*self._order_by(args))
+            .offset(start)
+            .limit(length)
+            .all()
+        ]
+
+        return {
+            'draw': draw,
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+            'data': [self._render(row) for row in self._load(page_ids)],
+        }
+
+    def _count(self, query):
+        return query.with_entities(
+            db.func.count(db.distinct(self.model.id))
+        ).order_by(None).scalar()
+
+    def _cached_count(self, query, column_filters):
+        table = self.model.__tablename__
+        versions = fragment_cache.versions([table])
+        if versions is None:
+            return self._count(query)
+        key = (table, versions, tuple(
+            (column.name, value) for column, value in column_filters
+        ))
+        count = count_cache.get(key)
+        if count is None:
+            # A lagging replica would store an old count under the new version
+            count = on_primary(lambda: self._count(query))
+            count_cache.set(key, count)
+        return count
+
+    def _column_filters(self, args):
+        filters = []
+        for index, column in self._request_columns(args):
+            if column.filter_expression is None:
+                continue
+            value = args.get(f'columns[{index}][search][value]', '').strip()
+            if not value:
+                continue
+            try:
+                filters.append((column, column.filter_type(value)))
+            except ValueError:
+                continue
+        return filters
+
+    def _search_condition(self, search_value):
+        condition = self.search(search_value) if self.search else None
+        if condition is not None:
+            return condition
+        escaped = search_value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return or_(*[
+            column.expression.ilike(f'%{escaped}%', escape='\\')
+            for column in self.columns if column.searchable
+        ])
+
+    def _apply_filters(self, query, search_value, column_filters):
+        if search_value:
+            query = query.filter(self._search_condition(search_value))
+        for column, value in column_filters:
+            query = query.filter(column.filter_expression == value)
+        return query
+
+    def _request_columns(self, args):
+        """
+        Map the client's column indexes to our columns by their ``data``
+        name, so a page may show a subset of the columns in any order.
+        """
+        by_name = {column.name: column for column in self.columns}
+        mapping = {}
+        index = 0
+        while f'columns[{index}][data]' in args:
+            column = by_name.get(args.get(f'columns[{index}][data]'))
+            if column is not None:
+                mapping[index] = column
+            index += 1
+        return sorted(mapping.items())
+
+    def _order_by(self, args):
+        columns = dict(self._request_columns(args))
+        clauses = []
+        index = 0
+        while f'order[{index}][column]' in args:
+            column = columns.get(args.get(f'order[{index}][column]', type=int))
+            direction = args.get(f'order[{index}][dir]', 'asc')
+            index += 1
+            if column is None or not column.orderable:
+                continue
+            expression = column.expression
+            clauses.append(expression.desc() if direction == 'desc' else expression.asc())
+
+        if not clauses:
+            clauses.append(self.default_order)
+        # Break ties on the primary key so paging is stable
+        clauses.append(self.model.id.desc())
+        return clauses
+
+    def _load(self, ids):
+        if not ids:
+            return []
+        rows = self.model.query.options(*self.load_options).filter(
+            self.model.id.in_(ids)
+        ).all()
+        by_id = {row.id: row for row in rows}
+        return [by_id[row_id] for row_id in ids if row_id in by_id]
+
+    def _render(self, row):
+        return {column.name: column.render(row) for column in self.columns}
+
+
+def format_datetime(value):
+    """
+    Format a datetime the same way the server-rendered tables do.
+    """
+    return value.strftime('%Y-%m-%d %H:%M') if value else None
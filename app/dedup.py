@@ -0,0 +1,207 @@
+# app/dedup.py
+
+"""
+Near-duplicate detection for issue reports.
+
+A report's description is cut into overlapping character shingles and
+summarised by a MinHash signature of ``NUM_HASHES`` values: the share of
+positions two signatures agree on estimates how similar the descriptions
+are (their Jaccard similarity).
+
+The signature is split into ``BANDS`` bands, and each band hashed to a
+bucket stored in ``issue_signature_bands``. Buckets are keyed by the
+report's equipment (bands 0-31) and, for software issues, by the software
+name (bands 32-63), so reports only collide with reports on the same PC or
+program. Reports that share a bucket in any band are candidates, so a new
+report is only compared with the few recent open reports found through
+that index. A pair of similarity ``s`` shares a band with probability
+``1 - (1 - s ** ROWS_PER_BAND) ** BANDS``: with 32 bands of 2 values that
+is about 0.9999 at the default threshold of 0.5 (16 bands of 4 would miss a
+third of such pairs). Changing the banding needs ``flask dedup rebuild``.
+
+A match puts the new report in the cluster of the report it matched
+(creating one if needed), so admins can resolve the whole cluster at once.
+"""
+
+import hashlib
+import re
+import struct
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, bindparam, insert, or_, select
+
+from . import db
+from .models import IssueCluster, IssueReport, IssueSignatureBand
+
+SHINGLE_SIZE = 4
+NUM_HASHES = 64
+BANDS = 32
+ROWS_PER_BAND = NUM_HASHES // BANDS
+
+# Reports at least this similar are treated as the same problem
+DEFAULT_THRESHOLD = 0.5
+# Only reports filed this recently are matched against
+DEFAULT_WINDOW = timedelta(days=14)
+
+_SIGNATURE = struct.Struct(f'<{NUM_HASHES}I')
+_NOT_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+Match = namedtuple('Match', 'issue_id similarity')
+
+
+def shingles(text):
+    """
+    The overlapping ``SHINGLE_SIZE`` character pieces of the normalised text.
+    """
+    normalised = _NOT_WORD.sub(' ', text.lower()).strip()
+    if len(normalised) <= SHINGLE_SIZE:
+        return {normalised}
+    return {
+        normalised[i:i + SHINGLE_SIZE]
+        for i in range(len(normalised) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(text):
+    """
+    The MinHash signature of ``text`` as a tuple of ``NUM_HASHES`` ints.
+
+    One SHAKE-128 digest per shingle supplies its ``NUM_HASHES`` hash
+    values at once, which is several times faster than evaluating that many
+    hash functions in Python, and the same in every process.
+    """
+    return tuple(map(min, zip(*(
+        _SIGNATURE.unpack(hashlib.shake_128(shingle.encode()).digest(_SIGNATURE.size))
+        for shingle in shingles(text)
+    ))))
+
+
+def pack(values):
+    return _SIGNATURE.pack(*values)
+
+
+def unpack(data):
+    return _SIGNATURE.unpack(data)
+
+
+def similarity(first, second):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_HASHES
+
+
+def _scopes(issue):
+    scopes = [f'equipment:{issue.equipment_id}']
+    if issue.software:
+        scopes.append(f'software:{issue.software.strip().lower()}')
+    return scopes
+
+
+def band_buckets(values, scopes):
+    """
+    ``(band, bucket)`` pairs for a signature, ``BANDS`` for each scope. The
+    bucket hashes the band's values together with the scope and band
+    number, so equal buckets mean the same band of the same scope.
+    """
+    packed = pack(values)
+    width = ROWS_PER_BAND * 4
+    pairs = []
+    for offset, scope in enumerate(scopes):
+        for band in range(BANDS):
+            number = offset * BANDS + band
+            pairs.append((number, zlib.crc32(
+                packed[band * width:(band + 1) * width], zlib.crc32(f'{scope}:{number}'.encode())
+            )))
+    return pairs
+
+
+_issues = IssueReport.__table__
+_bands = IssueSignatureBand.__table__
+# One statement for every lookup, so it is compiled once
+_CANDIDATES = select(_issues.c.id, _issues.c.signature).distinct().join(
+    _bands, _bands.c.issue_id == _issues.c.id
+).where(
+    _bands.c.bucket.in_(bindparam('buckets', expanding=True)),
+    _issues.c.status != 'Resolved',
+    _issues.c.created_at >= bindparam('since'),
+    _issues.c.id != bindparam('issue_id')
+)
+
+
+def find_matches(issue_id, values, buckets, threshold=DEFAULT_THRESHOLD,
+                 window=DEFAULT_WINDOW, now=None):
+    """
+    Recent open reports other than ``issue_id`` sharing one of ``buckets``
+    whose signature is at least ``threshold`` similar to ``values``, best
+    first.
+    """
+    candidates = db.session.connection().execute(_CANDIDATES, {
+        'buckets': [bucket for _, bucket in buckets],
+        'since': (now or datetime.utcnow()) - window,
+        'issue_id': issue_id,
+    })
+    matches = [
+        Match(candidate_id, similarity(values, unpack(data)))
+        for candidate_id, data in candidates if data
+    ]
+    matches = [match for match in matches if match.similarity >= threshold]
+    matches.sort(key=lambda match: (-match.similarity, -match.issue_id))
+    return matches
+
+
+def index_issue(issue, threshold=DEFAULT_THRESHOLD, window=DEFAULT_WINDOW, now=None):
+    """
+    Sign a newly added report, add it to the band index and put it in the
+    cluster of its closest recent duplicate. The report must be flushed;
+    the caller commits. Returns the best ``Match`` or ``None``.
+    """
+    values = signature(issue.description)
+    buckets = band_buckets(values, _scopes(issue))
+    matches = find_matches(issue.id, values, buckets, threshold, window, now)
+    connection = db.session.connection()
+    connection.execute(insert(_bands), [
+        {'issue_id': issue.id, 'band': band, 'bucket': bucket} for band, bucket in buckets
+    ])
+    issue.signature = pack(values)
+    if not matches:
+        return None
+
+    best = matches[0]
+    original = db.session.get(IssueReport, best.issue_id)
+    if original.cluster is None:
+        original.cluster = IssueCluster()
+    issue.cluster = original.cluster
+    return best
+
+
+def rebuild(threshold=DEFAULT_THRESHOLD, window=DEFAULT_WINDOW, batch_size=500, progress=None):
+    """
+    Sign and cluster every report from scratch, oldest first, as if each
+    had just been filed. Returns the number of reports processed.
+    """
+    IssueSignatureBand.query.delete()
+    IssueReport.query.update({IssueReport.cluster_id: None, IssueReport.signature: None})
+    IssueCluster.query.delete()
+    db.session.commit()
+
+    processed = 0
+    last_key = (datetime.min, 0)
+    while True:
+        batch = IssueReport.query.filter(
+            or_(IssueReport.created_at > last_key[0],
+                and_(IssueReport.created_at == last_key[0], IssueReport.id > last_key[1]))
+        ).order_by(IssueReport.created_at, IssueReport.id).limit(batch_size).all()
+        if not batch:
+            return processed
+        for issue in batch:
+            index_issue(issue, threshold, window, now=issue.created_at + timedelta(microseconds=1))
+            # Later reports in the batch must see this one's signature
+            db.session.flush()
+        db.session.commit()
+        processed += len(batch)
+        last_key = (batch[-1].created_at, batch[-1].id)
+        if progress:
+            progress(processed)
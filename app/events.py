@@ -0,0 +1,213 @@
+# app/events.py
+
+"""
+Change feed for the admin dashboard.
+
+Inserts, status changes and deletions of issue reports, borrow requests and
+maintenance tasks are collected while a session flushes and published to
+``feed`` once the transaction commits, so rolled back changes never reach
+the browser. Code that changes these rows with Core statements queues its
+events with ``queue_event``.
+
+``feed`` hands events to a broker. ``MemoryBroker`` keeps a short history
+in process, which is enough for a single worker. ``RedisBroker`` uses a
+Redis stream so every worker sees every event; it needs the optional
+``redis`` package. Other brokers can be added to ``BROKERS``.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import date, datetime
+from enum import Enum
+
+from sqlalchemy import event as sa_event, inspect
+from sqlalchemy.orm import Session
+
+from .models import BorrowRequest, IssueReport, Maintenance
+
+logger = logging.getLogger(__name__)
+
+Event = namedtuple('Event', 'id type data')
+
+# Event type and payload columns for each watched model
+WATCHED = {
+    IssueReport: ('issue_report', ('id', 'status', 'equipment_id', 'user_id', 'issue_type')),
+    BorrowRequest: ('borrow_request', ('id', 'status', 'equipment_id', 'user_id', 'subject_id')),
+    Maintenance: ('maintenance', ('id', 'status', 'equipment_id', 'scheduled_date')),
+}
+
+
+def _json_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class MemoryBroker:
+    """
+    In-process broker keeping the last ``buffer_size`` events so clients
+    can resume after a reconnect.
+    """
+
+    def __init__(self, buffer_size=1000):
+        self._events = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._condition = threading.Condition()
+
+    def publish(self, event_type, data):
+        with self._condition:
+            self._last_id += 1
+            self._events.append(Event(str(self._last_id), event_type, data))
+            self._condition.notify_all()
+
+    def last_id(self):
+        return str(self._last_id)
+
+    def read(self, last_id, timeout):
+        """
+        Return the events after ``last_id``, waiting up to ``timeout``
+        seconds for one to arrive.
+        """
+        with self._condition:
+            after = int(last_id) if last_id.isdigit() else self._last_id
+            if after > self._last_id:
+                # The client saw ids from before a restart
+                after = self._last_id
+            if after == self._last_id:
+                self._condition.wait(timeout)
+            return [e for e in self._events if int(e.id) > after]
+
+
+class RedisBroker:
+    """
+    Broker backed by a capped Redis stream, shared by all workers.
+    """
+
+    def __init__(self, url, buffer_size=1000, stream='laboratory:events'):
+        import redis  # optional dependency, only needed for this broker
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.buffer_size = buffer_size
+        self.stream = stream
+
+    def publish(self, event_type, data):
+        self._redis.xadd(
+            self.stream, {'type': event_type, 'data': json.dumps(data)},
+            maxlen=self.buffer_size, approximate=True
+        )
+
+    def last_id(self):
+        latest = self._redis.xrevrange(self.stream, count=1)
+        return latest[0][0] if latest else '0-0'
+
+    def read(self, last_id, timeout):
+        response = self._redis.xread(
+            {self.stream: last_id}, count=100, block=max(int(timeout * 1000), 1)
+        )
+        return [
+            Event(entry_id, fields['type'], json.loads(fields['data']))
+            for _, entries in response or ()
+            for entry_id, fields in entries
+        ]
+
+
+# Broker factory by EVENT_BROKER_URL scheme
+BROKERS = {
+    'memory': lambda url, buffer_size: MemoryBroker(buffer_size),
+    'redis': RedisBroker,
+    'rediss': RedisBroker,
+}
+
+
+class EventFeed:
+    """
+    Front for the configured broker.
+    """
+
+    def __init__(self):
+        self.broker = MemoryBroker()
+
+    def configure(self, url='memory://', buffer_size=1000):
+        scheme = url.split('://', 1)[0]
+        try:
+            factory = BROKERS[scheme]
+        except KeyError:
+            raise ValueError(
+                f"Unknown EVENT_BROKER_URL scheme '{scheme}'; expected one of {', '.join(BROKERS)}"
+            ) from None
+        self.broker = factory(url, buffer_size)
+
+    def publish(self, event_type, data):
+        # A broker outage must not fail the request that made the change
+        try:
+            self.broker.publish(event_type, data)
+        except Exception:
+            logger.exception('Could not publish %s event', event_type)
+
+    def stream(self, last_id=None, heartbeat=15.0, max_age=None):
+        """
+        Yield events after ``last_id`` (or from now), and ``None`` every
+        ``heartbeat`` seconds without one. Stops after ``max_age`` seconds
+        so long-lived connections are recycled.
+        """
+        cursor = last_id or self.broker.last_id()
+        deadline = None if max_age is None else time.monotonic() + max_age
+        while deadline is None or time.monotonic() < deadline:
+            events = self.broker.read(cursor, heartbeat)
+            if not events:
+                yield None
+            for event in events:
+                cursor = event.id
+                yield event
+
+
+feed = EventFeed()
+
+
+def format_sse(event):
+    """
+    Encode an event (or a ``None`` heartbeat) as a Server-Sent Events frame.
+    """
+    if event is None:
+        return ': keep-alive\n\n'
+    return f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n'
+
+
+def queue_event(session, event_type, action, **data):
+    """
+    Publish an event when ``session`` commits.
+    """
+    data = {key: _json_value(value) for key, value in data.items()}
+    session.info.setdefault('pending_events', []).append(
+        (event_type, dict(data, action=action))
+    )
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _collect_events(session, flush_context):
+    for objects, action in ((session.new, 'created'), (session.dirty, 'status_changed'),
+                            (session.deleted, 'deleted')):
+        for obj in objects:
+            watched = WATCHED.get(type(obj))
+            if watched is None:
+                continue
+            if action == 'status_changed' and not inspect(obj).attrs.status.history.has_changes():
+                continue
+            event_type, columns = watched
+            queue_event(session, event_type, action,
+                        **{column: getattr(obj, column) for column in columns})
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _publish_events(session):
+    for event_type, data in session.info.pop('pending_events', ()):
+        feed.publish(event_type, data)
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_events(session):
+    session.info.pop('pending_events', None)
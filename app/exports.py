@@ -0,0 +1,264 @@
+# app/exports.py
+
+"""
+Streaming exports of the issue, maintenance and borrow history.
+
+Rows are read with a server-side cursor in batches of ``chunk_size``
+(``yield_per``) and written out as they arrive, so an export holds one
+batch in memory however large the table is. Date range and status filters
+are part of the SELECT.
+
+CSV is produced by a generator. XLSX uses openpyxl's write-only mode, which
+spools rows to disk, and needs the optional ``openpyxl`` package.
+"""
+
+import csv
+import tempfile
+from collections import namedtuple
+
+from sqlalchemy import DateTime, select
+from sqlalchemy.orm import aliased
+
+from . import db
+from .models import BorrowRequest, Equipment, IssueReport, Maintenance, Room, Subject, User
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class ExportUnavailable(RuntimeError):
+    """
+    Raised when a format's optional dependency is not installed.
+    """
+
+
+Export = namedtuple('Export', 'title columns statement date_column status_column')
+
+
+def _issue_reports():
+    reporter = aliased(User)
+    columns = [
+        ('ID', IssueReport.id),
+        ('Reported At', IssueReport.created_at),
+        ('Status', IssueReport.status),
+        ('Issue Type', IssueReport.issue_type),
+        ('Software', IssueReport.software),
+        ('Description', IssueReport.description),
+        ('Reported By', reporter.full_name),
+        ('Reporter Email', reporter.email),
+        ('Equipment', Equipment.equipment_name),
+        ('Equipment Type', Equipment.equipment_type),
+        ('Room', Room.room_name),
+        ('Resolved At', IssueReport.resolved_at),
+    ]
+    statement = select(*(column for _, column in columns)).select_from(IssueReport).join(
+        reporter, IssueReport.user_id == reporter.id
+    ).join(
+        Equipment, IssueReport.equipment_id == Equipment.id
+    ).outerjoin(
+        Room, Equipment.room_id == Room.id
+    ).order_by(IssueReport.id)
+    return Export('Issue Reports', columns, statement, IssueReport.created_at, IssueReport.status)
+
+
+def _maintenances():
+    reporter = aliased(User)
+    columns = [
+        ('ID', Maintenance.id),
+        ('Scheduled Date', Maintenance.scheduled_date),
+        ('Status', Maintenance.status),
+        ('Description', Maintenance.description),
+        ('Equipment', Equipment.equipment_name),
+        ('Room', Room.room_name),
+        ('Reported By', reporter.full_name),
+        ('Completed Date', Maintenance.completed_date),
+        ('Created At', Maintenance.created_at),
+    ]
+    statement = select(*(column for _, column in columns)).select_from(Maintenance).join(
+        reporter, Maintenance.reported_by == reporter.id
+    ).join(
+        Equipment, Maintenance.equipment_id == Equipment.id
+    ).outerjoin(
+        Room, Equipment.room_id == Room.id
+    ).order_by(Maintenance.id)
+    return Export('Maintenances', columns, statement, Maintenance.scheduled_date, Maintenance.status)
+
+
+def _borrow_requests():
+    student = aliased(User)
+    admin = aliased(User)
+    columns = [
+        ('ID', BorrowRequest.id),
+        ('Requested At', BorrowRequest.request_date),
+        ('Status', BorrowRequest.status),
+        ('Student', student.full_name),
+        ('Student Email', student.email),
+        ('Laptop', Equipment.equipment_name),
+        ('Subject', Subject.subject_code),
+        ('Processed By', admin.full_name),
+    ]
+    statement = select(*(column for _, column in columns)).select_from(BorrowRequest).join(
+        student, BorrowRequest.user_id == student.id
+    ).outerjoin(
+        Equipment, BorrowRequest.equipment_id == Equipment.id
+    ).outerjoin(
+        Subject, BorrowRequest.subject_id == Subject.id
+    ).outerjoin(
+        admin, BorrowRequest.admin_id == admin.id
+    ).order_by(BorrowRequest.id)
+    return Export('Borrow Requests', columns, statement,
+                  BorrowRequest.request_date, BorrowRequest.status)
+
+
+EXPORTS = {
+    'issue_reports': _issue_reports,
+    'maintenances': _maintenances,
+    'borrow_requests': _borrow_requests,
+}
+
+
+def _status_value(column, status):
+    # Enum columns are compared by member, so check the name is one
+    enum_class = getattr(column.type, 'enum_class', None)
+    if enum_class is None:
+        return status
+    try:
+        return enum_class(status)
+    except ValueError:
+        raise ValueError(
+            f"Unknown status '{status}'; expected one of "
+            f"{', '.join(member.value for member in enum_class)}"
+        ) from None
+
+
+ExportRows = namedtuple('ExportRows', 'title header datetime_columns rows')
+
+
+def iter_rows(name, start=None, end=None, status=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Return an ``ExportRows`` whose ``rows`` generator yields the export's
+    rows (as lists) for ``start`` <= date < ``end`` and ``status``, each
+    optional. ``datetime_columns`` are the positions holding datetimes.
+    """
+    try:
+        export = EXPORTS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown export '{name}'; expected one of {', '.join(EXPORTS)}") from None
+
+    statement = export.statement
+    if start is not None:
+        statement = statement.where(export.date_column >= start)
+    if end is not None:
+        statement = statement.where(export.date_column < end)
+    if status:
+        statement = statement.where(
+            export.status_column == _status_value(export.status_column, status)
+        )
+
+    # Only the columns that need converting are touched for each row
+    enum_columns = [
+        position for position, (_, column) in enumerate(export.columns)
+        if getattr(column.type, 'enum_class', None) is not None
+    ]
+    datetime_columns = [
+        position for position, (_, column) in enumerate(export.columns)
+        if isinstance(column.type, DateTime)
+    ]
+
+    def rows():
+        result = db.session.execute(statement, execution_options={'yield_per': chunk_size})
+        try:
+            for row in result:
+                row = list(row)
+                for position in enum_columns:
+                    if row[position] is not None:
+                        row[position] = row[position].value
+                yield row
+        finally:
+            result.close()
+
+    return ExportRows(export.title, [label for label, _ in export.columns],
+                      datetime_columns, rows())
+
+
+class _Echo:
+    """
+    File-like object handing back what is written, for ``csv.writer``.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(export_rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield CSV text in pieces of about ``chunk_size`` rows.
+    """
+    writer = csv.writer(_Echo())
+    datetime_columns = export_rows.datetime_columns
+    pending = [writer.writerow(export_rows.header)]
+    for row in export_rows.rows:
+        for position in datetime_columns:
+            if row[position] is not None:
+                row[position] = row[position].isoformat(' ', 'seconds')
+        pending.append(writer.writerow(row))
+        if len(pending) >= chunk_size:
+            yield ''.join(pending)
+            pending = []
+    if pending:
+        yield ''.join(pending)
+
+
+def _xlsx_workbook():
+    try:
+        from openpyxl import Workbook  # optional dependency, only needed for XLSX
+    except ImportError:
+        raise ExportUnavailable('XLSX exports need the openpyxl package.') from None
+    return Workbook(write_only=True)
+
+
+def stream_xlsx(export_rows, block_size=64 * 1024):
+    """
+    Yield an XLSX file in blocks of ``block_size`` bytes. Rows go to a
+    write-only sheet, which openpyxl spools to disk, and the finished file
+    is read back from a temporary file.
+    """
+    workbook = _xlsx_workbook()
+
+    def generate():
+        sheet = workbook.create_sheet(title=export_rows.title[:31])
+        sheet.append(export_rows.header)
+        for row in export_rows.rows:
+            sheet.append(row)
+        with tempfile.TemporaryFile() as spool:
+            workbook.save(spool)
+            spool.seek(0)
+            while True:
+                block = spool.read(block_size)
+                if not block:
+                    break
+                yield block
+
+    return generate()
+
+
+# Media type and file extension of each format
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def export_stream(name, format='csv', start=None, end=None, status=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Check the export can be made and return a generator of its content
+    (text for CSV, bytes for XLSX). Raises ``ValueError`` for an unknown
+    export, format or status and ``ExportUnavailable`` when the format's
+    package is missing, before anything is read.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}'; expected one of {', '.join(FORMATS)}")
+    export_rows = iter_rows(name, start, end, status, chunk_size)
+    if format == 'xlsx':
+        return stream_xlsx(export_rows)
+    return stream_csv(export_rows, chunk_size)
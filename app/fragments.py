@@ -0,0 +1,278 @@
+# app/fragments.py
+
+"""
+Fragment cache for rarely changing template sections.
+
+A template wraps a section in a ``cache`` block naming the tables it shows:
+
+    {% cache 'dashboard:rooms', ['rooms', 'equipment'], extra_value %}
+        ...
+    {% endcache %}
+
+The rendered HTML is stored under the fragment name, the current version of
+each listed table and a hash of any further values the section varies on.
+Every committed change to a table bumps its version, so the next render
+misses and stores a fresh copy; unchanged sections are served from the
+backend without touching their data. Views pass the data as ``Lazy``
+values so that a cached section never runs its queries either.
+
+Versions are bumped after commit, from ORM unit-of-work events
+(``after_insert``, ``after_update``, ``after_delete``) and from ORM bulk
+statements. Code that changes a table with Core statements on the
+session's connection calls ``touch`` itself.
+
+``MemoryBackend`` keeps fragments in an in-process LRU, which suits one
+worker. ``RedisBackend`` shares fragments and versions between workers and
+needs the optional ``redis`` package. Other backends can be added to
+``BACKENDS``.
+"""
+
+import hashlib
+import logging
+import threading
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db
+from .cache import TTLCache
+from .replica import on_primary
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """
+    In-process LRU of fragments with table versions held in a dict.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600.0):
+        self._fragments = TTLCache(maxsize, ttl)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._fragments.get(key)
+
+    def set(self, key, html):
+        self._fragments.set(key, html)
+
+    def versions(self, tables):
+        return [self._versions.get(table, 0) for table in tables]
+
+    def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def stats(self):
+        return dict(self._fragments.stats(), versions=dict(self._versions))
+
+
+class RedisBackend:
+    """
+    Fragments and versions in Redis, shared by all workers.
+    """
+
+    def __init__(self, url, maxsize=None, ttl=3600.0, prefix='laboratory:fragments'):
+        import redis  # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self._redis.get(f'{self.prefix}:html:{key}')
+
+    def set(self, key, html):
+        self._redis.set(f'{self.prefix}:html:{key}', html, ex=self.ttl)
+
+    def versions(self, tables):
+        values = self._redis.mget([f'{self.prefix}:version:{table}' for table in tables])
+        return [int(value or 0) for value in values]
+
+    def bump(self, tables):
+        pipeline = self._redis.pipeline(transaction=False)
+        for table in tables:
+            pipeline.incr(f'{self.prefix}:version:{table}')
+        pipeline.execute()
+
+    def stats(self):
+        return {'backend': 'redis', 'ttl': self.ttl}
+
+
+# Backend factory by FRAGMENT_CACHE_URL scheme
+BACKENDS = {
+    'memory': lambda url, maxsize, ttl: MemoryBackend(maxsize, ttl),
+    'redis': RedisBackend,
+    'rediss': RedisBackend,
+}
+
+
+class FragmentCache:
+    """
+    Front for the configured backend. Backend errors are logged and the
+    fragment rendered uncached, so a cache outage never fails a page.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+
+    def configure(self, url='memory://', maxsize=256, ttl=3600.0):
+        scheme = url.split('://', 1)[0]
+        try:
+            factory = BACKENDS[scheme]
+        except KeyError:
+            raise ValueError(
+                f"Unknown FRAGMENT_CACHE_URL scheme '{scheme}'; expected one of {', '.join(BACKENDS)}"
+            ) from None
+        self.backend = factory(url, maxsize, ttl)
+
+    def key(self, name, tables, vary=()):
+        versions = '.'.join(str(version) for version in self.backend.versions(tables))
+        if not vary:
+            return f'{name}:{versions}'
+        digest = hashlib.sha1(repr(vary).encode()).hexdigest()[:16]
+        return f'{name}:{versions}:{digest}'
+
+    def render(self, name, tables, vary, render):
+        """
+        Return the cached HTML for the fragment, calling ``render`` to
+        produce and store it on a miss.
+        """
+        try:
+            # Versions are read before the data, so a change committed in
+            # between can only make the stored copy newer than its key
+            key = self.key(name, tables, vary)
+            html = self.backend.get(key)
+        except Exception:
+            logger.exception('Fragment cache lookup failed for %s', name)
+            return render()
+        if html is None:
+            # A read replica may lag the commit that bumped a version;
+            # rendering from it would store old data under the new key
+            html = on_primary(render)
+            try:
+                self.backend.set(key, str(html))
+            except Exception:
+                logger.exception('Fragment cache store failed for %s', name)
+        return html
+
+    def versions(self, tables):
+        """
+        Current versions of ``tables``, or ``None`` if the backend fails.
+        """
+        try:
+            return tuple(self.backend.versions(tables))
+        except Exception:
+            logger.exception('Could not read fragment versions for %s', ', '.join(tables))
+            return None
+
+    def bump(self, tables):
+        try:
+            self.backend.bump(sorted(tables))
+        except Exception:
+            logger.exception('Could not bump fragment versions for %s', ', '.join(tables))
+
+    def stats(self):
+        return self.backend.stats()
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Adds ``{% cache name, tables[, vary...] %}...{% endcache %}`` to Jinja.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        parser.stream.expect('comma')
+        tables = parser.parse_expression()
+        vary = []
+        while parser.stream.skip_if('comma'):
+            vary.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_fragment', [name, tables, nodes.List(vary)]),
+            [], [], body
+        ).set_lineno(lineno)
+
+    def _render_fragment(self, name, tables, vary, caller):
+        return Markup(fragment_cache.render(name, tables, tuple(vary), caller))
+
+
+class Lazy:
+    """
+    A value loaded on first use, for view data only a cached fragment needs.
+    Iteration, ``len``, truth and attribute access go to the loaded value.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._loaded = False
+        self._value = None
+
+    @property
+    def value(self):
+        if not self._loaded:
+            self._value = self._load()
+            self._loaded = True
+        return self._value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __bool__(self):
+        return bool(self.value)
+
+    def __getattr__(self, name):
+        return getattr(self.value, name)
+
+
+def touch(session, *tables):
+    """
+    Bump the versions of ``tables`` when ``session`` commits.
+    """
+    session.info.setdefault('touched_tables', set()).update(tables)
+
+
+def _touch_row(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        touch(session, *(table.name for table in mapper.tables))
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(db.Model, _event, _touch_row, propagate=True)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _touch_bulk_statement(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update
+            or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is not None:
+        touch(orm_execute_state.session, table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_versions(session):
+    tables = session.info.pop('touched_tables', None)
+    if tables:
+        fragment_cache.bump(tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_touched_tables(session):
+    session.info.pop('touched_tables', None)
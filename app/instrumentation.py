@@ -0,0 +1,268 @@
+# app/instrumentation.py
+
+"""
+Per-request performance instrumentation, enabled with ``INSTRUMENTATION``.
+
+For every request it records the number of SQL statements and their total
+time (from engine cursor events, so Core, ORM and replica statements all
+count), the time spent rendering templates and the total handler time.
+These go out in a ``Server-Timing`` header, which browser developer tools
+show next to the request:
+
+    Server-Timing: db;dur=12.4;desc="7 queries", tpl;dur=3.1, total;dur=18.9
+
+Template time includes any queries a template triggers itself (``Lazy``
+values), so ``db`` and ``tpl`` can overlap.
+
+Requests slower than ``SLOW_REQUEST_MS`` are logged with their slowest
+statements. Each endpoint keeps its last ``INSTRUMENTATION_WINDOW``
+timings; ``/admin/metrics`` reports their percentiles and running totals
+in the Prometheus text format. The figures are per process, so with
+several workers each scrape sees the worker that answered it.
+"""
+
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Longest statement text kept for the slow request log
+STATEMENT_PREVIEW = 300
+
+
+class RequestTiming:
+    """
+    What one request spent its time on. Only the slowest ``keep``
+    statements are remembered.
+    """
+
+    def __init__(self, keep=5):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.keep = keep
+        self.slowest = []
+        self._template_depth = 0
+        self._template_started = None
+
+    def add_statement(self, statement, duration):
+        self.queries += 1
+        self.sql_time += duration
+        entry = (duration, self.queries, statement)
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, entry)
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def template_started(self):
+        # Only the outermost render counts, so nested renders are not added twice
+        if self._template_depth == 0:
+            self._template_started = time.perf_counter()
+        self._template_depth += 1
+
+    def template_finished(self):
+        self._template_depth -= 1
+        if self._template_depth == 0 and self._template_started is not None:
+            self.template_time += time.perf_counter() - self._template_started
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f}, total;dur={total * 1000:.1f}'
+        )
+
+
+class EndpointStats:
+    """
+    Rolling window of one endpoint's timings plus running totals.
+    """
+
+    def __init__(self, window):
+        self.durations = deque(maxlen=window)
+        self.count = 0
+        self.total_time = 0.0
+        self.total_queries = 0
+        self.total_sql_time = 0.0
+
+    def record(self, duration, queries, sql_time):
+        self.durations.append(duration)
+        self.count += 1
+        self.total_time += duration
+        self.total_queries += queries
+        self.total_sql_time += sql_time
+
+    def quantiles(self):
+        ordered = sorted(self.durations)
+        if not ordered:
+            return {}
+        # Nearest-rank percentiles
+        return {q: ordered[max(0, math.ceil(q * len(ordered)) - 1)] for q in QUANTILES}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation:
+    """
+    Request hooks and the per-endpoint statistics they feed.
+    """
+
+    def __init__(self):
+        self.slow_request = 0.5
+        self.slowest = 5
+        self.window = 1024
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def configure(self, slow_request_ms=500, slowest=5, window=1024):
+        self.slow_request = slow_request_ms / 1000
+        self.slowest = slowest
+        self.window = window
+        with self._lock:
+            self._endpoints.clear()
+
+    def init_app(self, app):
+        """
+        Install the request hooks and start listening to engine and template
+        events.
+        """
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+
+    def _start(self):
+        g.request_timing = RequestTiming(self.slowest)
+
+    def _finish(self, response):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return response
+        total = time.perf_counter() - timing.started
+        response.headers['Server-Timing'] = timing.server_timing(total)
+        self.record(request.endpoint or 'unmatched', total, timing.queries, timing.sql_time)
+        if total >= self.slow_request:
+            self._log_slow(total, timing)
+        return response
+
+    def record(self, endpoint, duration, queries, sql_time):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats(self.window)
+            stats.record(duration, queries, sql_time)
+
+    def _log_slow(self, total, timing):
+        statements = ''.join(
+            f'\n  {duration * 1000:.1f} ms: {statement[:STATEMENT_PREVIEW]}'
+            for duration, _, statement in sorted(timing.slowest, reverse=True)
+        )
+        logger.warning(
+            'Slow request %s %s: %.0f ms, %d queries in %.0f ms, templates %.0f ms%s',
+            request.method, request.path, total * 1000, timing.queries,
+            timing.sql_time * 1000, timing.template_time * 1000, statements
+        )
+
+    def snapshot(self):
+        """
+        ``{endpoint: (quantiles, count, total time, queries, SQL time)}``.
+        """
+        with self._lock:
+            return {
+                endpoint: (stats.quantiles(), stats.count, stats.total_time,
+                           stats.total_queries, stats.total_sql_time)
+                for endpoint, stats in self._endpoints.items()
+            }
+
+    def prometheus(self, caches=None):
+        """
+        The statistics in the Prometheus text exposition format. ``caches``
+        maps cache names to ``stats()`` dicts with hit and miss counts.
+        """
+        snapshot = sorted(self.snapshot().items())
+        lines = [
+            '# HELP lab_request_duration_seconds Request handling time by endpoint.',
+            '# TYPE lab_request_duration_seconds summary',
+        ]
+        for endpoint, (quantiles, count, total_time, _, _) in snapshot:
+            label = f'endpoint="{_label(endpoint)}"'
+            for quantile, value in quantiles.items():
+                lines.append(
+                    f'lab_request_duration_seconds{{{label},quantile="{quantile}"}} {value:.6f}'
+                )
+            lines.append(f'lab_request_duration_seconds_sum{{{label}}} {total_time:.6f}')
+            lines.append(f'lab_request_duration_seconds_count{{{label}}} {count}')
+
+        lines += [
+            '# HELP lab_request_queries_total SQL statements run by endpoint.',
+            '# TYPE lab_request_queries_total counter',
+        ]
+        lines += [
+            f'lab_request_queries_total{{endpoint="{_label(endpoint)}"}} {queries}'
+            for endpoint, (_, _, _, queries, _) in snapshot
+        ]
+        lines += [
+            '# HELP lab_request_sql_seconds_total Time spent in SQL statements by endpoint.',
+            '# TYPE lab_request_sql_seconds_total counter',
+        ]
+        lines += [
+            f'lab_request_sql_seconds_total{{endpoint="{_label(endpoint)}"}} {sql_time:.6f}'
+            for endpoint, (_, _, _, _, sql_time) in snapshot
+        ]
+
+        caches = {name: stats for name, stats in (caches or {}).items() if 'hits' in stats}
+        if caches:
+            lines += [
+                '# HELP lab_cache_lookups_total Cache lookups by cache and result.',
+                '# TYPE lab_cache_lookups_total counter',
+            ]
+            for name, stats in sorted(caches.items()):
+                label = f'cache="{_label(name)}"'
+                lines.append(f'lab_cache_lookups_total{{{label},result="hit"}} {stats["hits"]}')
+                lines.append(f'lab_cache_lookups_total{{{label},result="miss"}} {stats["misses"]}')
+        return '\n'.join(lines) + '\n'
+
+
+instrumentation = Instrumentation()
+
+
+def _current_timing():
+    return g.get('request_timing') if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_timing() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = _current_timing()
+    started = conn.info.get('query_started')
+    if timing is not None and started:
+        timing.add_statement(statement, time.perf_counter() - started.pop())
+
+
+def _before_render(sender, template, context, **extra):
+    timing = _current_timing()
+    if timing is not None:
+        timing.template_started()
+
+
+def _after_render(sender, template, context, **extra):
+    timing = _current_timing()
+    if timing is not None:
+        timing.template_finished()
@@ -1,15 +1,81 @@
 # app/models.py
 
 from . import db, login_manager
+from .cache import TTLCache
+from .recurrence import describe, occurrences, occurs_at, schedule_span
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-from sqlalchemy import Enum
+from datetime import datetime, timedelta
+from sqlalchemy import Enum, and_, event, func, or_
+from sqlalchemy.orm import make_transient_to_detached
 import enum
 
+# Maintenance statuses that mean the equipment is currently being worked on
+ACTIVE_MAINTENANCE_STATUSES = ('Scheduled', 'In Progress')
+
+# Statuses an admin can set on a PC or laptop
+EQUIPMENT_STATUSES = ('Operational', 'Under Maintenance', 'Out of Service')
+
+# Column values of recently seen users, keyed by id. Sized from
+# USER_CACHE_SIZE / USER_CACHE_TTL in create_app.
+user_cache = TTLCache()
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """
+    Load the logged-in user, serving repeat requests from ``user_cache``
+    instead of querying the users table every time.
+    """
+    user_id = int(user_id)
+    values = user_cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.set(user_id, {
+                column.key: getattr(user, column.key)
+                for column in User.__table__.columns
+            })
+        return user
+
+    # Rebuild the user as an unmodified, persistent instance of this
+    # request's session so lazy relationships and updates keep working
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    """
+    Drop a user from ``user_cache`` after their row changed.
+    """
+    user_cache.invalidate(user_id)
+
+
+def touch_schedules(student_ids, connection=None):
+    """
+    Mark the calendars of the given students as changed. Runs on
+    ``connection`` when called from a flush event, else on the session.
+    """
+    student_ids = sorted(set(student_ids))
+    if not student_ids:
+        return
+    users = User.__table__
+    statement = users.update().where(users.c.id.in_(student_ids)).values(
+        schedule_version=users.c.schedule_version + 1,
+        schedule_updated_at=datetime.utcnow()
+    )
+    (connection or db.session).execute(statement)
+    for student_id in student_ids:
+        invalidate_user(student_id)
+
+
+def hash_password(password):
+    """
+    Hash a password the way ``User.set_password`` does. Kept at module level
+    so bulk imports can run it in worker processes.
+    """
+    return generate_password_hash(password, method='pbkdf2:sha256')
 
 
 class IssueType(enum.Enum):
@@ -33,6 +99,10 @@ class User(UserMixin, db.Model):
     full_name = db.Column(db.String(150), nullable=False)
     email = db.Column(db.String(150), unique=True, nullable=False)
     role = db.Column(db.String(50), nullable=False, default='User')
+    # Bumped whenever the student's enrollments or enrolled subjects change;
+    # used to answer calendar fetches with 304 Not Modified
+    schedule_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    schedule_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     subjects = db.relationship('Subject', secondary='student_subjects', backref='students')
@@ -49,14 +119,24 @@ class User(UserMixin, db.Model):
     )
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
 
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    # Covers role and profile changes made anywhere through the ORM
+    invalidate_user(target.id)
+
+
 class Room(db.Model):
     __tablename__ = 'rooms'
+    __table_args__ = (
+        db.Index('ix_rooms_room_name', 'room_name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     room_name = db.Column(db.String(50), nullable=False)
     pcs = db.relationship('Equipment', backref='room', lazy=True, cascade="all, delete-orphan")
@@ -68,6 +148,11 @@ class EquipmentType(enum.Enum):
 
 class Equipment(db.Model):
     __tablename__ = 'equipment'
+    __table_args__ = (
+        db.Index('ix_equipment_room_id_equipment_type', 'room_id', 'equipment_type'),
+        db.Index('ix_equipment_equipment_type_is_available', 'equipment_type', 'is_available'),
+        db.Index('ix_equipment_equipment_name', 'equipment_name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=True)  # Laptops may not be assigned to a room
     equipment_name = db.Column(db.String(100), nullable=False)
@@ -83,6 +168,10 @@ class Equipment(db.Model):
 
 class IssueReport(db.Model):
     __tablename__ = 'issue_reports'
+    __table_args__ = (
+        db.Index('ix_issue_reports_status_created_at', 'status', 'created_at'),
+        db.Index('ix_issue_reports_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -92,31 +181,200 @@ class IssueReport(db.Model):
     status = db.Column(db.String(50), default='Pending')  # e.g., Pending, In Progress, Resolved
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime, nullable=True)  # Set when the status becomes Resolved
+    # MinHash of the description and the cluster of duplicates, see app/dedup.py
+    signature = db.Column(db.LargeBinary(256), nullable=True)
+    cluster_id = db.Column(db.Integer, db.ForeignKey('issue_clusters.id'), nullable=True, index=True)
 
     # Relationships
     equipment = db.relationship('Equipment', back_populates='issue_reports')
     user = db.relationship('User', back_populates='issue_reports')
+    cluster = db.relationship('IssueCluster', back_populates='issues')
+    signature_bands = db.relationship(
+        'IssueSignatureBand', cascade='all, delete-orphan', lazy=True
+    )
+
+    def set_status(self, status):
+        """
+        Change the status, recording when the issue was resolved.
+        """
+        if status == 'Resolved':
+            if self.status != 'Resolved' or self.resolved_at is None:
+                self.resolved_at = datetime.utcnow()
+        else:
+            self.resolved_at = None
+        self.status = status
+
+
+class IssueCluster(db.Model):
+    """
+    Issue reports judged to describe the same problem, so they can be
+    resolved together.
+    """
+    __tablename__ = 'issue_clusters'
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    issues = db.relationship(
+        'IssueReport', back_populates='cluster', order_by='IssueReport.created_at'
+    )
+
+
+class IssueSignatureBand(db.Model):
+    """
+    One LSH band of an issue report's signature, keyed by its equipment or
+    software (see app/dedup.py). Reports sharing a bucket are candidate
+    duplicates.
+    """
+    __tablename__ = 'issue_signature_bands'
+    __table_args__ = (
+        db.Index('ix_issue_signature_bands_bucket', 'bucket'),
+    )
+    issue_id = db.Column(db.Integer, db.ForeignKey('issue_reports.id'), primary_key=True)
+    band = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    bucket = db.Column(db.BigInteger, nullable=False)  # Also encodes the band and scope
+
 
 class Subject(db.Model):
     __tablename__ = 'subjects'
+    __table_args__ = (
+        db.Index('ix_subjects_start_time_end_time', 'start_time', 'end_time'),
+        db.Index('ix_subjects_term_start_term_end', 'term_start', 'term_end'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     subject_code = db.Column(db.String(20), unique=True, nullable=False)
     subject_name = db.Column(db.String(100), nullable=False)
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
+    # Weekly recurrence, e.g. 'MO,WE'. When set the subject meets on those
+    # days from term_start to term_end at the times of start_time/end_time.
+    recurrence_days = db.Column(db.String(20), nullable=True)
+    term_start = db.Column(db.Date, nullable=True)
+    term_end = db.Column(db.Date, nullable=True)
 
     # Relationships
     pc_assignments = db.relationship('PCAssignment', back_populates='subject', lazy=True)
+    exceptions = db.relationship('SubjectException', back_populates='subject', lazy=True,
+                                 cascade='all, delete-orphan',
+                                 order_by='SubjectException.exception_date')
+
+    @property
+    def schedule_label(self):
+        return describe(self)
+
+    @property
+    def span(self):
+        return schedule_span(self)
+
+    @property
+    def exception_dates(self):
+        if not self.recurrence_days:
+            return frozenset()
+        return frozenset(e.exception_date for e in self.exceptions)
+
+    def occurrences(self, window_start=None, window_end=None):
+        """
+        Lazily yield ``(start, end)`` for each meeting within the window.
+        """
+        return occurrences(self, window_start, window_end, self.exception_dates)
+
+    def meets_at(self, moment):
+        return occurs_at(self, moment, self.exception_dates)
+
+    @classmethod
+    def overlapping(cls, window_start, window_end):
+        """
+        SQL filter for subjects that may meet within the window: one-off
+        subjects by their times, recurring ones by their term dates. The
+        exact occurrences are then expanded with ``recurrence.occurrences``.
+        """
+        one_off = [cls.recurrence_days.is_(None)]
+        recurring = [cls.recurrence_days.isnot(None)]
+        if window_end is not None:
+            one_off.append(cls.start_time < window_end)
+            recurring.append(cls.term_start <= window_end.date())
+        if window_start is not None:
+            one_off.append(cls.end_time > window_start)
+            # Allow for a class running past midnight into the window
+            recurring.append(cls.term_end >= (window_start - timedelta(days=1)).date())
+        return or_(and_(*one_off), and_(*recurring))
+
+
+class SubjectException(db.Model):
+    """
+    A date on which a recurring subject does not meet (holiday, exam day).
+    """
+    __tablename__ = 'subject_exceptions'
+    __table_args__ = (
+        db.UniqueConstraint('subject_id', 'exception_date',
+                            name='uq_subject_exceptions_subject_id_exception_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    exception_date = db.Column(db.Date, nullable=False)
+
+    subject = db.relationship('Subject', back_populates='exceptions')
+
+    @classmethod
+    def dates_by_subject(cls, subject_ids):
+        """
+        Return a dict mapping subject id to its set of exception dates,
+        fetched with a single query.
+        """
+        subject_ids = set(subject_ids)
+        if not subject_ids:
+            return {}
+        rows = db.session.query(cls.subject_id, cls.exception_date).filter(
+            cls.subject_id.in_(subject_ids)
+        )
+        dates = {}
+        for subject_id, exception_date in rows:
+            dates.setdefault(subject_id, set()).add(exception_date)
+        return dates
+
+
+# Subject columns shown on the student calendar
+SCHEDULE_COLUMNS = ('subject_code', 'subject_name', 'room_id', 'start_time', 'end_time',
+                    'recurrence_days', 'term_start', 'term_end')
+
+
+def _enrolled_student_ids(connection, subject_id):
+    enrollments = StudentSubject.__table__
+    return connection.execute(
+        db.select(enrollments.c.student_id).where(enrollments.c.subject_id == subject_id)
+    ).scalars().all()
+
+
+@event.listens_for(Subject, 'after_update')
+def _touch_enrolled_schedules(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[key].history.has_changes() for key in SCHEDULE_COLUMNS):
+        return
+    touch_schedules(_enrolled_student_ids(connection, target.id), connection)
+
+
+@event.listens_for(SubjectException, 'after_insert')
+@event.listens_for(SubjectException, 'after_update')
+@event.listens_for(SubjectException, 'after_delete')
+def _touch_schedules_for_exception(mapper, connection, target):
+    touch_schedules(_enrolled_student_ids(connection, target.subject_id), connection)
+
 
 class StudentSubject(db.Model):
     __tablename__ = 'student_subjects'
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'subject_id', name='uq_student_subjects_student_id_subject_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
 
 class PCAssignment(db.Model):
     __tablename__ = 'pc_assignments'
+    __table_args__ = (
+        db.Index('ix_pc_assignments_equipment_id_subject_id', 'equipment_id', 'subject_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -129,6 +387,10 @@ class PCAssignment(db.Model):
 
 class Maintenance(db.Model):
     __tablename__ = 'maintenances'
+    __table_args__ = (
+        db.Index('ix_maintenances_equipment_id_status', 'equipment_id', 'status'),
+        db.Index('ix_maintenances_scheduled_date', 'scheduled_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=False)
     reported_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # User who reported
@@ -143,6 +405,25 @@ class Maintenance(db.Model):
     equipment = db.relationship('Equipment', back_populates='maintenances')
     reporter = db.relationship('User', back_populates='maintenances_reported')
 
+    @classmethod
+    def active_by_equipment(cls, equipment_ids=None):
+        """
+        Return a dict mapping equipment id to its current (Scheduled or
+        In Progress) maintenance, fetched with a single aggregate query.
+        """
+        current_ids = db.session.query(
+            func.min(cls.id)
+        ).filter(
+            cls.status.in_(ACTIVE_MAINTENANCE_STATUSES)
+        ).group_by(cls.equipment_id)
+        if equipment_ids is not None:
+            if not equipment_ids:
+                return {}
+            current_ids = current_ids.filter(cls.equipment_id.in_(equipment_ids))
+
+        maintenances = cls.query.filter(cls.id.in_(current_ids)).all()
+        return {m.equipment_id: m for m in maintenances}
+
 
 
 class BorrowRequestStatus(enum.Enum):
@@ -153,9 +434,15 @@ class BorrowRequestStatus(enum.Enum):
 
 class BorrowRequest(db.Model):
     __tablename__ = 'borrow_requests'
+    __table_args__ = (
+        db.Index('ix_borrow_requests_status_request_date', 'status', 'request_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=False)
+    # Empty until a laptop is allocated when the student asked for any laptop
+    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=True)
+    # Class the laptop is needed for, used to allocate by time slot
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=True)
     request_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.Enum(BorrowRequestStatus), default=BorrowRequestStatus.Pending)
     admin_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Admin who processed the request
@@ -167,5 +454,43 @@ class BorrowRequest(db.Model):
         back_populates='borrow_requests'
     )
     equipment = db.relationship('Equipment', backref='borrow_requests')
+    subject = db.relationship('Subject')
     admin = db.relationship('User', foreign_keys=[admin_id])
 
+
+class DashboardCounter(db.Model):
+    """
+    A named count kept up to date by ``app.counters`` so dashboard figures
+    are read from one small table instead of counted from the full ones.
+    """
+    __tablename__ = 'dashboard_counters'
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Notification(db.Model):
+    """
+    A message to a user waiting in the outbox. Rows are written in the same
+    transaction as the change they announce and sent later by
+    ``flask notifications send`` (see ``app.notifications``).
+    """
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON, rendered into a message when sent
+    status = db.Column(db.String(20), nullable=False, default='Pending')  # Pending, Sent or Failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Set while a worker is sending the row, so others skip it until the lease ends
+    claimed_by = db.Column(db.String(36), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User')
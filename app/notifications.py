@@ -0,0 +1,333 @@
+# app/notifications.py
+
+"""
+Transactional outbox for user notifications.
+
+When a borrow request is approved or denied, or an issue report moves to In
+Progress or Resolved, a row is added to ``notification_outbox`` in the same
+transaction as the change, so a notification exists exactly when the change
+was committed. Session events queue them for ORM changes; code that changes
+statuses with Core statements calls ``notify_status`` itself. Nothing is
+sent on the request path.
+
+``flask notifications send`` drains the outbox in batches. A batch is
+claimed with a compare-and-swap UPDATE that leases its rows to one worker,
+so several workers can run side by side, and rows of a worker that dies
+mid-batch are picked up again once the lease ends (delivery is therefore
+at least once). Failed sends are retried with exponential backoff until
+``NOTIFY_MAX_ATTEMPTS``; messages that can never be delivered are marked
+Failed straight away.
+
+Messages go out through a mailer from ``MAILERS``: ``smtp`` for a real (or
+local stand-in) SMTP server, ``console`` to log them instead.
+"""
+
+import json
+import logging
+import random
+import smtplib
+import sys
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from enum import Enum
+
+from flask import render_template
+from sqlalchemy import event, insert, inspect, or_, select
+from sqlalchemy.orm import Session, joinedload
+
+from . import db
+from .models import BorrowRequest, BorrowRequestStatus, IssueReport, Notification
+
+logger = logging.getLogger(__name__)
+
+# Notification kind and the statuses users are told about, by model
+NOTIFIED = {
+    BorrowRequest: ('borrow_request_status',
+                    (BorrowRequestStatus.Approved, BorrowRequestStatus.Denied)),
+    IssueReport: ('issue_report_status', ('In Progress', 'Resolved')),
+}
+
+# Longest wait between two attempts at the same message
+MAX_BACKOFF = timedelta(hours=6)
+
+DeliveryReport = namedtuple('DeliveryReport', 'claimed sent retried failed')
+
+
+def _value(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def notify_status(connection, model, changes):
+    """
+    Queue notifications for ``changes``, ``(id, user_id, new_status)``
+    tuples of ``model`` rows, in the caller's transaction. Statuses users
+    are not told about are skipped.
+    """
+    kind, statuses = NOTIFIED[model]
+    now = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'kind': kind,
+            'payload': json.dumps({'id': row_id, 'status': _value(status)}),
+            'status': 'Pending',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+        }
+        for row_id, user_id, status in changes if status in statuses
+    ]
+    if rows:
+        connection.execute(insert(Notification.__table__), rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _queue_status_notifications(session, flush_context):
+    changes = {}
+    for obj in session.dirty:
+        if type(obj) not in NOTIFIED:
+            continue
+        history = inspect(obj).attrs.status.history
+        if history.has_changes() and history.added:
+            changes.setdefault(type(obj), []).append((obj.id, obj.user_id, obj.status))
+    for model, model_changes in changes.items():
+        notify_status(session.connection(), model, model_changes)
+
+
+# Messages by kind: subject line and plain-text template
+def _borrow_request_message(payload):
+    borrow_request = db.session.get(BorrowRequest, payload['id'], options=[
+        joinedload(BorrowRequest.equipment), joinedload(BorrowRequest.subject)
+    ])
+    if borrow_request is None:
+        raise LookupError(f"Borrow request {payload['id']} no longer exists.")
+    return (f"Your laptop request was {payload['status'].lower()}",
+            'email/borrow_request_status.txt', {'borrow_request': borrow_request})
+
+
+def _issue_report_message(payload):
+    issue = db.session.get(IssueReport, payload['id'], options=[joinedload(IssueReport.equipment)])
+    if issue is None:
+        raise LookupError(f"Issue report {payload['id']} no longer exists.")
+    return (f"Your issue report is {payload['status'].lower()}",
+            'email/issue_report_status.txt', {'issue': issue})
+
+
+MESSAGES = {
+    'borrow_request_status': _borrow_request_message,
+    'issue_report_status': _issue_report_message,
+}
+
+
+def build_message(notification, sender):
+    """
+    Render ``notification`` into an email. Raises ``LookupError`` when it
+    can never be sent (unknown kind, or the record it is about is gone).
+    """
+    try:
+        make = MESSAGES[notification.kind]
+    except KeyError:
+        raise LookupError(f"Unknown notification kind '{notification.kind}'.") from None
+    payload = json.loads(notification.payload)
+    subject, template, context = make(payload)
+
+    message = EmailMessage()
+    message['Subject'] = subject
+    message['From'] = sender
+    message['To'] = notification.user.email
+    message.set_content(render_template(
+        template, user=notification.user, status=payload['status'], **context
+    ))
+    return message
+
+
+class SMTPMailer:
+    """
+    Sends through an SMTP server, one connection per batch.
+    """
+
+    def __init__(self, host='localhost', port=25, username=None, password=None,
+                 use_tls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    @contextmanager
+    def session(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            yield smtp.send_message
+        finally:
+            try:
+                smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                smtp.close()
+
+
+class ConsoleMailer:
+    """
+    Writes messages to standard output instead of sending them, for
+    development.
+    """
+
+    def __init__(self, stream=None, **options):
+        self.stream = stream
+
+    @contextmanager
+    def session(self):
+        stream = self.stream or sys.stdout
+
+        def send(message):
+            stream.write(f'{message.as_string()}\n')
+        yield send
+
+
+MAILERS = {
+    'smtp': SMTPMailer,
+    'console': ConsoleMailer,
+}
+
+
+def make_mailer(config):
+    """
+    The mailer selected by ``MAIL_BACKEND``.
+    """
+    backend = config['MAIL_BACKEND']
+    try:
+        factory = MAILERS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown MAIL_BACKEND '{backend}'; expected one of {', '.join(MAILERS)}"
+        ) from None
+    return factory(
+        host=config['MAIL_SERVER'], port=config['MAIL_PORT'],
+        username=config['MAIL_USERNAME'], password=config['MAIL_PASSWORD'],
+        use_tls=config['MAIL_USE_TLS']
+    )
+
+
+def claim(batch_size, lease, now=None):
+    """
+    Lease up to ``batch_size`` due notifications to this worker until
+    ``now + lease`` and return them. Rows another worker claimed first are
+    left out.
+    """
+    now = now or datetime.utcnow()
+    table = Notification.__table__
+    claimable = (
+        table.c.status == 'Pending',
+        table.c.next_attempt_at <= now,
+        or_(table.c.locked_until.is_(None), table.c.locked_until < now),
+    )
+    connection = db.session.connection()
+    due = connection.execute(
+        select(table.c.id).where(*claimable)
+        .order_by(table.c.next_attempt_at, table.c.id).limit(batch_size)
+    ).scalars().all()
+    if not due:
+        db.session.commit()
+        return []
+
+    token = uuid.uuid4().hex
+    connection.execute(
+        table.update().where(table.c.id.in_(due), *claimable)
+        .values(claimed_by=token, locked_until=now + lease)
+    )
+    db.session.commit()
+    return Notification.query.options(joinedload(Notification.user)).filter(
+        Notification.claimed_by == token
+    ).order_by(Notification.id).all()
+
+
+def _sent(notification, now):
+    notification.status = 'Sent'
+    notification.sent_at = now
+    notification.attempts += 1
+    notification.claimed_by = notification.locked_until = None
+    notification.last_error = None
+
+
+def _failed(notification, error, now, backoff, max_attempts, permanent=False):
+    notification.attempts += 1
+    notification.last_error = str(error)[:1000]
+    notification.claimed_by = notification.locked_until = None
+    if permanent or notification.attempts >= max_attempts:
+        notification.status = 'Failed'
+        return False
+    # Exponential backoff with jitter, so retries of a batch spread out
+    delay = min(backoff * 2 ** (notification.attempts - 1), MAX_BACKOFF)
+    notification.next_attempt_at = now + delay * random.uniform(0.8, 1.2)
+    return True
+
+
+def send_batch(mailer, sender, batch_size=50, max_attempts=8,
+               backoff=timedelta(seconds=30), lease=timedelta(minutes=5)):
+    """
+    Claim and send one batch. Returns a ``DeliveryReport`` of how many
+    notifications were claimed, sent, scheduled for a retry and given up.
+    """
+    notifications = claim(batch_size, lease)
+    if not notifications:
+        return DeliveryReport(0, 0, 0, 0)
+    sent = retried = failed = 0
+    pending = list(notifications)
+    try:
+        with mailer.session() as send:
+            while pending:
+                notification = pending[0]
+                now = datetime.utcnow()
+                try:
+                    send(build_message(notification, sender))
+                except LookupError as exc:
+                    _failed(notification, exc, now, backoff, max_attempts, permanent=True)
+                    failed += 1
+                except smtplib.SMTPRecipientsRefused as exc:
+                    _failed(notification, exc, now, backoff, max_attempts, permanent=True)
+                    failed += 1
+                except smtplib.SMTPResponseException as exc:
+                    # 5xx replies will not change on a retry
+                    if _failed(notification, exc, now, backoff, max_attempts,
+                               permanent=exc.smtp_code >= 500):
+                        retried += 1
+                    else:
+                        failed += 1
+                else:
+                    _sent(notification, now)
+                    sent += 1
+                pending.pop(0)
+    except (OSError, smtplib.SMTPException) as exc:
+        # The server is unreachable or dropped us; the rest wait for a retry
+        logger.warning('Sending notifications failed: %s', exc)
+        now = datetime.utcnow()
+        for notification in pending:
+            if _failed(notification, exc, now, backoff, max_attempts):
+                retried += 1
+            else:
+                failed += 1
+    db.session.commit()
+    return DeliveryReport(len(notifications), sent, retried, failed)
+
+
+def purge(older_than):
+    """
+    Delete notifications sent more than ``older_than`` ago. Returns how many
+    were deleted.
+    """
+    table = Notification.__table__
+    deleted = db.session.connection().execute(
+        table.delete().where(
+            table.c.status == 'Sent', table.c.sent_at < datetime.utcnow() - older_than
+        )
+    ).rowcount
+    db.session.commit()
+    return deleted
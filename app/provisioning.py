@@ -0,0 +1,245 @@
+# app/provisioning.py
+
+"""
+Bulk equipment provisioning.
+
+Rooms are created together with their PCs, and inventory files (CSV or JSON
+with ``name``, ``type``, ``room`` and ``status`` columns) are imported with
+one set-based existence check and a bulk insert inside a single transaction.
+"""
+
+import csv
+import io
+import json
+from collections import namedtuple
+
+from sqlalchemy import insert
+
+from . import db
+from .models import EQUIPMENT_STATUSES, Equipment, EquipmentType, Room
+
+INVENTORY_FIELDS = ('name', 'type', 'room', 'status')
+
+RowError = namedtuple('RowError', 'line name message')
+
+
+class InventoryFormatError(ValueError):
+    """
+    Raised when an uploaded inventory file cannot be read at all.
+    """
+
+
+class ImportReport:
+    """
+    Outcome of an inventory import, reported per row.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.rooms_created = []
+        self.skipped = []
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def pc_rows(room_id, count, start=1):
+    """
+    Insert parameters for ``count`` PCs named ``PC-<n>`` in a room.
+    """
+    return [
+        {
+            'room_id': room_id,
+            'equipment_name': f'PC-{i}',
+            'status': 'Operational',
+            'is_available': True,
+            'equipment_type': EquipmentType.PC,
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def create_room_with_pcs(room_name, pc_count):
+    """
+    Create a room and its PCs in one transaction and return the room.
+    """
+    try:
+        room = Room(room_name=room_name)
+        db.session.add(room)
+        db.session.flush()
+        if pc_count:
+            db.session.execute(insert(Equipment), pc_rows(room.id, pc_count))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return room
+
+
+def existing_equipment_names(names):
+    """
+    Return the subset of ``names`` already used by some equipment.
+    """
+    if not names:
+        return set()
+    rows = db.session.query(Equipment.equipment_name).filter(
+        Equipment.equipment_name.in_(names)
+    ).all()
+    return {row[0] for row in rows}
+
+
+def parse_inventory(stream, filename):
+    """
+    Read an uploaded CSV or JSON inventory file.
+
+    Returns a list of ``(line, record)`` pairs where ``line`` is the CSV line
+    or JSON array position used in error messages.
+    """
+    raw = stream.read()
+    if isinstance(raw, bytes):
+        try:
+            raw = raw.decode('utf-8-sig')
+        except UnicodeDecodeError as exc:
+            raise InventoryFormatError('File must be UTF-8 encoded.') from exc
+
+    if filename.lower().endswith('.json'):
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            raise InventoryFormatError(f'Invalid JSON: {exc}') from exc
+        if isinstance(data, dict):
+            data = data.get('equipment', [])
+        if not isinstance(data, list):
+            raise InventoryFormatError('JSON must be a list of equipment objects.')
+        return [(index, item) for index, item in enumerate(data, start=1)]
+
+    reader = csv.DictReader(io.StringIO(raw))
+    if not reader.fieldnames or 'name' not in [f.strip().lower() for f in reader.fieldnames]:
+        raise InventoryFormatError(
+            f"CSV must have a header row with the columns {', '.join(INVENTORY_FIELDS)}."
+        )
+    records = []
+    for record in reader:
+        records.append((
+            reader.line_num,
+            {(key or '').strip().lower(): value for key, value in record.items()}
+        ))
+    return records
+
+
+def _clean_record(line, record):
+    """
+    Normalise one inventory record, returning ``(values, error)``.
+    """
+    if not isinstance(record, dict):
+        return None, RowError(line, '', 'Row is not an object.')
+
+    name = str(record.get('name') or '').strip()
+    if not name:
+        return None, RowError(line, '', 'Name is required.')
+
+    type_value = str(record.get('type') or EquipmentType.PC.value).strip()
+    equipment_type = next(
+        (t for t in EquipmentType if t.value.lower() == type_value.lower()), None
+    )
+    if equipment_type is None:
+        return None, RowError(line, name, f'Unknown type "{type_value}".')
+
+    room_name = str(record.get('room') or '').strip() or None
+    if equipment_type == EquipmentType.PC and room_name is None:
+        return None, RowError(line, name, 'PCs must belong to a room.')
+
+    status = str(record.get('status') or 'Operational').strip()
+    status = next((s for s in EQUIPMENT_STATUSES if s.lower() == status.lower()), None)
+    if status is None:
+        return None, RowError(line, name, f"Unknown status \"{record.get('status')}\".")
+
+    return {
+        'name': name,
+        'type': equipment_type,
+        'room': room_name,
+        'status': status,
+    }, None
+
+
+def import_inventory(records, create_rooms=True):
+    """
+    Import parsed inventory records and return an ``ImportReport``.
+
+    Rows are validated first; unknown rooms are created when ``create_rooms``
+    is set and reported as errors otherwise. Equipment that already exists
+    with the same name in the same room is skipped. Everything valid is then
+    written with bulk inserts in one transaction.
+    """
+    report = ImportReport()
+    rows = []
+    seen = set()
+    for line, record in records:
+        values, error = _clean_record(line, record)
+        if error:
+            report.errors.append(error)
+            continue
+        key = (values['name'], values['room'])
+        if key in seen:
+            report.errors.append(RowError(line, values['name'], 'Duplicate row in file.'))
+            continue
+        seen.add(key)
+        rows.append((line, values))
+
+    room_names = {values['room'] for _, values in rows if values['room']}
+    room_ids = dict(
+        db.session.query(Room.room_name, Room.id).filter(Room.room_name.in_(room_names)).all()
+    ) if room_names else {}
+
+    missing_rooms = sorted(room_names - set(room_ids))
+    if missing_rooms and not create_rooms:
+        for line, values in rows:
+            if values['room'] in missing_rooms:
+                report.errors.append(
+                    RowError(line, values['name'], f"Room \"{values['room']}\" does not exist.")
+                )
+        rows = [(line, values) for line, values in rows if values['room'] not in missing_rooms]
+        missing_rooms = []
+
+    try:
+        if missing_rooms:
+            db.session.execute(insert(Room), [{'room_name': name} for name in missing_rooms])
+            room_ids.update(
+                db.session.query(Room.room_name, Room.id)
+                .filter(Room.room_name.in_(missing_rooms)).all()
+            )
+            report.rooms_created = missing_rooms
+
+        existing = set(
+            db.session.query(Equipment.equipment_name, Equipment.room_id).filter(
+                Equipment.equipment_name.in_({values['name'] for _, values in rows})
+            ).all()
+        ) if rows else set()
+
+        to_insert = []
+        for line, values in rows:
+            room_id = room_ids.get(values['room'])
+            if (values['name'], room_id) in existing:
+                report.skipped.append(
+                    RowError(line, values['name'], 'Already exists.')
+                )
+                continue
+            to_insert.append({
+                'room_id': room_id,
+                'equipment_name': values['name'],
+                'status': values['status'],
+                'is_available': values['status'] == 'Operational',
+                'equipment_type': values['type'],
+            })
+
+        if to_insert:
+            db.session.execute(insert(Equipment), to_insert)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report.created = len(to_insert)
+    return report
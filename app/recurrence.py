@@ -0,0 +1,134 @@
+# app/recurrence.py
+
+"""
+Weekly recurrence rules for class schedules.
+
+A schedule is anything with ``start_time``, ``end_time``, ``recurrence_days``,
+``term_start`` and ``term_end`` attributes (a ``Subject`` or a row selected
+with those columns). Without ``recurrence_days`` it is a single meeting from
+``start_time`` to ``end_time``. With them it meets on those weekdays between
+``term_start`` and ``term_end``, at the time of day and for the duration of
+``start_time``-``end_time``.
+
+Occurrences are never stored: ``occurrences`` expands them lazily for the
+window being asked about, skipping exception dates.
+"""
+
+from datetime import datetime, timedelta
+
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+def parse_days(value):
+    """
+    Turn a ``'MO,WE,FR'`` rule into a sorted tuple of weekday numbers
+    (Monday is 0). Raises ``ValueError`` on unknown codes.
+    """
+    if not value:
+        return ()
+    days = set()
+    for code in value.split(','):
+        code = code.strip().upper()
+        if not code:
+            continue
+        if code not in WEEKDAY_CODES:
+            raise ValueError(f'Unknown weekday "{code}".')
+        days.add(WEEKDAY_CODES.index(code))
+    return tuple(sorted(days))
+
+
+def format_days(days):
+    """
+    Inverse of ``parse_days``; returns ``None`` for an empty rule.
+    """
+    return ','.join(WEEKDAY_CODES[day] for day in sorted(set(days))) or None
+
+
+def is_recurring(schedule):
+    return bool(schedule.recurrence_days)
+
+
+def schedule_span(schedule):
+    """
+    Return ``(start, end)`` covering every occurrence of the schedule.
+    """
+    if not is_recurring(schedule):
+        return schedule.start_time, schedule.end_time
+    duration = schedule.end_time - schedule.start_time
+    time_of_day = schedule.start_time.time()
+    return (
+        datetime.combine(schedule.term_start, time_of_day),
+        datetime.combine(schedule.term_end, time_of_day) + duration,
+    )
+
+
+def occurrences(schedule, window_start=None, window_end=None, exceptions=()):
+    """
+    Yield ``(start, end)`` for each occurrence overlapping the half-open
+    window ``[window_start, window_end)``. ``None`` leaves that side open.
+    Only the days inside the window are visited.
+    """
+    if not is_recurring(schedule):
+        start, end = schedule.start_time, schedule.end_time
+        if (window_end is None or start < window_end) and (
+                window_start is None or end > window_start):
+            yield start, end
+        return
+
+    days = parse_days(schedule.recurrence_days)
+    duration = schedule.end_time - schedule.start_time
+    time_of_day = schedule.start_time.time()
+
+    first_day = schedule.term_start
+    if window_start is not None:
+        # An occurrence starting the day before may still be running
+        first_day = max(first_day, (window_start - duration).date())
+    last_day = schedule.term_end
+    if window_end is not None:
+        last_day = min(last_day, window_end.date())
+
+    day = first_day
+    while day <= last_day:
+        if day.weekday() in days and day not in exceptions:
+            start = datetime.combine(day, time_of_day)
+            end = start + duration
+            if (window_end is None or start < window_end) and (
+                    window_start is None or end > window_start):
+                yield start, end
+        day += timedelta(days=1)
+
+
+def occurs_at(schedule, moment, exceptions=()):
+    """
+    True if an occurrence is in session at ``moment``, counting both its
+    start and end as inside.
+    """
+    tick = timedelta(microseconds=1)
+    return next(occurrences(schedule, moment - tick, moment + tick, exceptions), None) is not None
+
+
+def first_overlap(schedule, other, exceptions=(), other_exceptions=()):
+    """
+    Return the first ``(start, end)`` occurrence of ``schedule`` that
+    overlaps an occurrence of ``other``, or ``None``. Each occurrence of
+    ``schedule`` only expands ``other`` within that occurrence's window.
+    """
+    other_start, other_end = schedule_span(other)
+    for start, end in occurrences(schedule, other_start, other_end, exceptions):
+        for _ in occurrences(other, start, end, other_exceptions):
+            return start, end
+    return None
+
+
+def describe(schedule):
+    """
+    Human readable schedule, e.g. ``Mon, Wed 08:00-10:00 (2024-08-05 to
+    2024-12-13)``.
+    """
+    if not is_recurring(schedule):
+        return (f'{schedule.start_time:%Y-%m-%d %H:%M} - '
+                f'{schedule.end_time:%Y-%m-%d %H:%M}')
+    days = ', '.join(WEEKDAY_NAMES[day] for day in parse_days(schedule.recurrence_days))
+    return (f'{days} {schedule.start_time:%H:%M}-{schedule.end_time:%H:%M} '
+            f'({schedule.term_start:%Y-%m-%d} to {schedule.term_end:%Y-%m-%d})')
@@ -0,0 +1,63 @@
+# app/replica.py
+
+"""
+Read replica routing.
+
+When a ``replica`` bind is configured, views decorated with
+``use_read_replica`` send their SELECT statements to it. Writes, and every
+statement issued while flushing, always go to the primary.
+"""
+
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from the replica inside ``use_read_replica`` views.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and getattr(clause, 'is_select', False)
+            and has_request_context()
+            and g.get('use_read_replica')
+        ):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def on_primary(read):
+    """
+    Call ``read`` with its reads sent to the primary, even inside a
+    ``use_read_replica`` view. For results cached under a version bumped
+    by a commit the replica may not have applied yet.
+    """
+    if not has_request_context():
+        return read()
+    previous = g.get('use_read_replica')
+    g.use_read_replica = False
+    try:
+        return read()
+    finally:
+        g.use_read_replica = previous
+
+
+def use_read_replica(f):
+    """
+    Route the view's reads to the read replica when one is configured.
+    Only use it on views that never write.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_read_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
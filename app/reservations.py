@@ -0,0 +1,159 @@
+# app/reservations.py
+
+"""
+Laptop reservation state changes.
+
+Every transition is a compare-and-swap: the UPDATE (or INSERT ... SELECT)
+only matches while the row is still in the state the caller expects, and
+the affected row count tells whether this request won. Two admins approving
+requests for the same laptop can therefore never both succeed, and no row
+is locked for longer than the few statements of one transaction.
+
+The statements run on the session's connection so they share its
+transaction without going through ORM bulk-statement hooks; their
+dashboard events, counter changes, notifications and fragment cache
+versions are recorded explicitly.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import exists, false, insert, literal, select, true
+
+from . import db
+from .counters import count_transition
+from .events import queue_event
+from .fragments import touch
+from .models import BorrowRequest, BorrowRequestStatus, Equipment, EquipmentType, User
+from .notifications import notify_status
+
+# Requests that hold, or are waiting for, a laptop
+OPEN_STATUSES = (BorrowRequestStatus.Pending, BorrowRequestStatus.Approved)
+
+# Allowed status changes, by current status
+TRANSITIONS = {
+    BorrowRequestStatus.Pending: (BorrowRequestStatus.Approved, BorrowRequestStatus.Denied),
+    BorrowRequestStatus.Approved: (BorrowRequestStatus.Returned,),
+}
+
+
+class ReservationConflict(Exception):
+    """
+    The laptop or request changed underneath us; nothing was written.
+    """
+
+
+def _execute(statement):
+    return db.session.connection().execute(statement)
+
+
+def request_laptop(user_id, subject_id, laptop_id=None):
+    """
+    Insert a pending request for a laptop for ``subject_id``, unless the
+    student already has an open request for that subject. A specific
+    ``laptop_id`` must be an available laptop at that instant; without one
+    the request waits for ``allocation.allocate_laptops`` to pick a laptop.
+    """
+    requests = BorrowRequest.__table__
+    equipment = Equipment.__table__
+    users = User.__table__
+    values = {
+        'user_id': users.c.id,
+        'equipment_id': literal(laptop_id, requests.c.equipment_id.type),
+        'subject_id': literal(subject_id, requests.c.subject_id.type),
+        'request_date': literal(datetime.utcnow(), requests.c.request_date.type),
+        'status': literal(BorrowRequestStatus.Pending, requests.c.status.type),
+    }
+
+    conditions = [
+        users.c.id == user_id,
+        ~exists().where(
+            requests.c.user_id == user_id,
+            requests.c.subject_id == subject_id,
+            requests.c.status.in_(OPEN_STATUSES)
+        ),
+    ]
+    if laptop_id is not None:
+        conditions.append(exists().where(
+            equipment.c.id == laptop_id,
+            equipment.c.equipment_type == EquipmentType.Laptop,
+            equipment.c.is_available == true()
+        ))
+    guard = select(*values.values()).where(*conditions)
+
+    try:
+        result = _execute(insert(requests).from_select(list(values), guard))
+        if result.rowcount != 1:
+            raise ReservationConflict(
+                'That laptop is no longer available, or you already have a '
+                'request for this subject.'
+            )
+        count_transition(db.session.connection(), BorrowRequest, None,
+                         BorrowRequestStatus.Pending)
+        touch(db.session, BorrowRequest.__tablename__)
+        queue_event(db.session, 'borrow_request', 'created', id=result.lastrowid,
+                    status=BorrowRequestStatus.Pending, equipment_id=laptop_id,
+                    user_id=user_id, subject_id=subject_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def change_status(request_id, new_status, admin_id):
+    """
+    Move a borrow request to ``new_status`` and update its laptop in the
+    same transaction. Raises ``ValueError`` for a transition that is never
+    allowed and ``ReservationConflict`` when the request or laptop is no
+    longer in the expected state.
+    """
+    requests = BorrowRequest.__table__
+    equipment = Equipment.__table__
+
+    current = db.session.execute(
+        select(
+            requests.c.status, requests.c.equipment_id, requests.c.user_id, requests.c.subject_id
+        ).where(requests.c.id == request_id)
+    ).first()
+    if current is None:
+        raise LookupError(f'Borrow request {request_id} does not exist.')
+    old_status, equipment_id, user_id, subject_id = current
+    if new_status not in TRANSITIONS.get(old_status, ()):
+        raise ValueError(f'A {old_status.value} request cannot be marked {new_status.value}.')
+    if new_status == BorrowRequestStatus.Approved and equipment_id is None:
+        raise ValueError('This request is for any laptop; use Allocate Laptops to approve it.')
+
+    try:
+        # Claim (or release) the laptop first: only one approval can flip it
+        if new_status == BorrowRequestStatus.Approved:
+            claimed = _execute(
+                equipment.update().where(
+                    equipment.c.id == equipment_id, equipment.c.is_available == true()
+                ).values(is_available=False)
+            )
+            if claimed.rowcount != 1:
+                raise ReservationConflict('The laptop is already on loan.')
+        elif new_status == BorrowRequestStatus.Returned:
+            _execute(
+                equipment.update().where(
+                    equipment.c.id == equipment_id, equipment.c.is_available == false()
+                ).values(is_available=True)
+            )
+
+        moved = _execute(
+            requests.update().where(
+                requests.c.id == request_id, requests.c.status == old_status
+            ).values(status=new_status, admin_id=admin_id)
+        )
+        if moved.rowcount != 1:
+            raise ReservationConflict('The request was already processed by someone else.')
+        count_transition(db.session.connection(), BorrowRequest, old_status, new_status)
+        notify_status(db.session.connection(), BorrowRequest,
+                      [(request_id, user_id, new_status)])
+        touch(db.session, BorrowRequest.__tablename__, Equipment.__tablename__)
+        queue_event(db.session, 'borrow_request', 'status_changed', id=request_id,
+                    status=new_status, equipment_id=equipment_id,
+                    user_id=user_id, subject_id=subject_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,253 @@
+# app/roster.py
+
+"""
+Streaming bulk import of student rosters.
+
+Records are read lazily from a CSV, JSON Lines or JSON file and processed in
+chunks: each chunk is checked against existing emails, usernames and student
+numbers with one query, its passwords are hashed (across a process pool when
+``workers`` allows, as the CLI does), and the new students are written with
+a single bulk insert.
+"""
+
+import csv
+import json
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import User, hash_password
+
+ROSTER_FIELDS = ('student_number', 'username', 'full_name', 'email', 'password')
+REQUIRED_FIELDS = ('username', 'full_name', 'email', 'password')
+
+# Below this many passwords per chunk a process pool costs more than it saves
+POOL_THRESHOLD = 8
+
+RosterIssue = namedtuple('RosterIssue', 'line email message')
+
+
+class RosterFormatError(ValueError):
+    """
+    Raised when a roster file cannot be read at all.
+    """
+
+
+class RosterReport:
+    """
+    Running totals of a roster import.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.skipped = []
+        self.errors = []
+
+
+def iter_roster(stream, filename):
+    """
+    Yield ``(line, record)`` pairs from a text stream.
+
+    CSV and JSON Lines (``.jsonl``/``.ndjson``) files are read one line at a
+    time; a plain ``.json`` file must hold a list and is parsed whole.
+    """
+    name = filename.lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except ValueError:
+                yield line, None
+    elif name.endswith('.json'):
+        try:
+            data = json.load(stream)
+        except ValueError as exc:
+            raise RosterFormatError(f'Invalid JSON: {exc}') from exc
+        if not isinstance(data, list):
+            raise RosterFormatError('JSON roster must be a list of student objects.')
+        yield from enumerate(data, start=1)
+    else:
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames or 'email' not in [f.strip().lower() for f in reader.fieldnames]:
+            raise RosterFormatError(
+                f"CSV must have a header row with the columns {', '.join(ROSTER_FIELDS)}."
+            )
+        for record in reader:
+            yield reader.line_num, {
+                (key or '').strip().lower(): value for key, value in record.items()
+            }
+
+
+def _clean_record(line, record):
+    if not isinstance(record, dict):
+        return None, RosterIssue(line, '', 'Row is not a valid object.')
+
+    values = {
+        field: str(record.get(field) or '').strip() for field in ROSTER_FIELDS
+    }
+    values['email'] = values['email'].lower()
+    values['student_number'] = values['student_number'] or None
+
+    missing = [field for field in REQUIRED_FIELDS if not values[field]]
+    if missing:
+        return None, RosterIssue(line, values['email'], f"Missing {', '.join(missing)}.")
+    if '@' not in values['email']:
+        return None, RosterIssue(line, values['email'], 'Invalid email address.')
+    return values, None
+
+
+def _key(value):
+    # MySQL compares these columns case-insensitively, so must we
+    return value.lower() if value else value
+
+
+def _existing_keys(chunk):
+    """
+    Find emails, usernames and student numbers of a chunk that are already
+    taken, using one query. The keys are lowercased.
+    """
+    emails = {values['email'] for _, values in chunk}
+    usernames = {values['username'] for _, values in chunk}
+    numbers = {values['student_number'] for _, values in chunk if values['student_number']}
+
+    conditions = [User.email.in_(emails), User.username.in_(usernames)]
+    if numbers:
+        conditions.append(User.student_number.in_(numbers))
+    rows = db.session.query(
+        User.email, User.username, User.student_number
+    ).filter(or_(*conditions)).all()
+
+    return (
+        {_key(row.email) for row in rows},
+        {_key(row.username) for row in rows},
+        {_key(row.student_number) for row in rows if row.student_number},
+    )
+
+
+def _user_row(values, password_hash):
+    return {
+        'student_number': values['student_number'],
+        'username': values['username'],
+        'full_name': values['full_name'],
+        'email': values['email'],
+        'password_hash': password_hash,
+        'role': 'User',
+    }
+
+
+def _insert_chunk(rows, lines, report):
+    """
+    Insert a chunk in one statement. If another signup took one of its keys
+    in the meantime, insert it row by row instead and skip the rows that
+    collide.
+    """
+    try:
+        db.session.execute(insert(User), rows)
+        db.session.commit()
+        report.created += len(rows)
+        return
+    except IntegrityError:
+        db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for row, line in zip(rows, lines):
+        try:
+            db.session.execute(insert(User), [row])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            report.skipped.append(RosterIssue(line, row['email'], 'Already registered.'))
+        else:
+            report.created += 1
+
+
+def import_roster(records, chunk_size=1000, workers=1, progress=None):
+    """
+    Import ``(line, record)`` pairs and return a ``RosterReport``.
+
+    Duplicates, both inside the file and against existing users, are skipped
+    and reported. Each chunk is committed on its own, so a large intake makes
+    steady progress; ``progress`` is called with the report after every chunk.
+
+    Passwords are hashed in this process unless ``workers`` is above one;
+    the process pool is then only started once a chunk is big enough to
+    need it. Web requests keep the default, the CLI uses every CPU.
+    """
+    report = RosterReport()
+    seen_emails, seen_usernames, seen_numbers = set(), set(), set()
+    records = iter(records)
+
+    executor = None
+    try:
+        while True:
+            batch = list(islice(records, chunk_size))
+            if not batch:
+                break
+            report.processed += len(batch)
+
+            chunk = []
+            for line, record in batch:
+                values, issue = _clean_record(line, record)
+                if issue:
+                    report.errors.append(issue)
+                else:
+                    chunk.append((line, values))
+
+            taken_emails, taken_usernames, taken_numbers = (
+                _existing_keys(chunk) if chunk else (set(), set(), set())
+            )
+
+            accepted = []
+            lines = []
+            for line, values in chunk:
+                email = values['email']
+                username = _key(values['username'])
+                number = _key(values['student_number'])
+                if email in taken_emails or username in taken_usernames or (
+                        number and number in taken_numbers):
+                    report.skipped.append(RosterIssue(line, email, 'Already registered.'))
+                elif email in seen_emails or username in seen_usernames or (
+                        number and number in seen_numbers):
+                    report.skipped.append(RosterIssue(line, email, 'Duplicate row in file.'))
+                else:
+                    seen_emails.add(email)
+                    seen_usernames.add(username)
+                    if number:
+                        seen_numbers.add(number)
+                    accepted.append(values)
+                    lines.append(line)
+
+            if accepted:
+                passwords = [values['password'] for values in accepted]
+                if workers > 1 and len(passwords) >= POOL_THRESHOLD:
+                    if executor is None:
+                        executor = ProcessPoolExecutor(max_workers=workers)
+                    hashes = list(executor.map(
+                        hash_password, passwords,
+                        chunksize=max(1, len(passwords) // (workers * 4))
+                    ))
+                else:
+                    hashes = [hash_password(password) for password in passwords]
+
+                _insert_chunk(
+                    [_user_row(values, password_hash)
+                     for values, password_hash in zip(accepted, hashes)],
+                    lines, report
+                )
+
+            if progress:
+                progress(report)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return report
@@ -1,11 +1,23 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+import hashlib
+import json
+
+from flask import (
+    Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response,
+    current_app
+)
 from flask_login import login_user, login_required, logout_user, current_user
+from werkzeug.http import is_resource_modified
 from .models import (
-    User, Subject, PCAssignment, Equipment, IssueReport, Room,
-    BorrowRequest, BorrowRequestStatus, EquipmentType, Maintenance
+    User, Subject, StudentSubject, PCAssignment, Equipment, IssueReport, Room,
+    EquipmentType, Maintenance, SubjectException,
+    invalidate_user
 )
 from . import db
-from datetime import datetime
+from .dedup import index_issue
+from .recurrence import occurrences
+from .replica import use_read_replica
+from .reservations import ReservationConflict, request_laptop
+from datetime import datetime, timedelta
 from flask import jsonify
 
 # Create a Blueprint for main routes
@@ -61,6 +73,7 @@ def edit_profile():
         current_user.full_name = request.form['full_name']
         current_user.email = request.form['email']
         db.session.commit()
+        invalidate_user(current_user.id)
         flash('Profile updated successfully.', 'success')
         return redirect(url_for('main.dashboard'))
     return render_template('user/edit_profile.html', user=current_user)
@@ -89,7 +102,7 @@ def report_issue():
     
     ]
     if request.method == 'POST':
-        equipment_id = request.form['equipment_id']
+        equipment_id = request.form.get('equipment_id', type=int)
         description = request.form['description'].strip()
         issue_type = request.form['issue_type']
         software = None
@@ -101,6 +114,10 @@ def report_issue():
             else:
                 software = selected_software
 
+        if equipment_id is None:
+            flash('Please select the PC the issue is about.', 'danger')
+            return redirect(url_for('main.report_issue'))
+
         if not description:
             flash('Description cannot be empty.', 'danger')
             return redirect(url_for('main.report_issue'))
@@ -114,8 +131,17 @@ def report_issue():
             status='Pending'
         )
         db.session.add(issue)
+        db.session.flush()
+        match = index_issue(
+            issue,
+            threshold=current_app.config['DEDUP_THRESHOLD'],
+            window=timedelta(days=current_app.config['DEDUP_WINDOW_DAYS'])
+        )
         db.session.commit()
         flash('Issue reported successfully.', 'success')
+        if match:
+            flash(f'A similar issue (#{match.issue_id}) was already reported; '
+                  'they will be handled together.', 'info')
         return redirect(url_for('main.dashboard'))
     return render_template('user/report_issue.html', pcs=pcs, common_software=COMMON_SOFTWARE)
 
@@ -147,7 +173,7 @@ def borrow_laptop(subject_id):
         return redirect(url_for('main.dashboard'))
     
     equipment = pc_assignment.equipment
-    maintenance = next((m for m in equipment.maintenances if m.status in ['Scheduled', 'In Progress'] and m.scheduled_date <= subject.end_time and m.scheduled_date >= subject.start_time), None)
+    maintenance = next((m for m in equipment.maintenances if m.status in ['Scheduled', 'In Progress'] and subject.meets_at(m.scheduled_date)), None)
     if not maintenance:
         flash('Your assigned PC is not under maintenance during this subject.', 'danger')
         return redirect(url_for('main.dashboard'))
@@ -159,14 +185,17 @@ def borrow_laptop(subject_id):
         return redirect(url_for('main.dashboard'))
     
     if request.method == 'POST':
-        laptop_id = request.form['laptop_id']
-        borrow_request = BorrowRequest(
-            user_id=current_user.id,
-            equipment_id=laptop_id,
-            status=BorrowRequestStatus.Pending
-        )
-        db.session.add(borrow_request)
-        db.session.commit()
+        # Empty means any laptop; the admins' allocation run picks one
+        laptop_id = request.form.get('laptop_id', type=int)
+        if laptop_id is None and request.form.get('laptop_id', '').strip():
+            flash('Please choose a laptop from the list.', 'danger')
+            return redirect(url_for('main.borrow_laptop', subject_id=subject.id))
+        # Inserted only if the laptop is still available at this instant
+        try:
+            request_laptop(current_user.id, subject.id, laptop_id)
+        except ReservationConflict as exc:
+            flash(str(exc), 'danger')
+            return redirect(url_for('main.borrow_laptop', subject_id=subject.id))
         flash('Laptop borrow request submitted successfully.', 'success')
         return redirect(url_for('main.dashboard'))
     
@@ -174,21 +203,79 @@ def borrow_laptop(subject_id):
 
 
 @main.route('/get_subjects')
+@use_read_replica
 @login_required
 def get_subjects():
-    # Fetch the current user's subjects
-    subjects = current_user.subjects  # Assuming you have a relationship set up
-    events = []
-    for subject in subjects:
-        events.append({
-            'title': f'{subject.subject_code} - {subject.subject_name}',
-            'start': subject.start_time.isoformat(),
-            'end': subject.end_time.isoformat(),
-            # Optionally, add more fields like 'url' if needed
-        })
-    return jsonify(events)
+    """
+    FullCalendar event feed for the current student.
+
+    Only subjects overlapping the visible ``start``/``end`` window are
+    returned. Responses carry an ETag and Last-Modified derived from the
+    student's schedule version, so unchanged calendars get a 304 before the
+    subjects table is touched. The version is read from the database, not
+    from the cached user, which other workers' changes do not invalidate.
+    """
+    try:
+        window_start = _parse_calendar_param(request.args.get('start'))
+        window_end = _parse_calendar_param(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO 8601 dates.'}), 400
 
+    schedule_version, last_modified = db.session.query(
+        User.schedule_version, User.schedule_updated_at
+    ).filter(User.id == current_user.id).one()
+    etag = hashlib.sha1(
+        f"{current_user.id}:{schedule_version}:"
+        f"{window_start}:{window_end}".encode()
+    ).hexdigest()
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        subjects = db.session.query(
+            Subject.id, Subject.subject_code, Subject.subject_name,
+            Subject.start_time, Subject.end_time,
+            Subject.recurrence_days, Subject.term_start, Subject.term_end
+        ).join(
+            StudentSubject, StudentSubject.subject_id == Subject.id
+        ).filter(
+            StudentSubject.student_id == current_user.id,
+            Subject.overlapping(window_start, window_end)
+        ).all()
+        exceptions = SubjectException.dates_by_subject(
+            subject.id for subject in subjects if subject.recurrence_days
+        )
 
+        # Recurring subjects are expanded only across the visible window
+        meetings = sorted(
+            (start, end, f'{subject.subject_code} - {subject.subject_name}')
+            for subject in subjects
+            for start, end in occurrences(
+                subject, window_start, window_end, exceptions.get(subject.id, ())
+            )
+        )
+        events = [
+            {'title': title, 'start': start.isoformat(), 'end': end.isoformat()}
+            for start, end, title in meetings
+        ]
+        response = Response(
+            json.dumps(events, separators=(',', ':')), mimetype='application/json'
+        )
 
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 
+def _parse_calendar_param(value):
+    """
+    Parse a FullCalendar window bound into a naive datetime. Subject times
+    are stored as local wall-clock times, so any UTC offset is dropped.
+    """
+    if not value:
+        return None
+    # A literal '+' offset arrives as a space when the client does not encode it
+    value = value.strip().replace(' ', '+')
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
@@ -0,0 +1,159 @@
+# app/scheduling.py
+
+"""
+PC booking conflict engine used when assigning PCs for a subject.
+
+All bookings that could clash with a subject are loaded with one query and
+kept in an ``IntervalIndex`` keyed by the span of their schedule; a whole
+seating plan is then validated in memory so every conflict can be reported
+at once before anything is written. Recurring schedules are compared by
+expanding occurrences only where the two spans overlap.
+"""
+
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+
+from . import db
+from .models import Equipment, PCAssignment, Subject, SubjectException, User
+from .recurrence import first_overlap, schedule_span
+
+# Carries the schedule columns so it can be passed to ``recurrence`` directly
+Booking = namedtuple(
+    'Booking',
+    'equipment_id subject_id subject_code student_name '
+    'start_time end_time recurrence_days term_start term_end'
+)
+
+
+class IntervalIndex:
+    """
+    Half-open ``[start, end)`` intervals grouped by key and sorted by start.
+    """
+
+    def __init__(self):
+        self._intervals = defaultdict(list)
+
+    def add(self, key, start, end, payload=None):
+        insort(self._intervals[key], (start, end, id(payload), payload))
+
+    def overlapping(self, key, start, end):
+        """
+        Return the payloads of intervals under ``key`` that overlap
+        ``[start, end)``.
+        """
+        intervals = self._intervals.get(key, ())
+        # Intervals starting at or after ``end`` cannot overlap
+        stop = bisect_left(intervals, (end,))
+        return [
+            payload for interval_start, interval_end, _, payload in intervals[:stop]
+            if interval_end > start
+        ]
+
+
+def load_room_bookings(subject):
+    """
+    Load every PC booking in the subject's room whose schedule may overlap
+    the subject's, excluding the subject's own assignments. Returns the
+    index and the exception dates of the subjects involved.
+    """
+    span_start, span_end = schedule_span(subject)
+    rows = db.session.query(
+        PCAssignment.equipment_id,
+        PCAssignment.subject_id,
+        Subject.subject_code,
+        User.full_name,
+        Subject.start_time,
+        Subject.end_time,
+        Subject.recurrence_days,
+        Subject.term_start,
+        Subject.term_end
+    ).join(
+        Subject, PCAssignment.subject_id == Subject.id
+    ).join(
+        User, PCAssignment.student_id == User.id
+    ).join(
+        Equipment, PCAssignment.equipment_id == Equipment.id
+    ).filter(
+        Equipment.room_id == subject.room_id,
+        PCAssignment.subject_id != subject.id,
+        Subject.overlapping(span_start, span_end)
+    ).all()
+
+    index = IntervalIndex()
+    recurring_ids = {subject.id} if subject.recurrence_days else set()
+    for row in rows:
+        booking = Booking(*row)
+        index.add(booking.equipment_id, *schedule_span(booking), booking)
+        if booking.recurrence_days:
+            recurring_ids.add(booking.subject_id)
+    return index, SubjectException.dates_by_subject(recurring_ids)
+
+
+def find_seating_conflicts(subject, plan, room_pcs, students):
+    """
+    Validate a seating plan for ``subject``.
+
+    ``plan`` maps student ids to equipment ids, ``room_pcs`` are the PCs of
+    the subject's room and ``students`` the enrolled students. Returns a list
+    of human readable conflicts; an empty list means the plan can be applied.
+    """
+    pcs_by_id = {pc.id: pc for pc in room_pcs}
+    names = {student.id: student.full_name for student in students}
+    bookings, exceptions = load_room_bookings(subject)
+    own_exceptions = exceptions.get(subject.id, ())
+    span_start, span_end = schedule_span(subject)
+    conflicts = []
+
+    students_by_pc = defaultdict(list)
+    for student_id, equipment_id in plan.items():
+        students_by_pc[equipment_id].append(student_id)
+
+    for equipment_id, student_ids in sorted(students_by_pc.items()):
+        pc = pcs_by_id.get(equipment_id)
+        if pc is None:
+            for student_id in student_ids:
+                conflicts.append(
+                    f"{names.get(student_id, student_id)}: the selected PC is not in this room."
+                )
+            continue
+
+        if len(student_ids) > 1:
+            student_names = ', '.join(sorted(names.get(s, str(s)) for s in student_ids))
+            conflicts.append(
+                f"PC {pc.equipment_name} is selected for more than one student ({student_names})."
+            )
+
+        for booking in bookings.overlapping(equipment_id, span_start, span_end):
+            clash = first_overlap(
+                subject, booking, own_exceptions, exceptions.get(booking.subject_id, ())
+            )
+            if clash is None:
+                continue
+            conflicts.append(
+                f"PC {pc.equipment_name} is already assigned to {booking.student_name} "
+                f"for {booking.subject_code} "
+                f"(both meet on {clash[0]:%Y-%m-%d %H:%M} - {clash[1]:%H:%M})."
+            )
+    return conflicts
+
+
+def apply_seating_plan(subject, plan):
+    """
+    Replace the subject's PC assignments with ``plan`` in one transaction.
+    """
+    try:
+        PCAssignment.query.filter_by(subject_id=subject.id).delete(
+            synchronize_session=False
+        )
+        db.session.add_all([
+            PCAssignment(
+                subject_id=subject.id,
+                student_id=student_id,
+                equipment_id=equipment_id
+            )
+            for student_id, equipment_id in plan.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
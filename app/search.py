@@ -0,0 +1,392 @@
+# app/search.py
+
+"""
+Full-text search over issue reports.
+
+Each report has a row in ``issue_search`` holding the text worth searching:
+the description, software, equipment name, room name and reporter name. On
+MySQL this is an InnoDB table with a FULLTEXT index; on SQLite it is an FTS5
+virtual table keyed by the report id. The index is kept in step by session
+events, in the same transaction as the change, and rebuilt with ``flask
+search reindex``.
+
+Equipment names are also indexed with punctuation removed, so a search for
+"PC-12" matches that PC even where the full-text parser would split the
+name into words too short to index.
+
+Results are ranked by relevance and paged with a keyset cursor on
+(score, id), so later pages cost no more than the first.
+"""
+
+import base64
+import json
+import re
+import weakref
+from collections import namedtuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import column, event, func, inspect, literal_column, select, table, text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session, joinedload
+
+from . import db
+from .models import Equipment, IssueReport, Room, User
+
+TABLE = 'issue_search'
+TEXT_COLUMNS = ('description', 'software', 'equipment_name', 'room_name', 'reporter_name')
+
+# Words too common to be worth requiring in a match
+STOPWORDS = frozenset(
+    'a about an and are as at be by for from how i in is it not of on or '
+    'that the this to was what when where who will with'.split()
+)
+
+WORD = re.compile(r'\w+', re.UNICODE)
+# Names like PC-12 or LAB_3.PC4, which are also indexed without punctuation
+COMPOUND = re.compile(r'\w+(?:[-_.]\w+)+', re.UNICODE)
+
+
+class SearchUnavailable(RuntimeError):
+    """
+    Raised when the database has no search index (or cannot have one).
+    """
+
+
+def _compact(expression, dialect):
+    # The lower-cased name without punctuation or spaces
+    if dialect == 'mysql':
+        return func.lower(func.regexp_replace(expression, '[^[:alnum:]]', ''))
+    for character in ('-', '_', '.', ' '):
+        expression = func.replace(expression, character, '')
+    return func.lower(expression)
+
+
+class MySQLBackend:
+    """
+    InnoDB table with a FULLTEXT index, queried in boolean mode.
+    """
+    key = 'issue_id'
+    # innodb_ft_min_token_size: shorter words are not indexed
+    min_word_length = 3
+
+    ddl = (
+        f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+        ' issue_id INTEGER NOT NULL PRIMARY KEY,'
+        ' description TEXT, software VARCHAR(100), equipment_name VARCHAR(255),'
+        ' room_name VARCHAR(255), reporter_name VARCHAR(255),'
+        f' FULLTEXT KEY ft_{TABLE} ({", ".join(TEXT_COLUMNS)})'
+        ') ENGINE=InnoDB DEFAULT CHARSET=utf8mb4',
+    )
+
+    def match_query(self, words, compounds):
+        terms = [
+            f'+{word}' if len(word) >= self.min_word_length else word
+            for word in words
+        ]
+        if terms and terms[-1].startswith('+'):
+            terms[-1] += '*'
+        return ' '.join(terms + [f'+{compound}' for compound in compounds])
+
+    def ranked(self, index, query):
+        score = mysql.match(
+            *(index.c[name] for name in TEXT_COLUMNS), against=query
+        ).in_boolean_mode()
+        return select(index.c.issue_id.label('issue_id'), score.label('score')).where(score > 0)
+
+
+class SQLiteBackend:
+    """
+    FTS5 virtual table whose rowid is the issue report id, ranked by bm25.
+    """
+    key = 'rowid'
+    min_word_length = 1
+
+    ddl = (
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+        f'{", ".join(TEXT_COLUMNS)}, tokenize = "unicode61")',
+    )
+
+    def match_query(self, words, compounds):
+        terms = [f'"{word}"' for word in words]
+        if terms:
+            terms[-1] += '*'
+        return ' AND '.join(terms + [f'"{compound}"' for compound in compounds])
+
+    def ranked(self, index, query):
+        # bm25() is lower for better matches; negate it so higher is better
+        return select(
+            literal_column('rowid').label('issue_id'),
+            (-func.bm25(literal_column(TABLE))).label('score')
+        ).select_from(index).where(literal_column(TABLE).op('MATCH')(query))
+
+
+BACKENDS = {'mysql': MySQLBackend(), 'sqlite': SQLiteBackend()}
+
+# Engines known to have the index, so the flush hooks check only once
+_ready = weakref.WeakKeyDictionary()
+
+
+def _index_table(backend):
+    return table(TABLE, column(backend.key), *(column(name) for name in TEXT_COLUMNS))
+
+
+def _backend(connection, required=False):
+    backend = BACKENDS.get(connection.dialect.name)
+    if backend is None:
+        if required:
+            raise SearchUnavailable(
+                f'Full-text search is not supported on {connection.dialect.name}.'
+            )
+        return None
+    engine = connection.engine
+    if not _ready.get(engine):
+        _ready[engine] = inspect(connection).has_table(TABLE)
+    if not _ready[engine]:
+        if required:
+            raise SearchUnavailable("No search index; run 'flask search reindex'.")
+        return None
+    return backend
+
+
+def create_index(connection):
+    """
+    Create the search index for this database if it is missing.
+    """
+    backend = BACKENDS.get(connection.dialect.name)
+    if backend is None:
+        raise SearchUnavailable(f'Full-text search is not supported on {connection.dialect.name}.')
+    for statement in backend.ddl:
+        connection.execute(text(statement))
+    _ready[connection.engine] = True
+    return backend
+
+
+def _document_select(dialect, *conditions):
+    """
+    The index rows for the issue reports matching ``conditions``.
+    """
+    equipment_name = func.coalesce(Equipment.equipment_name, '')
+    return select(
+        IssueReport.id,
+        IssueReport.description,
+        func.coalesce(IssueReport.software, ''),
+        equipment_name + ' ' + _compact(equipment_name, dialect),
+        func.coalesce(Room.room_name, ''),
+        func.coalesce(User.full_name, ''),
+    ).select_from(IssueReport).join(
+        Equipment, IssueReport.equipment_id == Equipment.id
+    ).outerjoin(
+        Room, Equipment.room_id == Room.id
+    ).join(
+        User, IssueReport.user_id == User.id
+    ).where(*conditions)
+
+
+def reindex_where(connection, *conditions, backend=None):
+    """
+    Rewrite the index rows of the issue reports matching ``conditions``.
+    """
+    backend = backend or _backend(connection)
+    if backend is None:
+        return
+    index = _index_table(backend)
+    key = index.c[backend.key]
+    issue_ids = select(IssueReport.id).select_from(IssueReport).join(
+        Equipment, IssueReport.equipment_id == Equipment.id
+    ).where(*conditions)
+    connection.execute(index.delete().where(key.in_(issue_ids)))
+    connection.execute(index.insert().from_select(
+        [backend.key, *TEXT_COLUMNS], _document_select(connection.dialect.name, *conditions)
+    ))
+
+
+def reindex_all(batch_size=5000, progress=None):
+    """
+    Rebuild the whole index in batches of ``batch_size`` reports, one
+    transaction each. Returns the number of reports indexed.
+    """
+    connection = db.session.connection()
+    backend = create_index(connection)
+    connection.execute(_index_table(backend).delete())
+    db.session.commit()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        connection = db.session.connection()
+        ids = connection.execute(
+            select(IssueReport.id).where(IssueReport.id > last_id)
+            .order_by(IssueReport.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        reindex_where(connection, IssueReport.id.between(ids[0], ids[-1]), backend=backend)
+        db.session.commit()
+        indexed += len(ids)
+        last_id = ids[-1]
+        if progress:
+            progress(indexed)
+    if connection.dialect.name == 'sqlite':
+        db.session.execute(text(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')"))
+        db.session.commit()
+    return indexed
+
+
+def _changed(obj, *keys):
+    attrs = inspect(obj).attrs
+    return any(attrs[key].history.has_changes() for key in keys)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_index(session, flush_context):
+    issue_ids = set()
+    deleted_ids = set()
+    by_equipment = set()
+    by_room = set()
+    by_user = set()
+    for obj in session.new:
+        if isinstance(obj, IssueReport):
+            issue_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, IssueReport):
+            if _changed(obj, 'description', 'software', 'equipment_id', 'user_id'):
+                issue_ids.add(obj.id)
+        elif isinstance(obj, Equipment):
+            if _changed(obj, 'equipment_name', 'room_id'):
+                by_equipment.add(obj.id)
+        elif isinstance(obj, Room):
+            if _changed(obj, 'room_name'):
+                by_room.add(obj.id)
+        elif isinstance(obj, User):
+            if _changed(obj, 'full_name'):
+                by_user.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, IssueReport):
+            deleted_ids.add(obj.id)
+    if not (issue_ids or deleted_ids or by_equipment or by_room or by_user):
+        return
+
+    connection = session.connection()
+    backend = _backend(connection)
+    if backend is None:
+        return
+    if deleted_ids:
+        index = _index_table(backend)
+        connection.execute(index.delete().where(index.c[backend.key].in_(deleted_ids)))
+    for condition, ids in ((IssueReport.id, issue_ids), (IssueReport.equipment_id, by_equipment),
+                           (Equipment.room_id, by_room), (IssueReport.user_id, by_user)):
+        if ids:
+            reindex_where(connection, condition.in_(ids), backend=backend)
+
+
+SearchResult = namedtuple('SearchResult', 'issue score snippet')
+SearchPage = namedtuple('SearchPage', 'results next_cursor')
+
+
+def parse_query(query):
+    """
+    Split a search into the words to match and the punctuation-free forms
+    of any compound names in it.
+    """
+    words = [
+        word.lower() for word in WORD.findall(query)
+        if word.lower() not in STOPWORDS
+    ]
+    compounds = [
+        re.sub(r'[\W_]+', '', compound).lower() for compound in COMPOUND.findall(query)
+    ]
+    return words, compounds
+
+
+def encode_cursor(score, issue_id):
+    raw = json.dumps([score, issue_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, issue_id = json.loads(raw)
+        return float(score), int(issue_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor.') from None
+
+
+def highlight(value, words, width=160):
+    """
+    An HTML-escaped excerpt of ``value`` around the first match, with every
+    searched word (or word prefix) wrapped in ``<mark>``.
+    """
+    value = value or ''
+    if not words:
+        return escape(value[:width])
+    pattern = re.compile(r'\b(' + '|'.join(map(re.escape, words)) + r')\w*', re.IGNORECASE)
+    first = pattern.search(value)
+    start = max(0, first.start() - width // 4) if first else 0
+    excerpt = value[start:start + width]
+    pieces = ['…' if start else '']
+    position = 0
+    for match in pattern.finditer(excerpt):
+        pieces.append(escape(excerpt[position:match.start()]))
+        pieces.append(Markup('<mark>%s</mark>') % match.group(0))
+        position = match.end()
+    pieces.append(escape(excerpt[position:]))
+    if start + width < len(value):
+        pieces.append('…')
+    return Markup('').join(pieces)
+
+
+def match_condition(query):
+    """
+    A condition on ``IssueReport.id`` selecting the reports that match
+    ``query`` in the index, or ``None`` if the database has no index.
+    """
+    words, compounds = parse_query(query)
+    if not words and not compounds:
+        return None
+    backend = _backend(db.session.connection())
+    if backend is None:
+        return None
+    ranked = backend.ranked(_index_table(backend), backend.match_query(words, compounds))
+    return IssueReport.id.in_(select(ranked.subquery('ranked').c.issue_id))
+
+
+def search_issues(query, limit=20, cursor=None):
+    """
+    Issue reports matching ``query``, best first, ``limit`` at a time.
+    Pass the returned ``next_cursor`` back to get the following page.
+    """
+    words, compounds = parse_query(query)
+    if not words and not compounds:
+        return SearchPage([], None)
+    connection = db.session.connection()
+    backend = _backend(connection, required=True)
+    match = backend.match_query(words, compounds)
+
+    ranked = backend.ranked(_index_table(backend), match).subquery('ranked')
+    statement = select(ranked.c.issue_id, ranked.c.score)
+    if cursor:
+        after_score, after_id = decode_cursor(cursor)
+        statement = statement.where(
+            (ranked.c.score < after_score)
+            | ((ranked.c.score == after_score) & (ranked.c.issue_id < after_id))
+        )
+    rows = db.session.execute(
+        statement.order_by(ranked.c.score.desc(), ranked.c.issue_id.desc()).limit(limit + 1)
+    ).all()
+
+    page = rows[:limit]
+    issues = {
+        issue.id: issue for issue in IssueReport.query.options(
+            joinedload(IssueReport.user),
+            joinedload(IssueReport.equipment).joinedload(Equipment.room)
+        ).filter(IssueReport.id.in_([row.issue_id for row in page]))
+    } if page else {}
+    terms = words + compounds
+    results = [
+        SearchResult(issues[row.issue_id], float(row.score),
+                     highlight(issues[row.issue_id].description, terms))
+        for row in page if row.issue_id in issues
+    ]
+    next_cursor = encode_cursor(float(page[-1].score), page[-1].issue_id) if len(rows) > limit else None
+    return SearchPage(results, next_cursor)
@@ -0,0 +1,172 @@
+# benchmarks/approval_contention.py
+
+"""
+Hammer laptop approvals from many threads and check for double loans.
+
+Seeds a scratch database with ``--laptops`` laptops and ``--requests-per-laptop``
+pending requests for each, then lets ``--threads`` workers approve requests
+in random order. With ``--mode atomic`` (the default) approvals go through
+``app.reservations.change_status``; ``--mode naive`` replays the old
+read-then-write approval for comparison.
+
+    python benchmarks/approval_contention.py --threads 16 --laptops 20
+    python benchmarks/approval_contention.py --database-url mysql+pymysql://root:@localhost/bench
+
+The database is dropped and recreated, so never point it at real data.
+Prints a JSON summary and exits non-zero if any laptop was loaned twice.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TestingConfig  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import (  # noqa: E402
+    BorrowRequest, BorrowRequestStatus, Equipment, EquipmentType, User
+)
+from app.reservations import ReservationConflict, change_status  # noqa: E402
+
+
+def naive_approve(request_id, admin_id):
+    """
+    The approval path this benchmark guards against: check, then write.
+    """
+    borrow_request = db.session.get(BorrowRequest, request_id)
+    if not borrow_request.equipment.is_available:
+        raise ReservationConflict('The laptop is already on loan.')
+    borrow_request.status = BorrowRequestStatus.Approved
+    borrow_request.admin_id = admin_id
+    borrow_request.equipment.is_available = False
+    db.session.commit()
+
+
+def seed(laptops, requests_per_laptop):
+    db.drop_all()
+    db.create_all()
+    admin = User(username='bench-admin', full_name='Bench Admin',
+                 email='bench-admin@example.com', role='Admin', password_hash='-')
+    students = [
+        User(username=f'bench-{i}', full_name=f'Student {i}',
+             email=f'bench-{i}@example.com', password_hash='-')
+        for i in range(requests_per_laptop)
+    ]
+    machines = [
+        Equipment(equipment_name=f'Laptop {i:03d}', equipment_type=EquipmentType.Laptop)
+        for i in range(laptops)
+    ]
+    db.session.add_all([admin, *students, *machines])
+    db.session.flush()
+    db.session.add_all([
+        BorrowRequest(user_id=student.id, equipment_id=machine.id)
+        for machine in machines for student in students
+    ])
+    db.session.commit()
+    return admin.id, [request_id for request_id, in db.session.query(BorrowRequest.id)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=None,
+                        help='scratch database (default: a temporary SQLite file)')
+    parser.add_argument('--mode', choices=('atomic', 'naive'), default='atomic')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--laptops', type=int, default=20)
+    parser.add_argument('--requests-per-laptop', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    scratch = None
+    if args.database_url is None:
+        scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        scratch.close()
+        args.database_url = f'sqlite:///{scratch.name}'
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+        SQLALCHEMY_ENGINE_OPTIONS = (
+            {'connect_args': {'timeout': 30}} if args.database_url.startswith('sqlite')
+            else {'pool_size': args.threads, 'max_overflow': 0}
+        )
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        admin_id, request_ids = seed(args.laptops, args.requests_per_laptop)
+
+    random.Random(args.seed).shuffle(request_ids)
+    approve = change_status if args.mode == 'atomic' else naive_approve
+    queue = iter(request_ids)
+    lock = threading.Lock()
+    counts = {'approved': 0, 'conflicts': 0, 'errors': 0}
+    start_barrier = threading.Barrier(args.threads)
+
+    def worker():
+        outcome = {'approved': 0, 'conflicts': 0, 'errors': 0}
+        with app.app_context():
+            start_barrier.wait()
+            while True:
+                with lock:
+                    request_id = next(queue, None)
+                if request_id is None:
+                    break
+                try:
+                    if approve is change_status:
+                        approve(request_id, BorrowRequestStatus.Approved, admin_id)
+                    else:
+                        approve(request_id, admin_id)
+                    outcome['approved'] += 1
+                except ReservationConflict:
+                    outcome['conflicts'] += 1
+                except Exception:
+                    db.session.rollback()
+                    outcome['errors'] += 1
+        with lock:
+            for key, value in outcome.items():
+                counts[key] += value
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        loans = db.session.query(
+            BorrowRequest.equipment_id, db.func.count()
+        ).filter(
+            BorrowRequest.status == BorrowRequestStatus.Approved
+        ).group_by(BorrowRequest.equipment_id).all()
+        double_loans = sum(1 for _, count in loans if count > 1)
+        db.session.remove()
+        db.engine.dispose()
+
+    summary = {
+        'mode': args.mode,
+        'database': args.database_url.split('://')[0],
+        'threads': args.threads,
+        'attempts': len(request_ids),
+        **counts,
+        'laptops_loaned': len(loans),
+        'double_loans': double_loans,
+        'seconds': round(elapsed, 3),
+        'attempts_per_second': round(len(request_ids) / elapsed, 1) if elapsed else None,
+    }
+    print(json.dumps(summary, indent=2))
+
+    if scratch is not None:
+        os.unlink(scratch.name)
+    if double_loans:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+# benchmarks/datagen.py
+
+"""
+Generate a deterministic synthetic dataset for load testing.
+
+Fills a scratch database with rooms of PCs, a laptop pool, students,
+recurring subjects, enrollments, seating plans and ``--years`` of issue,
+maintenance and borrow history ending at ``--today``. The same options
+(including ``--seed`` and ``--today``) always produce the same rows.
+``--size`` picks a preset; the other knobs override it.
+
+    python benchmarks/datagen.py --size medium --database-url sqlite:////tmp/bench.db
+    python benchmarks/datagen.py --students 20000 --years 5 \\
+        --database-url mysql+pymysql://root:@localhost/bench
+
+Rows are written with bulk inserts, then the dashboard counters and the
+search index are rebuilt (``--dedup`` also rebuilds the duplicate clusters,
+which takes a while on big histories). Every generated account's password
+is ``bench``; the admin is ``admin@bench.example``.
+
+The database is dropped and recreated, so never point it at real data.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, time as clock, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+from config import TestingConfig  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.counters import reconcile  # noqa: E402
+from app.dedup import rebuild as rebuild_clusters  # noqa: E402
+from app.models import (  # noqa: E402
+    BorrowRequest, BorrowRequestStatus, Equipment, EquipmentType, IssueReport, IssueType,
+    Maintenance, PCAssignment, Room, StudentSubject, Subject, User
+)
+from app.search import SearchUnavailable, reindex_all  # noqa: E402
+
+PASSWORD = 'bench'
+ADMIN_EMAIL = 'admin@bench.example'
+
+SIZES = {
+    'small': dict(rooms=4, pcs_per_room=30, laptops=20, students=500, subjects=24,
+                  enrollments=4, years=1, issues_per_year=800, maintenances_per_year=150,
+                  borrows_per_year=1000),
+    'medium': dict(rooms=12, pcs_per_room=35, laptops=60, students=4000, subjects=120,
+                   enrollments=5, years=3, issues_per_year=6000, maintenances_per_year=900,
+                   borrows_per_year=8000),
+    'large': dict(rooms=30, pcs_per_room=40, laptops=200, students=20000, subjects=400,
+                  enrollments=6, years=5, issues_per_year=30000, maintenances_per_year=4000,
+                  borrows_per_year=40000),
+}
+
+# Weekly patterns and class periods a room is booked in, one subject per slot
+DAY_PATTERNS = ('MO,WE', 'TU,TH', 'MO,WE,FR', 'FR', 'SA')
+PERIODS = ((clock(7, 30), clock(9, 0)), (clock(9, 0), clock(10, 30)),
+           (clock(10, 30), clock(12, 0)), (clock(13, 0), clock(14, 30)),
+           (clock(14, 30), clock(16, 0)), (clock(16, 0), clock(17, 30)))
+
+COURSES = ('Programming', 'Data Structures', 'Networking', 'Databases', 'Web Development',
+           'Operating Systems', 'Computer Graphics', 'Information Security',
+           'Systems Analysis', 'Mobile Development')
+SOFTWARE = ('Microsoft Access', 'Cisco Packet Tracer', 'Microsoft Excel',
+            'Microsoft Visual Studio Code', 'PyCharm', 'IntelliJ IDEA', 'Eclipse IDE',
+            'NetBeans IDE', 'MATLAB', 'Adobe Photoshop')
+HARDWARE_PROBLEMS = ('monitor flickers and goes black', 'keyboard has several dead keys',
+                     'mouse does not respond', 'PC does not power on',
+                     'fan is very loud and the PC overheats', 'no network connection',
+                     'USB ports do not detect flash drives', 'PC restarts on its own')
+SOFTWARE_PROBLEMS = ('crashes on startup', 'license expired', 'is not installed',
+                     'freezes when opening a project', 'shows a missing DLL error',
+                     'cannot save files to the desktop')
+DETAILS = ('since this morning', 'during our laboratory class', 'after the last update',
+           'every time we log in', 'the whole period', 'again, it was reported last week')
+MAINTENANCE_TASKS = ('Replace faulty monitor', 'Reimage operating system', 'Replace keyboard',
+                     'Clean dust and replace thermal paste', 'Replace power supply',
+                     'Update installed software', 'Check network cable and port')
+
+
+def _between(rng, start, end):
+    return start + timedelta(seconds=rng.randrange(max(1, int((end - start).total_seconds()))))
+
+
+def _chunks(rows, size):
+    for offset in range(0, len(rows), size):
+        yield rows[offset:offset + size]
+
+
+def _insert(model, rows, chunk_size, progress):
+    # ORM bulk inserts, so the session hooks for equipment still run
+    for chunk in _chunks(rows, chunk_size):
+        db.session.execute(insert(model), chunk)
+        db.session.commit()
+    if progress:
+        progress(f'{len(rows)} {model.__tablename__}')
+
+
+def issue_description(rng, issue_type, software):
+    if issue_type is IssueType.Hardware:
+        problem = f'The {rng.choice(HARDWARE_PROBLEMS)}'
+    else:
+        problem = f'{software} {rng.choice(SOFTWARE_PROBLEMS)}'
+    return f'{problem} {rng.choice(DETAILS)}.'
+
+
+def generate(rooms=4, pcs_per_room=30, laptops=20, students=500, subjects=24, enrollments=4,
+             years=1, issues_per_year=800, maintenances_per_year=150, borrows_per_year=1000,
+             seed=1, today=None, chunk_size=5000, progress=None):
+    """
+    Insert the dataset into the app's empty database and return the number
+    of rows written per table.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    now = datetime.combine(today, clock(12, 0))
+    history_start = now - timedelta(days=365 * years)
+
+    # Cheap hashing keeps logins fast; the fixed salt keeps the rows identical
+    salt = f'{seed:016x}'[-16:]
+    digest = hashlib.pbkdf2_hmac('sha256', PASSWORD.encode(), salt.encode(), 1000).hex()
+    password_hash = f'pbkdf2:sha256:1000${salt}${digest}'
+    users = [dict(id=1, username='admin', full_name='Bench Administrator',
+                  email=ADMIN_EMAIL, role='Admin', password_hash=password_hash,
+                  schedule_updated_at=history_start)]
+    users += [
+        dict(id=i + 2, student_number=f'{2000 + i % 6}-{i:06d}', username=f'student{i:06d}',
+             full_name=f'Student {i:06d}', email=f'student{i:06d}@bench.example',
+             role='User', password_hash=password_hash, schedule_updated_at=history_start)
+        for i in range(students)
+    ]
+    student_ids = [user['id'] for user in users[1:]]
+
+    equipment = []
+    pcs_by_room = {}
+    for room_id in range(1, rooms + 1):
+        for number in range(1, pcs_per_room + 1):
+            equipment.append(dict(id=len(equipment) + 1, room_id=room_id,
+                                  equipment_name=f'PC-{number}', equipment_type=EquipmentType.PC,
+                                  status='Operational', is_available=True))
+            pcs_by_room.setdefault(room_id, []).append(len(equipment))
+    laptop_ids = []
+    for number in range(1, laptops + 1):
+        equipment.append(dict(id=len(equipment) + 1, room_id=None,
+                              equipment_name=f'Laptop-{number:03d}',
+                              equipment_type=EquipmentType.Laptop,
+                              status='Operational', is_available=True))
+        laptop_ids.append(len(equipment))
+    pc_ids = [pc_id for room_pcs in pcs_by_room.values() for pc_id in room_pcs]
+
+    # Current term, running through today
+    term_start = today - timedelta(days=60)
+    term_end = today + timedelta(days=60)
+    slots = [(days, period) for days in DAY_PATTERNS for period in PERIODS]
+    subject_rows = []
+    for i in range(subjects):
+        room_id = i % rooms + 1
+        days, (starts, ends) = slots[(i // rooms) % len(slots)]
+        subject_rows.append(dict(
+            id=i + 1, subject_code=f'CS{101 + i}', room_id=room_id,
+            subject_name=f'{COURSES[i % len(COURSES)]} {i // len(COURSES) + 1}',
+            start_time=datetime.combine(term_start, starts),
+            end_time=datetime.combine(term_start, ends),
+            recurrence_days=days, term_start=term_start, term_end=term_end,
+        ))
+
+    enrolled = {}
+    enrollment_rows = []
+    for student_id in student_ids:
+        for subject_id in rng.sample(range(1, subjects + 1), min(enrollments, subjects)):
+            enrolled.setdefault(subject_id, []).append(student_id)
+            enrollment_rows.append(dict(id=len(enrollment_rows) + 1,
+                                        student_id=student_id, subject_id=subject_id))
+
+    assignment_rows = []
+    for subject in subject_rows:
+        seats = pcs_by_room[subject['room_id']]
+        for student_id, pc_id in zip(enrolled.get(subject['id'], ()), seats):
+            assignment_rows.append(dict(id=len(assignment_rows) + 1, subject_id=subject['id'],
+                                        student_id=student_id, equipment_id=pc_id))
+
+    issue_rows = []
+    for _ in range(issues_per_year * years):
+        created_at = _between(rng, history_start, now)
+        issue_type = rng.choice((IssueType.Hardware, IssueType.Hardware, IssueType.Software,
+                                 IssueType.Both))
+        software = rng.choice(SOFTWARE) if issue_type is not IssueType.Hardware else None
+        age = now - created_at
+        if age > timedelta(days=30) or rng.random() < 0.4:
+            status = 'Resolved'
+        else:
+            status = rng.choice(('Pending', 'Pending', 'In Progress'))
+        resolved_at = None
+        if status == 'Resolved':
+            resolved_at = min(now, created_at + timedelta(hours=rng.randrange(2, 240)))
+        issue_rows.append(dict(
+            equipment_id=rng.choice(pc_ids), user_id=rng.choice(student_ids),
+            description=issue_description(rng, issue_type, software), issue_type=issue_type,
+            software=software, status=status, created_at=created_at,
+            updated_at=resolved_at, resolved_at=resolved_at,
+        ))
+    # Ids follow filing order, as they would in production
+    issue_rows.sort(key=lambda row: row['created_at'])
+    for number, row in enumerate(issue_rows, 1):
+        row['id'] = number
+
+    maintenance_rows = []
+    under_maintenance = set()
+    for i in range(maintenances_per_year * years):
+        scheduled = _between(rng, history_start, now + timedelta(days=30))
+        equipment_id = rng.choice(pc_ids)
+        if scheduled > now:
+            status, completed = 'Scheduled', None
+        elif now - scheduled < timedelta(days=3) and equipment_id not in under_maintenance:
+            status, completed = 'In Progress', None
+            under_maintenance.add(equipment_id)
+        else:
+            status, completed = 'Completed', scheduled + timedelta(hours=rng.randrange(1, 72))
+        maintenance_rows.append(dict(
+            id=i + 1, equipment_id=equipment_id, reported_by=1,
+            description=rng.choice(MAINTENANCE_TASKS), status=status,
+            scheduled_date=scheduled, completed_date=completed,
+            created_at=min(scheduled, now) - timedelta(days=rng.randrange(0, 7)),
+        ))
+    for row in equipment:
+        if row['id'] in under_maintenance:
+            row['status'] = 'Under Maintenance'
+
+    # Laptops are loaned at most once at a time, so only the newest
+    # requests can still be approved and unreturned
+    borrow_rows = []
+    on_loan = set()
+    for i in range(borrows_per_year * years):
+        requested = _between(rng, history_start, now)
+        laptop_id = rng.choice(laptop_ids) if laptop_ids else None
+        recent = now - requested < timedelta(days=2)
+        if recent and rng.random() < 0.5:
+            status = BorrowRequestStatus.Pending
+        elif recent and laptop_id is not None and laptop_id not in on_loan:
+            status = BorrowRequestStatus.Approved
+            on_loan.add(laptop_id)
+        else:
+            status = rng.choice((BorrowRequestStatus.Returned, BorrowRequestStatus.Returned,
+                                 BorrowRequestStatus.Returned, BorrowRequestStatus.Denied))
+        borrow_rows.append(dict(
+            id=i + 1, user_id=rng.choice(student_ids), equipment_id=laptop_id,
+            subject_id=rng.randrange(1, subjects + 1) if subjects else None,
+            request_date=requested, status=status,
+            admin_id=None if status is BorrowRequestStatus.Pending else 1,
+        ))
+    for row in equipment:
+        if row['id'] in on_loan:
+            row['is_available'] = False
+
+    tables = (
+        (User, users),
+        (Room, [dict(id=i + 1, room_name=f'Lab {i + 1:02d}') for i in range(rooms)]),
+        (Equipment, equipment),
+        (Subject, subject_rows),
+        (StudentSubject, enrollment_rows),
+        (PCAssignment, assignment_rows),
+        (IssueReport, issue_rows),
+        (Maintenance, maintenance_rows),
+        (BorrowRequest, borrow_rows),
+    )
+    counts = {}
+    for model, rows in tables:
+        _insert(model, rows, chunk_size, progress)
+        counts[model.__tablename__] = len(rows)
+    return counts
+
+
+def finish(dedup=False, progress=None):
+    """
+    Rebuild what bulk inserts bypass: the dashboard counters, the search
+    index and, with ``dedup``, the duplicate clusters.
+    """
+    reconcile()
+    try:
+        reindex_all()
+    except SearchUnavailable as exc:
+        if progress:
+            progress(f'{exc} Search index skipped.')
+    if dedup:
+        rebuild_clusters()
+
+
+def add_arguments(parser):
+    """
+    The dataset options, shared with ``load.py``.
+    """
+    parser.add_argument('--size', choices=SIZES, default='small',
+                        help='preset the knobs below default to')
+    for knob in SIZES['small']:
+        parser.add_argument(f"--{knob.replace('_', '-')}", dest=knob, type=int, default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--today', type=date.fromisoformat, default=None,
+                        help='last day of history (YYYY-MM-DD, default: today)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='also rebuild the duplicate issue clusters')
+
+
+def knobs(args):
+    values = dict(SIZES[args.size])
+    values.update({knob: getattr(args, knob) for knob in values
+                   if getattr(args, knob) is not None})
+    return values
+
+
+def create_dataset(args, progress=None):
+    """
+    Recreate the schema and fill it from parsed ``args``. Returns the
+    dataset description: knobs, seed, last day and row counts.
+    """
+    values = knobs(args)
+    today = args.today or date.today()
+    db.drop_all()
+    db.create_all()
+    counts = generate(**values, seed=args.seed, today=today, progress=progress)
+    finish(args.dedup, progress)
+    return {**values, 'seed': args.seed, 'today': today.isoformat(), 'rows': counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', required=True, help='scratch database to fill')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    class DatagenConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+
+    app = create_app(DatagenConfig)
+    started = time.perf_counter()
+    with app.app_context():
+        dataset = create_dataset(
+            args, progress=lambda message: print(message, file=sys.stderr)
+        )
+    dataset['seconds'] = round(time.perf_counter() - started, 1)
+    print(json.dumps(dataset, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,446 @@
+# benchmarks/load.py
+
+"""
+Load-test the hot endpoints against a generated dataset.
+
+Generates a dataset with ``datagen.py`` (same size options; ``--reuse``
+keeps an existing one), then sends ``--requests`` requests to each endpoint
+from ``--concurrency`` threads, each logged in as the admin and a few
+students. Requests go through the Flask test client, or with ``--server``
+over HTTP to a local threaded WSGI server. The app runs with
+``INSTRUMENTATION`` on, and each request's statement count is read from its
+``Server-Timing`` header.
+
+    python benchmarks/load.py --size medium --requests 500 --concurrency 4 -o before.json
+    python benchmarks/load.py --reuse --database-url sqlite:////tmp/bench.db \\
+        --server --compare before.json --max-regression 20
+
+Endpoints are run one after another, so each figure covers that endpoint
+alone. Results (throughput, p50/p95/p99 latency, queries per request) are
+printed and, with ``--output``, written as JSON; ``--compare`` prints the
+change from an earlier result file and ``--max-regression`` fails the run
+if any endpoint's p95 grew by more than that many percent.
+
+The database is dropped and recreated unless ``--reuse`` is given, so
+never point it at real data.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.client import HTTPConnection
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import Equipment, EquipmentType, PCAssignment, StudentSubject, User  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class TestClientSession:
+    """
+    One logged-in user on the Flask test client.
+    """
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self._client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+
+class HTTPSession:
+    """
+    One logged-in user talking HTTP to a local server, keeping its cookies.
+    """
+
+    def __init__(self, host, port):
+        self._connection = HTTPConnection(host, port, timeout=60)
+        self._cookies = SimpleCookie()
+
+    def request(self, method, path, data=None):
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self._cookies:
+            headers['Cookie'] = '; '.join(
+                f'{name}={morsel.value}' for name, morsel in self._cookies.items()
+            )
+        self._connection.request(method, path, body=body, headers=headers)
+        response = self._connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self._cookies.load(header)
+        return response.status, response.headers.get('Server-Timing', '')
+
+
+def login(session, email):
+    status, _ = session.request('POST', '/login',
+                                {'email': email, 'password': datagen.PASSWORD})
+    if status != 302:
+        raise RuntimeError(f'Could not log in as {email} (HTTP {status}).')
+    return session
+
+
+class Fixtures:
+    """
+    Ids the scenarios pick from, read once from the generated data.
+    """
+
+    def __init__(self, today):
+        self.today = today
+        self.students = {
+            user_id: email for user_id, email in db.session.query(User.id, User.email)
+            .filter(User.role != 'Admin').order_by(User.id)
+        }
+        self.admin_email = db.session.query(User.email).filter(
+            User.role == 'Admin'
+        ).order_by(User.id).limit(1).scalar()
+        self.pcs = [
+            pc_id for pc_id, in db.session.query(Equipment.id)
+            .filter(Equipment.equipment_type == EquipmentType.PC).order_by(Equipment.id)
+        ]
+        self.seating = {}
+        for subject_id, student_id, equipment_id in db.session.query(
+            PCAssignment.subject_id, PCAssignment.student_id, PCAssignment.equipment_id
+        ).order_by(PCAssignment.id):
+            self.seating.setdefault(subject_id, {})[student_id] = equipment_id
+        enrolled = {
+            student_id for student_id, in db.session.query(StudentSubject.student_id).distinct()
+        }
+        # Students with a timetable, so the calendar feed has work to do
+        self.enrolled = sorted(enrolled)
+
+
+def _week(today):
+    monday = today - timedelta(days=today.weekday())
+    return {'start': monday.isoformat(), 'end': (monday + timedelta(days=7)).isoformat()}
+
+
+# Scenarios by endpoint: (user, method, path, form data) for a random request
+def _admin_dashboard(rng, fixtures):
+    return 'admin', 'GET', '/admin/dashboard', None
+
+
+def _assign_pcs(rng, fixtures):
+    subject_id = rng.choice(sorted(fixtures.seating))
+    return 'admin', 'GET', f'/admin/subjects/{subject_id}/assign_pcs', None
+
+
+def _assign_pcs_submit(rng, fixtures):
+    # Resubmitting the current plan validates every seat without changing it
+    subject_id = rng.choice(sorted(fixtures.seating))
+    form = {f'pc_student_{student_id}': equipment_id
+            for student_id, equipment_id in fixtures.seating[subject_id].items()}
+    return 'admin', 'POST', f'/admin/subjects/{subject_id}/assign_pcs', form
+
+
+def _report_issue(rng, fixtures):
+    issue_type = rng.choice(('Hardware', 'Software', 'Both'))
+    software = rng.choice(datagen.SOFTWARE) if issue_type != 'Hardware' else ''
+    enum_type = datagen.IssueType(issue_type)
+    return 'student', 'POST', '/report_issue', {
+        'equipment_id': rng.choice(fixtures.pcs),
+        'description': datagen.issue_description(rng, enum_type, software),
+        'issue_type': issue_type,
+        'software': software,
+    }
+
+
+def _get_subjects(rng, fixtures):
+    return 'student', 'GET', f'/get_subjects?{urlencode(_week(fixtures.today))}', None
+
+
+SCENARIOS = {
+    'admin_dashboard': _admin_dashboard,
+    'assign_pcs': _assign_pcs,
+    'assign_pcs_submit': _assign_pcs_submit,
+    'report_issue': _report_issue,
+    'get_subjects': _get_subjects,
+}
+
+
+def percentile(ordered, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def run_endpoint(name, fixtures, make_session, requests, warmup, concurrency, users, seed):
+    """
+    Send ``warmup`` untimed and then ``requests`` timed requests to one
+    endpoint and summarise them.
+    """
+    scenario = SCENARIOS[name]
+    student_ids = fixtures.enrolled or sorted(fixtures.students)
+    latencies = []
+    queries = []
+    sql_times = []
+    statuses = Counter()
+    errors = Counter()
+    lock = threading.Lock()
+    remaining = iter(range(warmup + requests))
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(number):
+        rng = random.Random(f'{seed}:{name}:{number}')
+        try:
+            sessions = {'admin': login(make_session(), fixtures.admin_email)}
+            sessions['student'] = [
+                login(make_session(), fixtures.students[student_id])
+                for student_id in rng.sample(student_ids, min(users, len(student_ids)))
+            ]
+        except Exception:
+            barrier.abort()
+            raise
+        barrier.wait()
+        while True:
+            with lock:
+                index = next(remaining, None)
+            if index is None:
+                return
+            role, method, path, data = scenario(rng, fixtures)
+            session = sessions[role]
+            if role == 'student':
+                session = rng.choice(session)
+            started = time.perf_counter()
+            try:
+                status, timing = session.request(method, path, data)
+            except Exception as exc:
+                with lock:
+                    errors[type(exc).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            if index < warmup:
+                continue
+            match = _SERVER_TIMING.search(timing)
+            with lock:
+                statuses[status] += 1
+                latencies.append(elapsed)
+                if match:
+                    sql_times.append(float(match.group(1)))
+                    queries.append(int(match.group(2)))
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        raise RuntimeError(f'Could not log the {name} clients in.') from None
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    failed = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        'requests': len(latencies),
+        'errors': failed + sum(errors.values()),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'exceptions': dict(errors),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 0.5)),
+            'p95': ms(percentile(latencies, 0.95)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+        'sql_ms_mean': round(sum(sql_times) / len(sql_times), 2) if sql_times else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current, max_regression=None):
+    """
+    Print how each endpoint changed since ``previous`` and return the names
+    whose p95 grew by more than ``max_regression`` percent.
+    """
+    regressions = []
+    for name, result in current['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        cells = []
+        for label, value, old in (
+            ('p50 ms', result['latency_ms']['p50'], before['latency_ms']['p50']),
+            ('p95 ms', result['latency_ms']['p95'], before['latency_ms']['p95']),
+            ('queries', result['queries']['mean'], before['queries']['mean']),
+            ('req/s', result['throughput_rps'], before['throughput_rps']),
+        ):
+            change = f' ({(value - old) / old * 100:+.0f}%)' if value is not None and old else ''
+            cells.append(f'{label} {old} -> {value}{change}')
+        print(f'{name:<20} ' + ', '.join(cells), file=sys.stderr)
+        old_p95, new_p95 = before['latency_ms']['p95'], result['latency_ms']['p95']
+        if (max_regression is not None and old_p95 and new_p95 is not None
+                and (new_p95 - old_p95) / old_p95 * 100 > max_regression):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', default=None,
+                        help='scratch database (default: a temporary SQLite file)')
+    parser.add_argument('--reuse', action='store_true',
+                        help='benchmark the data already in --database-url')
+    datagen.add_arguments(parser)
+    parser.add_argument('--endpoints', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads')
+    parser.add_argument('--users', type=int, default=5,
+                        help='students each client thread logs in as')
+    parser.add_argument('--server', action='store_true',
+                        help='send requests over HTTP to a local WSGI server')
+    parser.add_argument('--output', '-o', default=None, help='write the results to this file')
+    parser.add_argument('--compare', default=None, help='earlier result file to compare with')
+    parser.add_argument('--max-regression', type=float, default=None, metavar='PERCENT',
+                        help='exit non-zero if a p95 grew by more than this')
+    args = parser.parse_args()
+
+    if args.reuse and args.database_url is None:
+        parser.error('--reuse needs --database-url')
+    scratch = None
+    if args.database_url is None:
+        scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        scratch.close()
+        args.database_url = f'sqlite:///{scratch.name}'
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+        SQLALCHEMY_ENGINE_OPTIONS = (
+            {'connect_args': {'timeout': 30}} if args.database_url.startswith('sqlite')
+            else {'pool_size': args.concurrency + 2, 'max_overflow': 0}
+        )
+        INSTRUMENTATION = True
+        # Timings are collected here, not logged
+        SLOW_REQUEST_MS = float('inf')
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        if args.reuse:
+            dataset = {'reused': True}
+        else:
+            dataset = datagen.create_dataset(
+                args, progress=lambda message: print(message, file=sys.stderr)
+            )
+        today = date.fromisoformat(dataset['today']) if 'today' in dataset else (
+            args.today or date.today()
+        )
+        fixtures = Fixtures(today)
+        db.session.remove()
+
+    server = None
+    if args.server:
+        from werkzeug.serving import make_server
+        # One access log line per request would drown the results
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def make_session():
+            return HTTPSession('127.0.0.1', server.server_port)
+    else:
+        def make_session():
+            return TestClientSession(app)
+
+    results = {
+        'meta': {
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'database': args.database_url.split('://')[0],
+            'client': 'http' if args.server else 'test-client',
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'dataset': dataset,
+        },
+        'endpoints': {},
+    }
+    try:
+        for name in args.endpoints:
+            result = run_endpoint(name, fixtures, make_session, args.requests, args.warmup,
+                                  args.concurrency, args.users, args.seed)
+            results['endpoints'][name] = result
+            latency = result['latency_ms']
+            print(f"{name:<20} {result['throughput_rps']:>8} req/s  p50 {latency['p50']} ms  "
+                  f"p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+                  f"{result['queries']['mean']} queries  {result['errors']} errors",
+                  file=sys.stderr)
+    finally:
+        if server is not None:
+            server.shutdown()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        if scratch is not None:
+            os.unlink(scratch.name)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json.dump(results, stream, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as stream:
+            regressions = compare(json.load(stream), results, args.max_regression)
+        if regressions:
+            print(f"p95 regressed by more than {args.max_regression}%: {', '.join(regressions)}",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
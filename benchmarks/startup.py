@@ -0,0 +1,84 @@
+# benchmarks/startup.py
+
+"""
+Measure application startup time.
+
+Each run starts a fresh Python process that imports the app and calls
+``create_app()``, so the figure includes module imports (what a new gunicorn
+worker or ``flask`` CLI call pays). The warm figure repeats ``create_app()``
+inside one process.
+
+    python benchmarks/startup.py --runs 10 --max-ms 150
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app import create_app
+imported = time.perf_counter()
+create_app()
+finished = time.perf_counter()
+warm = []
+for _ in range({warm_runs}):
+    t = time.perf_counter()
+    create_app()
+    warm.append(time.perf_counter() - t)
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (finished - imported) * 1000,
+    'cold_ms': (finished - started) * 1000,
+    'warm_ms': [w * 1000 for w in warm],
+}}))
+"""
+
+
+def run_once(warm_runs):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(root=ROOT, warm_runs=warm_runs)],
+        check=True, capture_output=True, text=True, cwd=ROOT,
+        env={**os.environ, 'FLASK_CONFIG': os.environ.get('FLASK_CONFIG', 'development')}
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes to start')
+    parser.add_argument('--warm-runs', type=int, default=20,
+                        help='extra create_app() calls per process')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='fail if the median create_app() time exceeds this')
+    args = parser.parse_args()
+
+    results = [run_once(args.warm_runs) for _ in range(args.runs)]
+    cold = [r['cold_ms'] for r in results]
+    factory = [r['create_app_ms'] for r in results]
+    warm = [ms for r in results for ms in r['warm_ms']]
+
+    summary = {
+        'runs': args.runs,
+        'cold_median_ms': round(statistics.median(cold), 2),
+        'import_median_ms': round(statistics.median(r['import_ms'] for r in results), 2),
+        'create_app_median_ms': round(statistics.median(factory), 2),
+        'warm_create_app_median_ms': round(statistics.median(warm), 2) if warm else None,
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.max_ms is not None and summary['create_app_median_ms'] > args.max_ms:
+        print(f"create_app() median {summary['create_app_median_ms']}ms exceeds "
+              f"{args.max_ms}ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
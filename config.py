@@ -1,6 +1,142 @@
 import os
 
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _engine_options():
+    """
+    Connection pool settings for the primary database (and the replica).
+    Recycle connections before MySQL's wait_timeout closes them and ping on
+    checkout so workers never reuse a connection the server has dropped.
+    """
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 280)),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+    }
+
+
+def _binds():
+    """
+    Optional read replica, used by views marked with ``use_read_replica``.
+    """
+    replica_uri = os.environ.get('DATABASE_REPLICA_URL')
+    return {'replica': replica_uri} if replica_uri else {}
+
+
 class Config:
-    SECRET_KEY = "123"
-    SQLALCHEMY_DATABASE_URI = 'mysql+pymysql://root:@localhost/tsu_ccs_lab_management'
+    SECRET_KEY = os.environ.get('SECRET_KEY', '123')
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'mysql+pymysql://root:@localhost/tsu_ccs_lab_management'
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options()
+    SQLALCHEMY_BINDS = _binds()
+
+    # Number of PCs created with a new room unless the form asks otherwise
+    PCS_PER_ROOM = int(os.environ.get('PCS_PER_ROOM', 35))
+    # Logged-in users are cached in-process to skip the per-request lookup
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 2048))
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+    # Seconds a room's cached PC occupancy may be served before reloading
+    AVAILABILITY_TTL = float(os.environ.get('AVAILABILITY_TTL', 300))
+    # Dashboard change feed: memory:// for one process, redis://... to share
+    # events between workers (needs the redis package)
+    EVENT_BROKER_URL = os.environ.get('EVENT_BROKER_URL', 'memory://')
+    EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', 1000))
+    EVENT_HEARTBEAT = float(os.environ.get('EVENT_HEARTBEAT', 15))
+    # Streams are closed after this many seconds; browsers reconnect and resume
+    EVENT_STREAM_MAX_AGE = float(os.environ.get('EVENT_STREAM_MAX_AGE', 300))
+    # Cached template fragments: memory:// for one process, redis://... to
+    # share them between workers (needs the redis package)
+    FRAGMENT_CACHE_URL = os.environ.get('FRAGMENT_CACHE_URL', 'memory://')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 256))
+    # With memory:// a commit only bumps the versions of the worker that made
+    # it, so the others serve their copies until these seconds run out
+    FRAGMENT_CACHE_TTL = float(os.environ.get(
+        'FRAGMENT_CACHE_TTL', 30 if FRAGMENT_CACHE_URL.startswith('memory:') else 3600
+    ))
+    # Lifetime of fingerprinted assets from 'flask assets build' (one year)
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))
+    # Per-request SQL and template timings (Server-Timing header, slow
+    # request log and /admin/metrics); off unless INSTRUMENTATION is set
+    INSTRUMENTATION = _env_bool('INSTRUMENTATION', False)
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+    # Recent requests per endpoint the metrics percentiles are taken over
+    INSTRUMENTATION_WINDOW = int(os.environ.get('INSTRUMENTATION_WINDOW', 1024))
+    # Seconds a list's row counts are reused while its table is unchanged;
+    # like the fragments, memory:// misses other workers' changes until then
+    DATATABLE_COUNT_TTL = float(os.environ.get('DATATABLE_COUNT_TTL', FRAGMENT_CACHE_TTL))
+    # Seconds a report for a date range is served from cache
+    ANALYTICS_CACHE_TTL = float(os.environ.get('ANALYTICS_CACHE_TTL', 600))
+    # New issue reports at least this similar to an open report filed within
+    # the window (on the same PC or software) join its duplicate cluster
+    DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', 0.5))
+    DEDUP_WINDOW_DAYS = int(os.environ.get('DEDUP_WINDOW_DAYS', 14))
+    # Notification emails, sent by 'flask notifications send' from the outbox.
+    # MAIL_BACKEND is smtp or console (log the messages instead of sending)
+    MAIL_BACKEND = os.environ.get('MAIL_BACKEND', 'smtp')
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USE_TLS = _env_bool('MAIL_USE_TLS', False)
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'lab-management@localhost')
+    NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', 50))
+    NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 8))
+    # Seconds before the first retry; doubled after each failed attempt
+    NOTIFY_BACKOFF = float(os.environ.get('NOTIFY_BACKOFF', 30))
+    # Students a roster upload may hold; passwords are hashed in the request,
+    # so larger rosters are imported with 'flask roster import'
+    ROSTER_UPLOAD_MAX_ROWS = int(os.environ.get('ROSTER_UPLOAD_MAX_ROWS', 500))
+    # Largest request body accepted, which bounds the bulk import uploads
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    # A local SMTP stand-in, e.g. python -m aiosmtpd -n -l localhost:1025
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 1025))
+
+
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    # SQLite's default pools take no size or overflow settings
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    MAIL_BACKEND = 'console'
+
+
+class ProductionConfig(Config):
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """
+    Return the config class named by ``name`` or the FLASK_CONFIG environment
+    variable, defaulting to production so a deployment that forgets it never
+    runs in debug mode with the development secret.
+    """
+    name = name or os.environ.get('FLASK_CONFIG', 'production')
+    try:
+        return config_by_name[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown FLASK_CONFIG '{name}'; expected one of {', '.join(config_by_name)}"
+        ) from None
@@ -0,0 +1,58 @@
+"""Add dashboard counters
+
+Revision ID: 3a7d9c2e4b61
+Revises: 5e8b3f1c7a24
+Create Date: 2026-10-18 16:02:44.318207
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7d9c2e4b61'
+down_revision = '5e8b3f1c7a24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    counters = op.create_table('dashboard_counters',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('value', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # Start from the current totals; 'flask counters reconcile' keeps them honest
+    bind = op.get_bind()
+    values = {}
+    for table in ('issue_reports', 'maintenances', 'borrow_requests'):
+        for status, count in bind.execute(sa.text(
+            f'SELECT status, COUNT(*) FROM {table} WHERE status IS NOT NULL GROUP BY status'
+        )):
+            values[f'{table}:{status}'] = count
+    for equipment_type, status, count in bind.execute(sa.text(
+        'SELECT equipment_type, status, COUNT(*) FROM equipment '
+        'WHERE status IS NOT NULL GROUP BY equipment_type, status'
+    )):
+        values[f'equipment:{equipment_type}:{status}'] = count
+    for room_id, count in bind.execute(sa.text(
+        'SELECT equipment.room_id, COUNT(*) FROM issue_reports '
+        'JOIN equipment ON equipment.id = issue_reports.equipment_id '
+        "WHERE equipment.room_id IS NOT NULL AND issue_reports.status <> 'Resolved' "
+        'GROUP BY equipment.room_id'
+    )):
+        values[f'room_open_issues:{room_id}'] = count
+
+    now = datetime.utcnow()
+    op.bulk_insert(counters, [
+        {'name': name, 'value': value, 'updated_at': now}
+        for name, value in sorted(values.items())
+    ])
+
+
+def downgrade():
+    op.drop_table('dashboard_counters')
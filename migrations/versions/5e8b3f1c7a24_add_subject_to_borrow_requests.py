@@ -0,0 +1,35 @@
+"""Add subject to borrow requests and allow unallocated requests
+
+Revision ID: 5e8b3f1c7a24
+Revises: c41e7a2b9d05
+Create Date: 2026-10-18 14:21:09.733150
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b3f1c7a24'
+down_revision = 'c41e7a2b9d05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('borrow_requests', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('subject_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_borrow_requests_subject_id_subjects', 'subjects', ['subject_id'], ['id'])
+        batch_op.alter_column('equipment_id',
+               existing_type=sa.Integer(),
+               nullable=True)
+
+
+def downgrade():
+    op.execute('DELETE FROM borrow_requests WHERE equipment_id IS NULL')
+    with op.batch_alter_table('borrow_requests', schema=None) as batch_op:
+        batch_op.alter_column('equipment_id',
+               existing_type=sa.Integer(),
+               nullable=False)
+        batch_op.drop_constraint('fk_borrow_requests_subject_id_subjects', type_='foreignkey')
+        batch_op.drop_column('subject_id')
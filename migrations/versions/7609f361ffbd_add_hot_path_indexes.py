@@ -0,0 +1,82 @@
+"""Add composite indexes for hot query paths
+
+Revision ID: 7609f361ffbd
+Revises: f238347409d7
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7609f361ffbd'
+down_revision = 'f238347409d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('issue_reports', schema=None) as batch_op:
+        batch_op.create_index('ix_issue_reports_status_created_at', ['status', 'created_at'], unique=False)
+
+    with op.batch_alter_table('maintenances', schema=None) as batch_op:
+        batch_op.create_index('ix_maintenances_equipment_id_status', ['equipment_id', 'status'], unique=False)
+        batch_op.create_index('ix_maintenances_scheduled_date', ['scheduled_date'], unique=False)
+
+    with op.batch_alter_table('borrow_requests', schema=None) as batch_op:
+        batch_op.create_index('ix_borrow_requests_status_request_date', ['status', 'request_date'], unique=False)
+
+    with op.batch_alter_table('pc_assignments', schema=None) as batch_op:
+        batch_op.create_index('ix_pc_assignments_equipment_id_subject_id', ['equipment_id', 'subject_id'], unique=False)
+
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.create_index('ix_subjects_start_time_end_time', ['start_time', 'end_time'], unique=False)
+
+    with op.batch_alter_table('equipment', schema=None) as batch_op:
+        batch_op.create_index('ix_equipment_room_id_equipment_type', ['room_id', 'equipment_type'], unique=False)
+        batch_op.create_index('ix_equipment_equipment_type_is_available', ['equipment_type', 'is_available'], unique=False)
+        batch_op.create_index('ix_equipment_equipment_name', ['equipment_name'], unique=False)
+
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.create_index('ix_rooms_room_name', ['room_name'], unique=False)
+
+    # Drop duplicate enrollments (keeping the oldest row) so the unique
+    # constraint can be created on existing data
+    op.execute(
+        'DELETE FROM student_subjects WHERE id NOT IN ('
+        'SELECT keep_id FROM ('
+        'SELECT MIN(id) AS keep_id FROM student_subjects '
+        'GROUP BY student_id, subject_id'
+        ') AS keep_rows)'
+    )
+    with op.batch_alter_table('student_subjects', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_student_subjects_student_id_subject_id', ['student_id', 'subject_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('student_subjects', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_student_subjects_student_id_subject_id', type_='unique')
+
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_index('ix_rooms_room_name')
+
+    with op.batch_alter_table('equipment', schema=None) as batch_op:
+        batch_op.drop_index('ix_equipment_equipment_name')
+        batch_op.drop_index('ix_equipment_equipment_type_is_available')
+        batch_op.drop_index('ix_equipment_room_id_equipment_type')
+
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.drop_index('ix_subjects_start_time_end_time')
+
+    with op.batch_alter_table('pc_assignments', schema=None) as batch_op:
+        batch_op.drop_index('ix_pc_assignments_equipment_id_subject_id')
+
+    with op.batch_alter_table('borrow_requests', schema=None) as batch_op:
+        batch_op.drop_index('ix_borrow_requests_status_request_date')
+
+    with op.batch_alter_table('maintenances', schema=None) as batch_op:
+        batch_op.drop_index('ix_maintenances_scheduled_date')
+        batch_op.drop_index('ix_maintenances_equipment_id_status')
+
+    with op.batch_alter_table('issue_reports', schema=None) as batch_op:
+        batch_op.drop_index('ix_issue_reports_status_created_at')
@@ -0,0 +1,30 @@
+"""Add schedule version to users
+
+Revision ID: 9db50a4c351e
+Revises: 7609f361ffbd
+Create Date: 2026-10-18 11:27:05.214637
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9db50a4c351e'
+down_revision = '7609f361ffbd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('schedule_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('schedule_updated_at', sa.DateTime(), nullable=True))
+
+    op.execute('UPDATE users SET schedule_updated_at = CURRENT_TIMESTAMP')
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('schedule_updated_at')
+        batch_op.drop_column('schedule_version')
@@ -0,0 +1,35 @@
+"""Add resolved_at to issue reports
+
+Revision ID: b8e14f6a0c37
+Revises: 3a7d9c2e4b61
+Create Date: 2026-10-18 17:25:10.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e14f6a0c37'
+down_revision = '3a7d9c2e4b61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('issue_reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('resolved_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_issue_reports_created_at', ['created_at'], unique=False)
+
+    # The last update of an already resolved issue is the best record of
+    # when it was resolved
+    op.execute(
+        "UPDATE issue_reports SET resolved_at = COALESCE(updated_at, created_at) "
+        "WHERE status = 'Resolved'"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('issue_reports', schema=None) as batch_op:
+        batch_op.drop_index('ix_issue_reports_created_at')
+        batch_op.drop_column('resolved_at')
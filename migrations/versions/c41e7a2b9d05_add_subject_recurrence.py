@@ -0,0 +1,42 @@
+"""Add weekly recurrence to subjects
+
+Revision ID: c41e7a2b9d05
+Revises: 9db50a4c351e
+Create Date: 2026-10-18 13:02:41.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7a2b9d05'
+down_revision = '9db50a4c351e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('recurrence_days', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('term_start', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('term_end', sa.Date(), nullable=True))
+        batch_op.create_index('ix_subjects_term_start_term_end', ['term_start', 'term_end'], unique=False)
+
+    op.create_table('subject_exceptions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('exception_date', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('subject_id', 'exception_date', name='uq_subject_exceptions_subject_id_exception_date')
+    )
+
+
+def downgrade():
+    op.drop_table('subject_exceptions')
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.drop_index('ix_subjects_term_start_term_end')
+        batch_op.drop_column('term_end')
+        batch_op.drop_column('term_start')
+        batch_op.drop_column('recurrence_days')
@@ -0,0 +1,59 @@
+"""Add full-text search index for issue reports
+
+Revision ID: d2c6a9e0f413
+Revises: b8e14f6a0c37
+Create Date: 2026-10-18 18:40:31.562087
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2c6a9e0f413'
+down_revision = 'b8e14f6a0c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.execute(
+            'CREATE TABLE issue_search ('
+            ' issue_id INTEGER NOT NULL PRIMARY KEY,'
+            ' description TEXT, software VARCHAR(100), equipment_name VARCHAR(255),'
+            ' room_name VARCHAR(255), reporter_name VARCHAR(255),'
+            ' FULLTEXT KEY ft_issue_search (description, software, equipment_name, room_name, reporter_name)'
+            ') ENGINE=InnoDB DEFAULT CHARSET=utf8mb4'
+        )
+        compact = "LOWER(REGEXP_REPLACE(COALESCE(e.equipment_name, ''), '[^[:alnum:]]', ''))"
+        equipment = f"CONCAT(COALESCE(e.equipment_name, ''), ' ', {compact})"
+        key = 'issue_id'
+    elif dialect == 'sqlite':
+        op.execute(
+            'CREATE VIRTUAL TABLE issue_search USING fts5('
+            'description, software, equipment_name, room_name, reporter_name, tokenize = "unicode61")'
+        )
+        compact = "COALESCE(e.equipment_name, '')"
+        for character in ('-', '_', '.', ' '):
+            compact = f"REPLACE({compact}, '{character}', '')"
+        equipment = f"COALESCE(e.equipment_name, '') || ' ' || LOWER({compact})"
+        key = 'rowid'
+    else:
+        # No full-text support for this database; search stays disabled
+        return
+
+    op.execute(
+        f'INSERT INTO issue_search ({key}, description, software, equipment_name, room_name, reporter_name) '
+        f"SELECT i.id, i.description, COALESCE(i.software, ''), {equipment}, "
+        "COALESCE(r.room_name, ''), COALESCE(u.full_name, '') "
+        'FROM issue_reports i '
+        'JOIN equipment e ON e.id = i.equipment_id '
+        'LEFT JOIN rooms r ON r.id = e.room_id '
+        'JOIN users u ON u.id = i.user_id'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name in ('mysql', 'sqlite'):
+        op.execute('DROP TABLE issue_search')
@@ -0,0 +1,53 @@
+"""Add duplicate issue clusters and signature index
+
+Revision ID: e7a41c9b5d28
+Revises: d2c6a9e0f413
+Create Date: 2026-10-18 19:52:14.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a41c9b5d28'
+down_revision = 'd2c6a9e0f413'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('issue_clusters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('issue_reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('signature', sa.LargeBinary(length=256), nullable=True))
+        batch_op.add_column(sa.Column('cluster_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_issue_reports_cluster_id'), ['cluster_id'], unique=False)
+        batch_op.create_foreign_key('fk_issue_reports_cluster_id', 'issue_clusters', ['cluster_id'], ['id'])
+
+    op.create_table('issue_signature_bands',
+    sa.Column('issue_id', sa.Integer(), nullable=False),
+    sa.Column('band', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['issue_id'], ['issue_reports.id'], ),
+    sa.PrimaryKeyConstraint('issue_id', 'band')
+    )
+    with op.batch_alter_table('issue_signature_bands', schema=None) as batch_op:
+        batch_op.create_index('ix_issue_signature_bands_bucket', ['bucket'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('issue_signature_bands', schema=None) as batch_op:
+        batch_op.drop_index('ix_issue_signature_bands_bucket')
+
+    op.drop_table('issue_signature_bands')
+    with op.batch_alter_table('issue_reports', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_issue_reports_cluster_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_issue_reports_cluster_id'))
+        batch_op.drop_column('cluster_id')
+        batch_op.drop_column('signature')
+
+    op.drop_table('issue_clusters')
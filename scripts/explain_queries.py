@@ -0,0 +1,111 @@
+# scripts/explain_queries.py
+
+"""
+Print the database's execution plan for the queries behind each hot route.
+
+Run it against the configured database before and after
+``flask db upgrade`` to compare the plans, e.g.:
+
+    python scripts/explain_queries.py > before.txt
+    flask db upgrade
+    python scripts/explain_queries.py > after.txt
+
+On MySQL the output is ``EXPLAIN`` (look for ``type: ALL`` rows, which are
+full table scans); on SQLite it is ``EXPLAIN QUERY PLAN`` (look for
+``SCAN <table>`` without ``USING INDEX``).
+"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import (  # noqa: E402
+    ACTIVE_MAINTENANCE_STATUSES, BorrowRequest, BorrowRequestStatus,
+    Equipment, EquipmentType, IssueReport, Maintenance, PCAssignment, Room,
+    StudentSubject, Subject
+)
+
+WINDOW_START = datetime(2024, 10, 21, 8, 0)
+WINDOW_END = datetime(2024, 10, 21, 11, 0)
+
+
+def hot_queries():
+    """
+    Return ``(route, description, statement)`` for every query worth checking.
+    """
+    return [
+        ('admin.admin_dashboard', 'active maintenance per equipment',
+         select(Maintenance).where(Maintenance.id.in_(
+             select(func.min(Maintenance.id))
+             .where(Maintenance.status.in_(ACTIVE_MAINTENANCE_STATUSES))
+             .group_by(Maintenance.equipment_id)
+         ))),
+        ('admin.issue_reports_data', 'pending issues, newest first',
+         select(IssueReport.id)
+         .where(IssueReport.status == 'Pending')
+         .order_by(IssueReport.created_at.desc())
+         .limit(10)),
+        ('admin.borrow_requests_data', 'pending borrow requests, newest first',
+         select(BorrowRequest.id)
+         .where(BorrowRequest.status == BorrowRequestStatus.Pending)
+         .order_by(BorrowRequest.request_date.desc())
+         .limit(10)),
+        ('admin.maintenances_data', 'maintenances by scheduled date',
+         select(Maintenance.id)
+         .order_by(Maintenance.scheduled_date.desc())
+         .limit(10)),
+        ('admin.edit_equipment_maintenance', 'current maintenance of one PC',
+         select(Maintenance)
+         .where(Maintenance.equipment_id == 1,
+                Maintenance.status.in_(ACTIVE_MAINTENANCE_STATUSES))),
+        ('admin.assign_pcs', 'PCs in the subject room',
+         select(Equipment).where(Equipment.room_id == 1)),
+        ('admin.assign_pcs', 'bookings overlapping the subject window',
+         select(PCAssignment.equipment_id, Subject.start_time, Subject.end_time)
+         .join(Subject, PCAssignment.subject_id == Subject.id)
+         .where(PCAssignment.equipment_id == 1,
+                Subject.start_time < WINDOW_END,
+                Subject.end_time > WINDOW_START)),
+        ('admin.add_laptops', 'existing laptop names',
+         select(Equipment.equipment_name)
+         .where(Equipment.equipment_name.in_(['Laptop-1', 'Laptop-2']))),
+        ('admin.create_room', 'room name lookup',
+         select(Room).where(Room.room_name == 'Lab 1')),
+        ('main.borrow_laptop', 'available laptops',
+         select(Equipment).where(Equipment.equipment_type == EquipmentType.Laptop,
+                                 Equipment.is_available.is_(True))),
+        ('admin.assign_students', 'enrollment lookup',
+         select(StudentSubject).where(StudentSubject.student_id == 1,
+                                      StudentSubject.subject_id == 1)),
+    ]
+
+
+def explain(connection, statement):
+    dialect = connection.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    result = connection.exec_driver_sql(prefix + sql)
+    return sql, list(result.keys()), result.fetchall()
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as connection:
+            print(f'-- {db.engine.url.render_as_string(hide_password=True)}')
+            for route, description, statement in hot_queries():
+                sql, columns, rows = explain(connection, statement)
+                print(f'\n== {route}: {description}')
+                print(' '.join(sql.split()))
+                print('  ' + ' | '.join(columns))
+                for row in rows:
+                    print('  ' + ' | '.join('' if value is None else str(value) for value in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TestingConfig  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+class SQLiteTestingConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+@pytest.fixture
+def app():
+    app = create_app(SQLiteTestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', full_name='Administrator', email='admin@example.com',
+                role='Admin', password_hash='-')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
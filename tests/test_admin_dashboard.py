@@ -0,0 +1,67 @@
+# tests/test_admin_dashboard.py
+
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db
+from app.fragments import fragment_cache
+from app.models import Equipment, Maintenance, PCAssignment, Room, Subject, User
+
+from conftest import login
+
+# Statements one uncached dashboard render may run, whatever the data size
+MAX_QUERIES = 8
+
+
+def seed(start, stop, admin):
+    """
+    Rooms ``start`` to ``stop``, each with a subject and a PC assigned to a
+    student that has an active maintenance.
+    """
+    for i in range(start, stop):
+        room = Room(room_name=f'Lab {i}')
+        student = User(username=f'student{i}', full_name=f'Student {i}',
+                       email=f'student{i}@example.com', password_hash='-')
+        db.session.add_all([room, student])
+        db.session.flush()
+        pc = Equipment(room_id=room.id, equipment_name=f'PC-{i}')
+        subject = Subject(subject_code=f'CS{i}', subject_name=f'Subject {i}', room_id=room.id,
+                          start_time=datetime(2024, 1, 1, 8), end_time=datetime(2024, 1, 1, 10))
+        db.session.add_all([pc, subject])
+        db.session.flush()
+        db.session.add_all([
+            PCAssignment(subject_id=subject.id, student_id=student.id, equipment_id=pc.id),
+            Maintenance(equipment_id=pc.id, reported_by=admin.id, description='Replace fan',
+                        status='In Progress', scheduled_date=datetime(2024, 1, 2)),
+        ])
+    db.session.commit()
+
+
+def render_dashboard(app, admin):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    client = app.test_client()
+    login(client, admin)
+    # Render every fragment from the database, not from an earlier render
+    fragment_cache.configure()
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.get('/admin/dashboard')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_dashboard_queries_do_not_grow_with_rows(app, admin):
+    seed(0, 5, admin)
+    small = render_dashboard(app, admin)
+    seed(5, 50, admin)
+    large = render_dashboard(app, admin)
+
+    assert small <= MAX_QUERIES
+    assert large == small
@@ -0,0 +1,41 @@
+# tests/test_allocation.py
+
+from datetime import datetime, timedelta
+
+from app import db
+from app.allocation import allocate_laptops
+from app.models import BorrowRequest, BorrowRequestStatus, Equipment, EquipmentType, User
+
+
+def student(number):
+    user = User(username=f'student{number}', full_name=f'Student {number}',
+                email=f'student{number}@example.com', role='User', password_hash='-')
+    db.session.add(user)
+    return user
+
+
+def laptop(name):
+    equipment = Equipment(equipment_name=name, equipment_type=EquipmentType.Laptop)
+    db.session.add(equipment)
+    return equipment
+
+
+def test_named_laptop_is_not_taken_by_an_earlier_any_request(app, admin):
+    first, second = student(1), student(2)
+    laptop_a, laptop_b = laptop('Laptop A'), laptop('Laptop B')
+    db.session.flush()
+    now = datetime.utcnow()
+    # Laptop A would be the first pick for "any laptop"
+    any_laptop = BorrowRequest(user_id=first.id, request_date=now - timedelta(minutes=5))
+    named = BorrowRequest(user_id=second.id, equipment_id=laptop_a.id, request_date=now)
+    db.session.add_all([any_laptop, named])
+    db.session.commit()
+
+    report = allocate_laptops(now, now + timedelta(hours=2), admin.id)
+
+    assert [allocation.request_id for allocation in report.allocated] == [any_laptop.id, named.id]
+    assert report.unserved == []
+    db.session.expire_all()
+    assert named.status == BorrowRequestStatus.Approved
+    assert named.equipment_id == laptop_a.id
+    assert any_laptop.equipment_id == laptop_b.id
@@ -0,0 +1,80 @@
+# tests/test_assign_pcs.py
+
+import re
+from datetime import datetime, timedelta
+
+from app import db
+from app.availability import occupancy
+from app.models import (
+    Equipment, EquipmentType, Maintenance, PCAssignment, Room, StudentSubject, Subject, User
+)
+
+from conftest import login
+
+
+def options(html):
+    return {
+        name.strip(): 'disabled' in attributes
+        for attributes, name in re.findall(r'<option value="\d+"([^>]*)>\s*(.+?) - ', html)
+    }
+
+
+def test_busy_pcs_cannot_be_picked(app, admin):
+    start = datetime(2030, 1, 7, 8)
+    room = Room(room_name='Lab 1')
+    student = User(username='student', full_name='Student', email='student@example.com',
+                   role='User', password_hash='-')
+    db.session.add_all([room, student])
+    db.session.flush()
+    booked, serviced, free = (
+        Equipment(equipment_name=name, room_id=room.id, equipment_type=EquipmentType.PC)
+        for name in ('PC-01', 'PC-02', 'PC-03')
+    )
+    other = Subject(subject_code='CS101', subject_name='Other', room_id=room.id,
+                    start_time=start, end_time=start + timedelta(hours=2))
+    subject = Subject(subject_code='CS102', subject_name='Ours', room_id=room.id,
+                      start_time=start + timedelta(hours=1), end_time=start + timedelta(hours=3))
+    db.session.add_all([booked, serviced, free, other, subject])
+    db.session.flush()
+    db.session.add_all([
+        PCAssignment(subject_id=other.id, student_id=student.id, equipment_id=booked.id),
+        StudentSubject(subject_id=subject.id, student_id=student.id),
+        Maintenance(equipment_id=serviced.id, reported_by=admin.id, description='Fan',
+                    status='In Progress', scheduled_date=start),
+    ])
+    db.session.commit()
+    occupancy.clear()
+
+    client = app.test_client()
+    login(client, admin)
+    response = client.get(f'/admin/subjects/{subject.id}/assign_pcs')
+
+    assert response.status_code == 200
+    assert options(response.get_data(as_text=True)) == {
+        'PC-01': True, 'PC-02': True, 'PC-03': False
+    }
+
+
+def test_maintenance_created_through_the_form_frees_no_pc(app, admin):
+    room = Room(room_name='Lab 1')
+    db.session.add(room)
+    db.session.flush()
+    pc = Equipment(equipment_name='PC-01', room_id=room.id, equipment_type=EquipmentType.PC)
+    db.session.add(pc)
+    db.session.commit()
+    client = app.test_client()
+    login(client, admin)
+    window = {'start': '2030-01-07T08:00', 'end': '2030-01-07T10:00'}
+
+    # Loads the room into the availability index
+    response = client.get(f'/admin/rooms/{room.id}/available_pcs', query_string=window)
+    assert [free['id'] for free in response.get_json()] == [pc.id]
+
+    response = client.post('/admin/maintenances/create', data={
+        'equipment_id': str(pc.id), 'description': 'Replace fan',
+        'scheduled_date': '2030-01-07T09:00',
+    })
+    assert response.status_code == 302
+
+    response = client.get(f'/admin/rooms/{room.id}/available_pcs', query_string=window)
+    assert response.get_json() == []
@@ -0,0 +1,28 @@
+# tests/test_calendar.py
+
+from app import db
+from app.models import User
+
+from conftest import login
+
+WINDOW = {'start': '2030-01-06', 'end': '2030-02-17'}
+
+
+def test_schedule_change_from_another_worker_is_not_answered_with_304(app, admin):
+    client = app.test_client()
+    login(client, admin)
+    response = client.get('/get_subjects', query_string=WINDOW)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    # Another worker's change leaves this worker's cached user untouched
+    with db.engine.begin() as connection:
+        connection.execute(
+            User.__table__.update().where(User.__table__.c.id == admin.id)
+            .values(schedule_version=User.__table__.c.schedule_version + 1)
+        )
+
+    response = client.get('/get_subjects', query_string=WINDOW,
+                          headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
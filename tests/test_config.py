@@ -0,0 +1,20 @@
+# tests/test_config.py
+
+import pytest
+
+from app import create_app
+from config import ProductionConfig, get_config
+
+
+def test_missing_secret_key_is_refused_at_startup():
+    class NoSecretConfig(ProductionConfig):
+        SECRET_KEY = None
+
+    with pytest.raises(ValueError, match='SECRET_KEY'):
+        create_app(NoSecretConfig)
+
+
+def test_production_is_the_default_profile(monkeypatch):
+    monkeypatch.delenv('FLASK_CONFIG', raising=False)
+
+    assert get_config() is ProductionConfig
@@ -0,0 +1,27 @@
+# tests/test_counters.py
+
+from app import db
+from app.counters import read_counters, reconcile
+from app.models import Equipment, EquipmentType, Room
+
+from conftest import login
+
+
+def test_issues_filed_through_the_form_count_for_their_room(app, admin):
+    room = Room(room_name='Lab 1')
+    db.session.add(room)
+    db.session.flush()
+    pc = Equipment(equipment_name='PC-01', room_id=room.id, equipment_type=EquipmentType.PC)
+    db.session.add(pc)
+    db.session.commit()
+    client = app.test_client()
+    login(client, admin)
+
+    for description in ('Keyboard is missing keys', 'Screen stays black'):
+        response = client.post('/report_issue', data={
+            'equipment_id': str(pc.id), 'description': description, 'issue_type': 'Hardware',
+        })
+        assert response.status_code == 302
+
+    assert read_counters()[f'room_open_issues:{room.id}'] == 2
+    assert reconcile() == {}
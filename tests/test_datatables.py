@@ -0,0 +1,99 @@
+# tests/test_datatables.py
+
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db
+from app.datatables import count_cache
+from app.fragments import fragment_cache
+from app.models import Equipment, EquipmentType, IssueReport, IssueType, Maintenance
+from app.search import create_index
+
+from conftest import login
+
+DESCRIPTIONS = (
+    'Keyboard is missing several keys',
+    'The monitor flickers during class',
+    'Mouse does not respond',
+)
+
+
+def seed(admin):
+    pc = Equipment(equipment_name='PC-01', equipment_type=EquipmentType.PC)
+    db.session.add(pc)
+    db.session.flush()
+    db.session.add_all([
+        IssueReport(equipment_id=pc.id, user_id=admin.id, description=description,
+                    issue_type=IssueType.Hardware)
+        for description in DESCRIPTIONS
+    ])
+    db.session.commit()
+    return pc
+
+
+def draw(client, search=''):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.get('/admin/issue_reports/data', query_string={
+            'draw': 1, 'start': 0, 'length': 10, 'search[value]': search,
+            'columns[0][data]': 'description',
+        })
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    counts = [statement for statement in statements if 'count(' in statement.lower()]
+    return response.get_json(), counts
+
+
+def test_counts_are_reused_until_the_table_changes(app, admin):
+    fragment_cache.configure()
+    count_cache.clear()
+    pc = seed(admin)
+    client = app.test_client()
+    login(client, admin)
+
+    data, counts = draw(client)
+    assert data['recordsTotal'] == 3 and len(counts) == 1
+    data, counts = draw(client)
+    assert data['recordsTotal'] == 3 and counts == []
+
+    db.session.add(IssueReport(equipment_id=pc.id, user_id=admin.id,
+                               description='Fan is loud', issue_type=IssueType.Hardware))
+    db.session.commit()
+    data, counts = draw(client)
+    assert data['recordsTotal'] == 4 and len(counts) == 1
+
+
+def test_search_matches_word_prefixes_through_the_index(app, admin):
+    create_index(db.session.connection())
+    db.session.commit()
+    seed(admin)
+    client = app.test_client()
+    login(client, admin)
+
+    data, _ = draw(client, 'flick')
+
+    assert data['recordsFiltered'] == 1
+    assert [row['description'] for row in data['data']] == [DESCRIPTIONS[1]]
+
+
+def test_lists_without_an_index_match_inside_words(app, admin):
+    pc = seed(admin)
+    db.session.add(Maintenance(equipment_id=pc.id, reported_by=admin.id,
+                               description='Replace fan', scheduled_date=datetime(2030, 1, 7)))
+    db.session.commit()
+    client = app.test_client()
+    login(client, admin)
+
+    response = client.get('/admin/maintenances/data', query_string={
+        'draw': 1, 'start': 0, 'length': 10, 'search[value]': 'fan',
+        'columns[0][data]': 'description',
+    })
+
+    assert [row['description'] for row in response.get_json()['data']] == ['Replace fan']
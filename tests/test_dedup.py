@@ -0,0 +1,52 @@
+# tests/test_dedup.py
+
+from app import db
+from app.dedup import (
+    BANDS, DEFAULT_THRESHOLD, ROWS_PER_BAND, index_issue, signature, similarity
+)
+from app.models import Equipment, IssueReport, IssueType
+
+ORIGINAL = 'The monitor on this PC flickers and then goes black during our laboratory class'
+# About as similar as the threshold allows, and sharing no band of 4 values
+DUPLICATE = 'The monitor flickers and then goes black in the afternoon class'
+
+
+def file_issue(admin, equipment, description):
+    issue = IssueReport(equipment_id=equipment.id, user_id=admin.id, description=description,
+                        issue_type=IssueType.Hardware, status='Pending')
+    db.session.add(issue)
+    db.session.flush()
+    match = index_issue(issue)
+    db.session.commit()
+    return issue, match
+
+
+def test_banding_finds_pairs_at_the_threshold():
+    recall = 1 - (1 - DEFAULT_THRESHOLD ** ROWS_PER_BAND) ** BANDS
+    assert recall >= 0.95
+
+
+def test_report_at_the_threshold_joins_the_original(app, admin):
+    estimate = similarity(signature(ORIGINAL), signature(DUPLICATE))
+    assert DEFAULT_THRESHOLD <= estimate < DEFAULT_THRESHOLD + 0.1
+
+    pc = Equipment(equipment_name='PC-1')
+    db.session.add(pc)
+    db.session.commit()
+    original, _ = file_issue(admin, pc, ORIGINAL)
+    duplicate, match = file_issue(admin, pc, DUPLICATE)
+
+    assert match is not None and match.issue_id == original.id
+    assert duplicate.cluster_id is not None
+    assert duplicate.cluster_id == original.cluster_id
+
+
+def test_unrelated_report_stays_alone(app, admin):
+    pc = Equipment(equipment_name='PC-1')
+    db.session.add(pc)
+    db.session.commit()
+    file_issue(admin, pc, ORIGINAL)
+    issue, match = file_issue(admin, pc, 'Eclipse IDE license expired after the update')
+
+    assert match is None
+    assert issue.cluster_id is None
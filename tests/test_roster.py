@@ -0,0 +1,78 @@
+# tests/test_roster.py
+
+import io
+
+from app import roster
+from app.models import User
+from app.roster import import_roster
+
+from conftest import login
+
+
+def record(number, username=None, email=None):
+    return {
+        'student_number': f'2024-{number:04d}',
+        'username': username or f'student{number}',
+        'full_name': f'Student {number}',
+        'email': email or f'student{number}@example.com',
+        'password': 'secret',
+    }
+
+
+def test_usernames_differing_in_case_are_duplicates(app):
+    rows = [record(1, username='jdoe'), record(2, username='JDoe')]
+
+    report = import_roster(enumerate(rows, start=2))
+
+    assert report.created == 1
+    assert [(issue.line, issue.message) for issue in report.skipped] == [
+        (3, 'Duplicate row in file.')
+    ]
+
+
+def test_collision_after_the_check_is_skipped(app, admin, monkeypatch):
+    # A signup between the duplicate check and the insert
+    monkeypatch.setattr(roster, '_existing_keys', lambda chunk: (set(), set(), set()))
+    rows = [record(1), record(2, email=admin.email), record(3)]
+
+    report = import_roster(enumerate(rows, start=2))
+
+    assert report.created == 2
+    assert [(issue.line, issue.email) for issue in report.skipped] == [(3, admin.email)]
+    assert User.query.filter_by(role='User').count() == 2
+
+
+def test_no_process_pool_by_default(app, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError('process pool started')
+
+    monkeypatch.setattr(roster, 'ProcessPoolExecutor', no_pool)
+    rows = [record(number) for number in range(roster.POOL_THRESHOLD * 2)]
+
+    report = import_roster(enumerate(rows, start=2))
+
+    assert report.created == len(rows)
+
+
+def test_upload_over_the_row_limit_imports_nothing(app, admin):
+    app.config['ROSTER_UPLOAD_MAX_ROWS'] = 2
+    client = app.test_client()
+    login(client, admin)
+    lines = ['student_number,username,full_name,email,password'] + [
+        f'2024-{number:04d},student{number},Student {number},student{number}@example.com,secret'
+        for number in range(3)
+    ]
+
+    response = client.post('/admin/students/import', data={
+        'roster_file': (io.BytesIO('\n'.join(lines).encode()), 'roster.csv'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    assert User.query.filter_by(role='User').count() == 0
+
+    response = client.post('/admin/students/import', data={
+        'roster_file': (io.BytesIO('\n'.join(lines[:3]).encode()), 'roster.csv'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert User.query.filter_by(role='User').count() == 2